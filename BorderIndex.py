@@ -0,0 +1,148 @@
+import numpy as np
+import shapely
+
+
+# Класи комірок растра
+OUTSIDE = 0
+INSIDE = 1
+BOUNDARY = 2
+
+
+class BorderIndex:
+    """
+        Клас BorderIndex прискорює перевірки належності до кордону (точки, полігони).
+
+        Область кордону розбивається на растр resolution × resolution комірок (у градусах), і кожна комірка
+        класифікується як повністю всередині (contains_properly), повністю зовні (disjoint) або гранична.
+        Класифікація ієрархічна: спершу грубий растр (coarse × coarse), і лише граничні грубі комірки
+        діляться на дрібні. Запит для точки чи полігона в межах внутрішніх або зовнішніх комірок – це
+        звертання до масиву; точна перевірка на підготовленій геометрії виконується лише біля кордону.
+
+        Індекс будується один раз для кордону і передається процесам пулу (pickle) разом з геометрією.
+    """
+
+    def __init__(self, border, resolution=512, coarse=64):
+        self.border = border
+        shapely.prepare(self.border)
+
+        minx, miny, maxx, maxy = border.bounds
+        # Невеликий запас, щоб точки на межі області потрапляли в растр
+        pad = 1e-6 * max(maxx - minx, maxy - miny, 1.0)
+        self.minx, self.miny = minx - pad, miny - pad
+        self.resolution = resolution
+        self.dx = (maxx - minx + 2 * pad) / resolution
+        self.dy = (maxy - miny + 2 * pad) / resolution
+
+        factor = max(resolution // coarse, 1)
+        coarse_cells = self._classify(np.arange(0, resolution, factor), np.arange(0, resolution, factor), factor)
+        # Дрібні комірки успадковують клас грубої, граничні грубі комірки уточнюються
+        self.cells = np.repeat(np.repeat(coarse_cells, factor, axis=0), factor, axis=1)[:resolution, :resolution]
+        rows, cols = np.nonzero(self.cells == BOUNDARY)
+        if len(rows):
+            self.cells[rows, cols] = self._classify_cells(rows, cols, 1)
+
+        # Таблиці сумарних площ для перевірки прямокутника комірок за O(1)
+        self._inside_sum = self._summed_area(self.cells == INSIDE)
+        self._outside_sum = self._summed_area(self.cells == OUTSIDE)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['border'] = shapely.to_wkb(self.border)
+        return state
+
+    def __setstate__(self, state):
+        state['border'] = shapely.from_wkb(state['border'])
+        shapely.prepare(state['border'])
+        self.__dict__.update(state)
+
+    def _classify(self, row_starts, col_starts, size):
+        rows, cols = np.meshgrid(row_starts, col_starts, indexing='ij')
+        return self._classify_cells(rows.ravel(), cols.ravel(), size).reshape(rows.shape)
+
+    def _classify_cells(self, rows, cols, size):
+        """Клас комірок розміром size × size дрібних комірок з лівим нижнім кутом (rows, cols)."""
+        # Комірки трохи розширені, щоб округлення при обчисленні номера комірки не давало хибних відповідей
+        eps = 1e-9 * max(self.dx, self.dy)
+        boxes = shapely.box(
+            self.minx + cols * self.dx - eps, self.miny + rows * self.dy - eps,
+            self.minx + (cols + size) * self.dx + eps, self.miny + (rows + size) * self.dy + eps
+        )
+        classes = np.full(len(boxes), BOUNDARY, dtype=np.uint8)
+        classes[shapely.contains_properly(self.border, boxes)] = INSIDE
+        classes[shapely.disjoint(self.border, boxes)] = OUTSIDE
+        return classes
+
+    @staticmethod
+    def _summed_area(mask):
+        table = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int32)
+        table[1:, 1:] = np.cumsum(np.cumsum(mask, axis=0), axis=1)
+        return table
+
+    def _cell_index(self, x, y):
+        col = np.floor((np.asarray(x, dtype=np.float64) - self.minx) / self.dx).astype(np.int64)
+        row = np.floor((np.asarray(y, dtype=np.float64) - self.miny) / self.dy).astype(np.int64)
+        return row, col
+
+    def point_classes(self, x, y):
+        """Клас комірки (OUTSIDE/INSIDE/BOUNDARY) для кожної точки; точки поза растром – OUTSIDE."""
+        row, col = self._cell_index(x, y)
+        within = (row >= 0) & (row < self.resolution) & (col >= 0) & (col < self.resolution)
+        classes = np.full(row.shape, OUTSIDE, dtype=np.uint8)
+        classes[within] = self.cells[row[within], col[within]]
+        return classes
+
+    def contains_xy(self, x, y):
+        """Масив bool: чи знаходяться точки (x, y) всередині кордону (як shapely.contains_xy)."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        classes = self.point_classes(x, y)
+        result = classes == INSIDE
+        boundary = classes == BOUNDARY
+        if boundary.any():
+            result[boundary] = shapely.contains_xy(self.border, x[boundary], y[boundary])
+        return result
+
+    def contains_point(self, x, y):
+        """Чи знаходиться одна точка всередині кордону."""
+        return bool(self.contains_xy(np.array([x]), np.array([y]))[0])
+
+    def _bbox_counts(self, geometries):
+        """Для прямокутника комірок кожної геометрії: (кількість комірок, внутрішніх, зовнішніх, чи в межах растра)."""
+        bounds = shapely.bounds(geometries)
+        row0, col0 = self._cell_index(bounds[:, 0], bounds[:, 1])
+        row1, col1 = self._cell_index(bounds[:, 2], bounds[:, 3])
+        within = (row0 >= 0) & (col0 >= 0) & (row1 < self.resolution) & (col1 < self.resolution)
+        row0, col0 = np.clip(row0, 0, self.resolution), np.clip(col0, 0, self.resolution)
+        row1 = np.clip(row1 + 1, 0, self.resolution)
+        col1 = np.clip(col1 + 1, 0, self.resolution)
+
+        def rect_sum(table):
+            return table[row1, col1] - table[row0, col1] - table[row1, col0] + table[row0, col0]
+
+        n_cells = np.maximum(row1 - row0, 0) * np.maximum(col1 - col0, 0)
+        return n_cells, rect_sum(self._inside_sum), rect_sum(self._outside_sum), within
+
+    def contains(self, geometries):
+        """
+        Масив bool: чи знаходяться геометрії повністю всередині кордону (як shapely.contains).
+
+        Геометрія, прямокутник якої покритий лише внутрішніми комірками, лежить усередині;
+        якщо він покритий лише зовнішніми – зовні. Решта перевіряється точно.
+        """
+        geometries = np.asarray(geometries)
+        n_cells, n_inside, n_outside, within = self._bbox_counts(geometries)
+        result = within & (n_cells > 0) & (n_inside == n_cells)
+        exact = ~result & ~(n_outside == n_cells)
+        if exact.any():
+            result[exact] = shapely.contains(self.border, geometries[exact])
+        return result
+
+    def intersects(self, geometries):
+        """Масив bool: чи перетинають геометрії територію всередині кордону (як shapely.intersects)."""
+        geometries = np.asarray(geometries)
+        n_cells, n_inside, n_outside, within = self._bbox_counts(geometries)
+        result = within & (n_cells > 0) & (n_inside == n_cells)
+        exact = ~result & ~(n_outside == n_cells)
+        if exact.any():
+            result[exact] = shapely.intersects(self.border, geometries[exact])
+        return result
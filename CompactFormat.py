@@ -0,0 +1,86 @@
+"""
+Компактний двійковий формат шарів для веб-API (альтернатива GeoJSON).
+
+Структура (little-endian, усі масиви вирівняні на 4 байти, тож клієнт читає їх через typed arrays):
+
+    заголовок, 24 байти:
+        magic       4 байти  b'GEOC'
+        version     uint8    1
+        kind        uint8    KIND_POINTS або KIND_SECTORS
+        reserved    2 байти
+        count       uint32   кількість об'єктів
+        scale       uint32   множник квантування координат (1e6 – точність ~0.1 м)
+        next_cursor float64  курсор наступної сторінки або -1
+    id              uint32[count]
+    lon, lat        int32[count] кожен: квантовані координати, дельта-кодовані
+                    (перше значення абсолютне, далі різниця з попереднім)
+    лише KIND_SECTORS:
+    azimuth, radius_km, aperture  float32[count] кожен
+
+Для секторів передаються лише параметри (вершина, азимут, радіус, розкриття) – клієнт
+сам будує полігон. Дельти сусідніх об'єктів (впорядкованих за id) малі, тому gzip/brotli
+стискає їх значно краще, ніж повні координати.
+"""
+import struct
+
+import numpy as np
+
+
+MAGIC = b'GEOC'
+VERSION = 1
+KIND_POINTS = 1
+KIND_SECTORS = 2
+SCALE = 1000000
+MIMETYPE = 'application/x-geo-compact'
+
+_HEADER = struct.Struct('<4sBB2xIId')
+
+
+def _delta(values):
+    quantized = np.round(np.asarray(values, dtype=np.float64) * SCALE).astype(np.int64)
+    return np.diff(quantized, prepend=0).astype('<i4')
+
+
+def _encode(kind, ids, lon, lat, next_cursor, extra=()):
+    count = len(ids)
+    parts = [
+        _HEADER.pack(MAGIC, VERSION, kind, count, SCALE, -1.0 if next_cursor is None else float(next_cursor)),
+        np.asarray(ids, dtype='<u4').tobytes(),
+        _delta(lon).tobytes(),
+        _delta(lat).tobytes(),
+    ]
+    parts.extend(np.asarray(values, dtype='<f4').tobytes() for values in extra)
+    return b''.join(parts)
+
+
+def encode_points(ids, lon, lat, next_cursor=None):
+    """Кодує точки (вершини сітки)."""
+    return _encode(KIND_POINTS, ids, lon, lat, next_cursor)
+
+
+def encode_sectors(ids, apex_lon, apex_lat, azimuth, radius_km, aperture, next_cursor=None):
+    """Кодує сектори їх параметрами."""
+    return _encode(KIND_SECTORS, ids, apex_lon, apex_lat, next_cursor, (azimuth, radius_km, aperture))
+
+
+def decode(payload):
+    """Розбирає повідомлення у словник масивів (для перевірок і клієнтів на Python)."""
+    magic, version, kind, count, scale, next_cursor = _HEADER.unpack_from(payload, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Невідомий формат даних")
+    offset = _HEADER.size
+
+    def take(dtype):
+        nonlocal offset
+        values = np.frombuffer(payload, dtype=dtype, count=count, offset=offset)
+        offset += values.nbytes
+        return values
+
+    result = {'id': take('<u4').astype(np.int64)}
+    for name in ('lon', 'lat'):
+        result[name] = np.cumsum(take('<i4').astype(np.int64)) / scale
+    if kind == KIND_SECTORS:
+        for name in ('azimuth', 'radius_km', 'aperture'):
+            result[name] = take('<f4').astype(np.float64)
+    result['next_cursor'] = None if next_cursor < 0 else int(next_cursor)
+    return result
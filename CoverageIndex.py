@@ -0,0 +1,171 @@
+import threading
+import time
+
+import numpy as np
+import shapely
+
+
+# Етапи конвеєра, з результатів яких будується індекс
+COVERAGE_STAGES = ('grid_squares', 'grid_sectors', 'sector_intersections')
+
+
+class CoverageIndex:
+    """
+        Клас CoverageIndex – індекс у пам'яті для запитів «які сектори та вершини покривають місце».
+
+        Містить STRtree секторів, STRtree вершин сітки та збережені перетини (сектори, що
+        містять кожну вершину). Дані беруться з артефактів GeoDataManager для поточних відбитків
+        етапів у pipeline_stages, а за їх відсутності – з бази даних через DatabaseManager.
+
+        Відбитки етапів перевіряються не частіше ніж раз на poll_interval секунд; якщо вони
+        змінилися, новий індекс будується у фоновому потоці, а до його готовності запити
+        обслуговує попередній.
+    """
+
+    def __init__(self, db_manager, geo_manager, poll_interval=30):
+        self.db_manager = db_manager
+        self.geo_manager = geo_manager
+        self.poll_interval = poll_interval
+        self._snapshot = None
+        self._fingerprints = None
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+        self._building = False
+
+    def _stage_fingerprints(self):
+        fingerprints = []
+        for stage in COVERAGE_STAGES:
+            state = self.db_manager.get_stage(stage)
+            fingerprints.append(state['fingerprint'] if state is not None and state['completed'] else None)
+        return tuple(fingerprints)
+
+    def _load_stage(self, stage, fingerprint):
+        data = self.geo_manager.load_artifact(stage, fingerprint) if fingerprint is not None else None
+        if data is not None:
+            return data
+        if stage == 'sector_intersections':
+            return self.db_manager.read_intersection_pairs()
+        return self.db_manager.fetch_geodata(stage)[0]
+
+    def _build(self, fingerprints):
+        """Будує незмінний знімок індексу для заданих відбитків етапів."""
+        vertices, sectors, pairs = (self._load_stage(stage, fingerprint)
+                                    for stage, fingerprint in zip(COVERAGE_STAGES, fingerprints))
+
+        vertex_geoms = np.asarray(vertices.geometry.values)
+        vertex_ids = (vertices['id'].to_numpy(dtype=np.int64) if 'id' in vertices.columns
+                      else np.arange(1, len(vertices) + 1, dtype=np.int64))
+        sector_geoms = np.asarray(sectors.geometry.values)
+        sector_ids = (sectors['id'].to_numpy(dtype=np.int64) if 'id' in sectors.columns
+                      else np.arange(1, len(sectors) + 1, dtype=np.int64))
+
+        # Перетини, згруповані за вершиною: сектори вершини vertex_ids[k] – pair_sectors[offsets[k]:offsets[k + 1]]
+        sorter = np.argsort(vertex_ids)
+        point_pos = sorter[np.searchsorted(vertex_ids, pairs['point_id'], sorter=sorter)]
+        order = np.argsort(point_pos, kind='stable')
+        offsets = np.zeros(len(vertex_ids) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(point_pos, minlength=len(vertex_ids)))
+
+        return {
+            'vertex_tree': shapely.STRtree(vertex_geoms),
+            'vertex_ids': vertex_ids,
+            'vertex_xy': shapely.get_coordinates(vertex_geoms),
+            'sector_tree': shapely.STRtree(sector_geoms),
+            'sector_ids': sector_ids,
+            'sector_params': {
+                name: sectors[name].to_numpy() for name in ('apex_lon', 'apex_lat', 'azimuth')
+                if name in sectors.columns
+            },
+            'pair_sectors': np.asarray(pairs['sector_id'], dtype=np.int64)[order],
+            'pair_offsets': offsets,
+        }
+
+    def refresh(self):
+        """Синхронно перебудовує індекс, якщо відбитки етапів змінилися."""
+        self._last_poll = time.monotonic()
+        fingerprints = self._stage_fingerprints()
+        if fingerprints != self._fingerprints and all(fingerprints):
+            self._snapshot = self._build(fingerprints)
+            self._fingerprints = fingerprints
+            print("Індекс покриття оновлено.")
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Помилка при оновленні індексу покриття: {e}")
+        finally:
+            self._building = False
+
+    def _current(self):
+        """Повертає поточний знімок, за потреби запускаючи фонову перевірку відбитків."""
+        if time.monotonic() - self._last_poll >= self.poll_interval:
+            with self._lock:
+                if not self._building:
+                    self._building = True
+                    self._last_poll = time.monotonic()
+                    threading.Thread(target=self._refresh_in_background, daemon=True).start()
+        return self._snapshot
+
+    def _sector_records(self, snapshot, positions):
+        params = snapshot['sector_params']
+        return [
+            {'id': int(snapshot['sector_ids'][k]), **{name: float(values[k]) for name, values in params.items()}}
+            for k in positions
+        ]
+
+    def query_points(self, lon, lat):
+        """
+        Для кожної точки (lon, lat) повертає сектори, що її містять, та найближчу вершину сітки
+        разом із секторами, які містять цю вершину (за збереженими перетинами).
+        Повертає None, поки індекс не побудовано (етапи конвеєра не завершені).
+        """
+        snapshot = self._current()
+        if snapshot is None:
+            return None
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+
+        points = shapely.points(lon, lat)
+        point_idx, sector_pos = snapshot['sector_tree'].query(points, predicate='within')
+        order = np.lexsort((sector_pos, point_idx))
+        bounds = np.searchsorted(point_idx[order], np.arange(len(points) + 1))
+        sector_pos = sector_pos[order]
+
+        # Для порожніх точок і точок з NaN query_nearest нічого не повертає, тож результати
+        # розносяться за індексами вхідних точок, а не за позицією
+        input_idx, tree_idx = snapshot['vertex_tree'].query_nearest(points, all_matches=False)
+        nearest = np.full(len(points), -1, dtype=np.int64)
+        nearest[input_idx] = tree_idx
+
+        results = []
+        for k in range(len(points)):
+            vertex = None
+            if nearest[k] >= 0:
+                v = nearest[k]
+                offsets = snapshot['pair_offsets']
+                vertex = {
+                    'id': int(snapshot['vertex_ids'][v]),
+                    'lon': float(snapshot['vertex_xy'][v, 0]),
+                    'lat': float(snapshot['vertex_xy'][v, 1]),
+                    'sector_ids': snapshot['pair_sectors'][offsets[v]:offsets[v + 1]].tolist(),
+                }
+            results.append({
+                'lon': float(lon[k]),
+                'lat': float(lat[k]),
+                'sectors': self._sector_records(snapshot, sector_pos[bounds[k]:bounds[k + 1]]),
+                'vertex': vertex,
+            })
+        return results
+
+    def query_geometry(self, geometry):
+        """Сектори, що перетинають геометрію, та id вершин сітки всередині неї (None, поки індекс не побудовано)."""
+        snapshot = self._current()
+        if snapshot is None:
+            return None
+        sector_pos = np.sort(snapshot['sector_tree'].query(geometry, predicate='intersects'))
+        vertex_pos = np.sort(snapshot['vertex_tree'].query(geometry, predicate='contains'))
+        return {
+            'sectors': self._sector_records(snapshot, sector_pos),
+            'vertex_ids': snapshot['vertex_ids'][vertex_pos].tolist(),
+        }
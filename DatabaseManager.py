@@ -1,5 +1,140 @@
+import io
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
 from sqlalchemy import create_engine, text
 
+from Instrumentation import instrumented, arg_len, first_len, result_len
+
+
+# Формат PostgreSQL binary COPY: заголовок, рядки (кількість полів + поля з довжиною), завершення
+_COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+_COPY_TRAILER = struct.pack('>h', -1)
+_COPY_NULL = struct.pack('>i', -1)
+
+# Типи колонок фіксованої довжини та їх формат у struct
+_COPY_FIXED_FORMATS = {
+    'smallint': 'h',
+    'integer': 'i',
+    'bigint': 'q',
+    'real': 'f',
+    'double precision': 'd',
+    'boolean': '?',
+}
+
+
+def _encode_binary_copy(fixed_types, fixed_values, variable_values):
+    """
+    Кодує пакет рядків у формат binary COPY.
+
+    fixed_types/fixed_values – типи та списки значень колонок фіксованої довжини,
+    variable_values – списки вже закодованих у bytes значень (None для NULL).
+    Колонки фіксованої довжини йдуть першими, тому їх пакуємо одним struct на рядок.
+    """
+    n_fields = len(fixed_types) + len(variable_values)
+    sizes = [struct.calcsize('>' + _COPY_FIXED_FORMATS[t]) for t in fixed_types]
+    pack_fixed = struct.Struct('>h' + ''.join('i' + _COPY_FIXED_FORMATS[t] for t in fixed_types)).pack
+    pack_length = struct.Struct('>i').pack
+    n_rows = len(fixed_values[0]) if fixed_values else len(variable_values[0])
+
+    buffer = io.BytesIO()
+    buffer.write(_COPY_HEADER)
+    for row in range(n_rows):
+        fields = [n_fields]
+        for size, values in zip(sizes, fixed_values):
+            fields.append(size)
+            fields.append(values[row])
+        buffer.write(pack_fixed(*fields))
+        for values in variable_values:
+            value = values[row]
+            if value is None:
+                buffer.write(_COPY_NULL)
+            else:
+                buffer.write(pack_length(len(value)))
+                buffer.write(value)
+    buffer.write(_COPY_TRAILER)
+    buffer.seek(0)
+    return buffer
+
+# Умови з'єднання секторів з вершинами сітки для compute_intersections (s – grid_sectors, p – grid_squares).
+# 'contains' – вершина всередині полігона сектора (як метод 'strtree'); 'dwithin' – точний геодезичний
+# сектор за параметрами (як метод 'analytic' і з тими самими правилами): кандидати – вершини в охоплюючому
+# прямокутнику кола радіуса сектора, далі відстань на сфероїді (0 < відстань <= радіус) та відхилення
+# азимуту від вершини сектора. Обидві умови містять порівняння прямокутників (&&) з індексом GIST вершин.
+_INTERSECTION_JOINS = {
+    'contains': "JOIN grid_squares p ON ST_Contains(s.geometry, p.geometry)",
+    'dwithin': """
+        CROSS JOIN LATERAL (
+            SELECT ST_SetSRID(ST_MakePoint(s.apex_lon, s.apex_lat), 4326) AS apex,
+                   s.radius_km * 1000 / 110574.0 * 1.01 AS dlat
+        ) a
+        CROSS JOIN LATERAL (
+            SELECT a.dlat * 110574.0 / (111320.0 * cos(radians(least(abs(s.apex_lat) + a.dlat, 89.9)))) AS dlon
+        ) b
+        JOIN grid_squares p
+          ON p.geometry && ST_Expand(a.apex, b.dlon, a.dlat)
+         AND ST_DWithin(p.geometry::geography, a.apex::geography, s.radius_km * 1000)
+        CROSS JOIN LATERAL (
+            SELECT ST_Distance(p.geometry::geography, a.apex::geography) AS distance,
+                   degrees(ST_Azimuth(a.apex::geography, p.geometry::geography)) - s.azimuth AS deviation
+        ) d
+    """,
+}
+_INTERSECTION_FILTERS = {
+    'contains': "",
+    # Відстань 0 – сама вершина сектора (як distance_m > 0 в аналітичному методі); відхилення
+    # зводиться до [-180, 180), як ((bearing - azimuth + 180) % 360 - 180) у Python
+    'dwithin': "AND d.distance > 0 AND abs(d.deviation - 360 * floor((d.deviation + 180) / 360)) <= s.aperture / 2",
+}
+
+# Таблиці, що (прямо чи через інші таблиці) посилаються зовнішніми ключами на задану, від найглибших
+_REFERENCING_TABLES = """
+    WITH RECURSIVE dependents (oid, depth) AS (
+        SELECT conrelid, 1 FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = %(table_name)s::regclass AND conrelid <> confrelid
+        UNION
+        SELECT c.conrelid, d.depth + 1 FROM pg_constraint c
+        JOIN dependents d ON c.confrelid = d.oid
+        WHERE c.contype = 'f' AND c.conrelid <> c.confrelid AND d.depth < 16
+    )
+    SELECT oid::regclass::text FROM dependents GROUP BY oid ORDER BY max(depth) DESC;
+"""
+
+# Версії даних таблиць: кожен запис у таблицю збільшує її версію в тій самій транзакції,
+# тож кеш відповідей server.py (ключ містить версії) не віддає застарілих даних
+_CREATE_DATA_VERSIONS = """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        table_name VARCHAR(64) PRIMARY KEY,
+        version BIGINT NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT now()
+    );
+"""
+_BUMP_VERSION = """
+    INSERT INTO data_versions (table_name, version, updated_at) VALUES (%(table_name)s, 1, now())
+    ON CONFLICT (table_name) DO UPDATE SET version = data_versions.version + 1, updated_at = now();
+"""
+
+
+def _row_count(result, *args, **kwargs):
+    return result
+
+
+def _batch_rows(result, db_manager, batch, *args, **kwargs):
+    return sum(len(geodata) for geodata, _ in batch.values())
+
+
+def _pair_count(result, *args, **kwargs):
+    return len(result['sector_id'])
+
+
+def _column_rows(result, *args, **kwargs):
+    return len(result[0]['id'])
+
+
 class DatabaseManager:
     """
        Клас DatabaseManager відповідає за керування базою даних PostgreSQL з підтримкою PostGIS.
@@ -13,8 +148,9 @@ class DatabaseManager:
        Використовує SQLAlchemy для роботи з базою даних та GeoPandas для геопросторових операцій.
     """
 
-    def __init__(self, user, password, host, db_name):
-        self.engine = create_engine(f'postgresql://{user}:{password}@{host}/{db_name}')
+    def __init__(self, user, password, host, db_name, **engine_options):
+        # engine_options – параметри create_engine, наприклад розмір пулу з'єднань для server.py
+        self.engine = create_engine(f'postgresql://{user}:{password}@{host}/{db_name}', **engine_options)
 
     def data_exists(self, table_name):
         """Перевіряє, чи є дані у таблиці."""
@@ -41,43 +177,67 @@ class DatabaseManager:
             result = conn.execute(text(query)).scalar()
         return result
 
+    @instrumented()
     def create_tables(self):
         """Створює таблиці лише, якщо їх немає."""
         if not self.table_exists('ukraine_border'):
-            with self.engine.connect() as conn:
+            with self.engine.begin() as conn:
                 conn.execute(text("""
                     CREATE TABLE ukraine_border (
                         id SERIAL PRIMARY KEY,
                         name VARCHAR(100),
-                        geometry GEOMETRY(Polygon, 4326)
+                        geometry GEOMETRY(Geometry, 4326)
                     );
                 """))
                 print("Таблиця 'ukraine_border' створена.")
 
         if not self.table_exists('grid_squares'):
-            with self.engine.connect() as conn:
+            with self.engine.begin() as conn:
                 conn.execute(text("""
                     CREATE TABLE grid_squares (
                         id SERIAL PRIMARY KEY,
-                        geometry GEOMETRY(Polygon, 4326) NOT NULL,
+                        geometry GEOMETRY(Point, 4326) NOT NULL,
                         CONSTRAINT grid_squares_geometry_unique UNIQUE (geometry)
                     );
                 """))
                 print("Таблиця 'grid_squares' створена.")
 
+        # Попередні версії створювали ці колонки з типом Polygon, до якого не підходять ні вершини
+        # сітки (Point), ні кордон з кількох частин (MultiPolygon); тип послаблюється до Geometry
+        with self.engine.begin() as conn:
+            for table_name in ('ukraine_border', 'grid_squares'):
+                geometry_type = conn.execute(text("""
+                    SELECT type FROM geometry_columns
+                    WHERE f_table_schema = 'public' AND f_table_name = :table_name AND f_geometry_column = 'geometry';
+                """), {'table_name': table_name}).scalar()
+                if geometry_type == 'POLYGON':
+                    conn.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN geometry TYPE GEOMETRY(Geometry, 4326);"))
+
         if not self.table_exists('grid_sectors'):
-            with self.engine.connect() as conn:
+            with self.engine.begin() as conn:
                 conn.execute(text("""
                     CREATE TABLE grid_sectors (
                         id SERIAL PRIMARY KEY,
+                        apex_lon DOUBLE PRECISION,
+                        apex_lat DOUBLE PRECISION,
+                        azimuth DOUBLE PRECISION,
+                        radius_km DOUBLE PRECISION,
+                        aperture DOUBLE PRECISION,
                         geometry GEOMETRY(Polygon, 4326) NOT NULL,
                         CONSTRAINT grid_sectors_geometry_unique UNIQUE (geometry)
                     );
                 """))
                 print("Таблиця 'grid_sectors' створена.")
+        else:
+            # Параметри секторів додано пізніше – доповнюємо вже існуючу таблицю
+            with self.engine.begin() as conn:
+                for column in ('apex_lon', 'apex_lat', 'azimuth', 'radius_km', 'aperture'):
+                    conn.execute(text(
+                        f"ALTER TABLE grid_sectors ADD COLUMN IF NOT EXISTS {column} DOUBLE PRECISION;"
+                    ))
 
         if not self.table_exists('sector_intersections'):
-            with self.engine.connect() as conn:
+            with self.engine.begin() as conn:
                 conn.execute(text("""
                     CREATE TABLE sector_intersections (
                         id SERIAL PRIMARY KEY,
@@ -90,34 +250,560 @@ class DatabaseManager:
                 """))
                 print("Таблиця 'sector_intersections' створена.")
 
-    def save_geodata(self, geodata, table_name):
+        # Метадані етапів конвеєра: відбиток вхідних даних і параметрів та прогрес по пакетах
+        with self.engine.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS pipeline_stages (
+                    stage VARCHAR(64) PRIMARY KEY,
+                    fingerprint VARCHAR(64) NOT NULL,
+                    completed BOOLEAN NOT NULL DEFAULT FALSE,
+                    chunks_done INTEGER NOT NULL DEFAULT 0,
+                    rows_done BIGINT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP NOT NULL DEFAULT now()
+                );
+            """))
+
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(_CREATE_DATA_VERSIONS)
+
+        # Піраміда рівнів деталізації (LodPyramid): таблиці рівнів з номером діапазону масштабів
+        # zoom_band та опис діапазонів у lod_levels
+        with self.engine.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS grid_lod (
+                    id SERIAL PRIMARY KEY,
+                    zoom_band INTEGER NOT NULL,
+                    vertex_count INTEGER NOT NULL,
+                    geometry GEOMETRY(Polygon, 4326) NOT NULL
+                );
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS sector_lod (
+                    id SERIAL PRIMARY KEY,
+                    zoom_band INTEGER NOT NULL,
+                    sector_id INTEGER NOT NULL,
+                    azimuth DOUBLE PRECISION,
+                    geometry GEOMETRY(Polygon, 4326) NOT NULL
+                );
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS sector_density_lod (
+                    id SERIAL PRIMARY KEY,
+                    zoom_band INTEGER NOT NULL,
+                    sector_count INTEGER NOT NULL,
+                    geometry GEOMETRY(Polygon, 4326) NOT NULL
+                );
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS lod_levels (
+                    layer VARCHAR(32) NOT NULL,
+                    min_zoom INTEGER NOT NULL,
+                    max_zoom INTEGER,
+                    kind VARCHAR(16) NOT NULL,
+                    detail DOUBLE PRECISION,
+                    table_name VARCHAR(64) NOT NULL,
+                    PRIMARY KEY (layer, min_zoom)
+                );
+            """))
+            for table_name in ('grid_lod', 'sector_lod', 'sector_density_lod'):
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {table_name}_zoom_band ON {table_name} (zoom_band);"
+                ))
+
+        # Індекс за сектором: заміна перетинів діапазону секторів у compute_intersections
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS sector_intersections_sector_id ON sector_intersections (sector_id);"
+            ))
+
+        # Просторові індекси GIST для вибірок за областю перегляду (ST_Intersects / &&)
+        with self.engine.begin() as conn:
+            for table_name, column in (('ukraine_border', 'geometry'), ('grid_squares', 'geometry'),
+                                       ('grid_sectors', 'geometry'), ('sector_intersections', 'point_coordinates'),
+                                       ('grid_lod', 'geometry'), ('sector_lod', 'geometry'),
+                                       ('sector_density_lod', 'geometry')):
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {table_name}_{column}_gist ON {table_name} USING GIST ({column});"
+                ))
+
+    @staticmethod
+    def _viewport_query(table_name, select, bbox=None, limit=None, cursor=None, zoom_band=None):
+        """
+        SQL та параметри вибірки з фільтром bbox (ST_Intersects) і сторінками за id (keyset);
+        zoom_band – діапазон масштабів у таблицях рівнів деталізації.
+        """
+        conditions = []
+        params = {}
+        if zoom_band is not None:
+            conditions.append("zoom_band = %(zoom_band)s")
+            params['zoom_band'] = int(zoom_band)
+        if bbox is not None:
+            conditions.append("ST_Intersects(geometry, ST_MakeEnvelope(%(minx)s, %(miny)s, %(maxx)s, %(maxy)s, 4326))")
+            params.update(zip(('minx', 'miny', 'maxx', 'maxy'), (float(value) for value in bbox)))
+        if cursor is not None:
+            conditions.append("id > %(cursor)s")
+            params['cursor'] = int(cursor)
+
+        query = f"SELECT {select} FROM {table_name}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id"
+        if limit is not None:
+            # Беремо на один рядок більше, щоб знати, чи є наступна сторінка
+            query += " LIMIT %(limit)s"
+            params['limit'] = int(limit) + 1
+        return query, params
+
+    @instrumented(items=first_len)
+    def fetch_geodata(self, table_name, bbox=None, limit=None, cursor=None, zoom_band=None):
+        """
+        Читає геодані таблиці з фільтром за областю та посторінковою вибіркою.
+
+        bbox – (minx, miny, maxx, maxy) у EPSG:4326, вибірка через ST_Intersects (індекс GIST).
+        Сторінки впорядковані за id: cursor – останній id попередньої сторінки, limit – розмір сторінки.
+        zoom_band – діапазон масштабів (лише для таблиць рівнів деталізації).
+        Повертає (GeoDataFrame, next_cursor); next_cursor дорівнює None на останній сторінці.
+        """
+        query, params = self._viewport_query(table_name, "*", bbox, limit, cursor, zoom_band)
+        geodata = gpd.read_postgis(query, self.engine, geom_col='geometry', params=params)
+
+        next_cursor = None
+        if limit is not None and len(geodata) > limit:
+            geodata = geodata.iloc[:limit]
+            next_cursor = int(geodata['id'].iloc[-1])
+        return geodata, next_cursor
+
+    @instrumented(items=_column_rows)
+    def fetch_columns(self, table_name, columns, bbox=None, limit=None, cursor=None, zoom_band=None):
+        """
+        Як fetch_geodata, але без геометрії: columns – {назва: SQL-вираз} (наприклад, ST_X(geometry)).
+        Повертає ({назва: масив numpy}, next_cursor); колонка id додається завжди.
+        """
+        columns = {'id': 'id', **columns}
+        select = ', '.join(f"{expression} AS {name}" for name, expression in columns.items())
+        query, params = self._viewport_query(table_name, select, bbox, limit, cursor, zoom_band)
+        frame = pd.read_sql(query, self.engine, params=params)
+
+        next_cursor = None
+        if limit is not None and len(frame) > limit:
+            frame = frame.iloc[:limit]
+            next_cursor = int(frame['id'].iloc[-1])
+        return {name: frame[name].to_numpy() for name in columns}, next_cursor
+
+    @instrumented(items=_pair_count)
+    def read_intersection_pairs(self):
+        """Повертає пари перетинів як словник масивів {'sector_id', 'point_id'} (int64) у порядку id."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(text("SELECT sector_id, point_id FROM sector_intersections ORDER BY id;")).fetchall()
+        pairs = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        return {'sector_id': pairs[:, 0].copy(), 'point_id': pairs[:, 1].copy()}
+
+    @instrumented(items=result_len)
+    def get_mvt_tile(self, table_name, layer_name, z, x, y, extent=4096, buffer=64, attributes=(), zoom_band=None):
+        """
+        Генерує векторну плитку Mapbox Vector Tile (ST_AsMVT) для таблиці.
+
+        z/x/y – координати плитки у схемі XYZ (Web Mercator), layer_name – назва шару в плитці,
+        attributes – додаткові колонки, що потрапляють у властивості об'єктів,
+        zoom_band – діапазон масштабів (лише для таблиць рівнів деталізації).
+        Повертає bytes (порожні, якщо в плитці немає об'єктів).
+        """
+        columns = ''.join(f", t.{column}" for column in attributes)
+        band_filter = " AND t.zoom_band = :zoom_band" if zoom_band is not None else ""
+        query = text(f"""
+            WITH bounds AS (
+                SELECT ST_TileEnvelope(:z, :x, :y) AS geom_3857,
+                       ST_Transform(ST_TileEnvelope(:z, :x, :y), 4326) AS geom_4326
+            ),
+            mvtgeom AS (
+                SELECT t.id{columns},
+                       ST_AsMVTGeom(ST_Transform(t.geometry, 3857), bounds.geom_3857, :extent, :buffer) AS geom
+                FROM {table_name} t, bounds
+                WHERE ST_Intersects(t.geometry, bounds.geom_4326){band_filter}
+            )
+            SELECT ST_AsMVT(mvtgeom.*, :layer_name, :extent, 'geom') FROM mvtgeom;
+        """)
+        with self.engine.connect() as conn:
+            tile = conn.execute(query, {
+                'z': z, 'x': x, 'y': y, 'extent': extent, 'buffer': buffer, 'layer_name': layer_name,
+                'zoom_band': zoom_band
+            }).scalar()
+        return bytes(tile) if tile is not None else b''
+
+    def _table_columns(self, table_name):
+        """Повертає колонки таблиці у вигляді {назва: тип} в порядку їх оголошення."""
+        query = text("""
+            SELECT column_name, data_type, udt_name
+            FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = :table_name
+            ORDER BY ordinal_position;
+        """)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query, {'table_name': table_name}).fetchall()
+        return {name: (udt_name if data_type == 'USER-DEFINED' else data_type) for name, data_type, udt_name in rows}
+
+    def _copy_columns(self, geodata, table_name, id_offset=0):
+        """
+        Готує колонки для COPY: [(колонка таблиці, тип, значення)] у порядку
+        «спершу фіксованої довжини», та найбільший записаний id (None, якщо id не записується),
+        щоб після завантаження узгодити з ним послідовність SERIAL.
+        """
+        table_columns = self._table_columns(table_name)
+        geometry_columns = [name for name, pg_type in table_columns.items() if pg_type == 'geometry']
+        explicit_ids = 'id' in table_columns and 'id' not in geodata.columns
+
+        columns = []
+        if explicit_ids:
+            # Явні id (id_offset+1)..(id_offset+N) збігаються з SERIAL після очищення таблиці (послідовність скидається)
+            # і не залежать від порядку INSERT
+            ids = np.arange(id_offset + 1, id_offset + len(geodata) + 1)
+            columns.append(('id', table_columns['id'], ids.tolist()))
+
+        geometry_name = geodata.geometry.name if isinstance(geodata, gpd.GeoDataFrame) else None
+        for name in geodata.columns:
+            if name == geometry_name:
+                continue
+            if name not in table_columns or table_columns[name] == 'geometry':
+                continue
+            pg_type = table_columns[name]
+            values = geodata[name].tolist()
+            if pg_type not in _COPY_FIXED_FORMATS:
+                values = [None if value is None else str(value).encode('utf-8') for value in values]
+            columns.append((name, pg_type, values))
+
+        if geometry_name is not None and len(geometry_columns) == 1:
+            srid = geodata.crs.to_epsg() if geodata.crs is not None else None
+            geometries = shapely.set_srid(np.asarray(geodata.geometry.values), srid or 4326)
+            values = shapely.to_wkb(geometries, include_srid=True).tolist()
+            columns.append((geometry_columns[0], 'geometry', values))
+
+        columns.sort(key=lambda column: column[1] not in _COPY_FIXED_FORMATS)
+        ids = next((values for name, _, values in columns if name == 'id'), None)
+        return columns, (max(ids) if ids else None)
+
+    def _copy_chunks(self, cursor, columns, target, n_rows, chunk_size):
+        """Передає рядки в target через COPY ... FROM STDIN (binary) пакетами по chunk_size."""
+        names = ', '.join(name for name, _, _ in columns)
+        fixed_types = [pg_type for _, pg_type, _ in columns if pg_type in _COPY_FIXED_FORMATS]
+        n_fixed = len(fixed_types)
+        for start in range(0, n_rows, chunk_size):
+            chunk = [values[start:start + chunk_size] for _, _, values in columns]
+            buffer = _encode_binary_copy(fixed_types, chunk[:n_fixed], chunk[n_fixed:])
+            cursor.copy_expert(f"COPY {target} ({names}) FROM STDIN WITH (FORMAT binary)", buffer)
+
+    @staticmethod
+    def _clear_table(cursor, table_name):
+        """
+        Видаляє рядки таблиці та таблиць, що посилаються на неї (як TRUNCATE ... RESTART IDENTITY CASCADE),
+        і скидає їх послідовності id. На відміну від TRUNCATE, DELETE не бере ACCESS EXCLUSIVE, тож
+        читачі до COMMIT бачать старі дані без очікування. Виконується в транзакції cursor.
+        """
+        cursor.execute(_REFERENCING_TABLES, {'table_name': table_name})
+        dependents = [name for name, in cursor.fetchall()]
+        # Спершу залежні таблиці (найглибші першими), щоб не порушити зовнішні ключі
+        for name in dependents + [table_name]:
+            cursor.execute(f"DELETE FROM {name};")
+            cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), 1, false);", (name,))
+            cursor.execute(_BUMP_VERSION, {'table_name': name})
+
+    @instrumented(items=arg_len(1))
+    def copy_geodata(self, geodata, table_name, chunk_size=50000):
+        """
+        Атомарно замінює вміст таблиці потоковим COPY ... FROM STDIN (binary, геометрія в EWKB).
+
+        Дані пакетами по chunk_size рядків завантажуються в тимчасову staging-таблицю,
+        після чого в одній транзакції таблиця очищається (_clear_table) та заповнюється зі staging.
+        До COMMIT читачі (server.py) бачать старі дані без очікування; при помилці все відкочується.
+        """
+        columns, max_id = self._copy_columns(geodata, table_name)
+        names = ', '.join(name for name, _, _ in columns)
+        staging = f"{table_name}_staging"
+
+        raw_conn = self.engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            cursor.execute(
+                f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {names} FROM {table_name} WITH NO DATA;"
+            )
+            self._copy_chunks(cursor, columns, staging, len(geodata), chunk_size)
+
+            self._clear_table(cursor, table_name)
+            cursor.execute(f"INSERT INTO {table_name} ({names}) SELECT {names} FROM {staging};")
+            if max_id is not None:
+                cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s);", (table_name, max_id))
+            raw_conn.commit()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+
+    @instrumented(items=arg_len(1))
+    def append_geodata(self, geodata, table_name, id_offset=0, stage=None, chunk_index=None, chunk_size=50000):
+        """
+        Дописує пакет рядків у таблицю через COPY (без очищення).
+
+        Якщо передано stage та chunk_index, у тій самій транзакції в pipeline_stages
+        фіксується, що пакет chunk_index етапу stage збережено, тож після переривання
+        обробку можна продовжити з наступного пакета.
+        """
+        stages = {stage: len(geodata)} if stage is not None else {}
+        self._append_tables([(geodata, table_name, id_offset)], stages, chunk_index, chunk_size)
+
+    @instrumented(items=_batch_rows)
+    def append_batch(self, batch, chunk_index, chunk_size=50000):
+        """
+        Дописує пакет кількох етапів однією транзакцією: batch – {етап: (geodata, id_offset)},
+        назва етапу збігається з назвою його таблиці. Прогрес усіх етапів фіксується разом,
+        тож після переривання вони продовжуються з того самого пакета.
+        """
+        self._append_tables(
+            [(geodata, stage, id_offset) for stage, (geodata, id_offset) in batch.items()],
+            {stage: len(geodata) for stage, (geodata, _) in batch.items()}, chunk_index, chunk_size
+        )
+
+    def _append_tables(self, tables, stages, chunk_index, chunk_size):
+        """Дописує [(geodata, таблиця, id_offset)] і прогрес {етап: кількість рядків} в одній транзакції."""
+        raw_conn = self.engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            for geodata, table_name, id_offset in tables:
+                columns, max_id = self._copy_columns(geodata, table_name, id_offset)
+                self._copy_chunks(cursor, columns, table_name, len(geodata), chunk_size)
+                if max_id is not None:
+                    cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s);", (table_name, max_id))
+                cursor.execute(_BUMP_VERSION, {'table_name': table_name})
+            for stage, n_rows in stages.items():
+                cursor.execute("""
+                    UPDATE pipeline_stages
+                    SET chunks_done = %s, rows_done = rows_done + %s, updated_at = now()
+                    WHERE stage = %s;
+                """, (chunk_index + 1, n_rows, stage))
+            raw_conn.commit()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+
+    @instrumented(items=_row_count)
+    def compute_intersections(self, predicate='contains', partition_size=20000, workers=4):
+        """
+        Обчислює sector_intersections у самій базі: INSERT ... SELECT з'єднанням grid_sectors
+        з grid_squares (умова predicate – див. _INTERSECTION_JOINS) через індекс GIST вершин.
+
+        Сектори діляться на діапазони id по partition_size; діапазони обробляються паралельно
+        в workers з'єднаннях пулу engine, кожен в окремій транзакції, яка спершу видаляє
+        перетини свого діапазону, тож повторний запуск після переривання не дублює рядки.
+        sector_id та point_id – справжні id рядків grid_sectors та grid_squares.
+        Повертає кількість записаних перетинів.
+        """
+        if predicate not in _INTERSECTION_JOINS:
+            raise ValueError(f"Невідома умова перетину: {predicate}")
+
+        with self.engine.begin() as conn:
+            # Свіжа статистика, щоб планувальник обрав вкладений цикл по індексу GIST
+            conn.execute(text("ANALYZE grid_sectors;"))
+            conn.execute(text("ANALYZE grid_squares;"))
+            first_id, last_id = conn.execute(text("SELECT min(id), max(id) FROM grid_sectors;")).one()
+        if first_id is None:
+            return 0
+
+        query = text(f"""
+            INSERT INTO sector_intersections (sector_id, point_id, point_coordinates)
+            SELECT s.id, p.id, p.geometry
+            FROM grid_sectors s
+            {_INTERSECTION_JOINS[predicate]}
+            WHERE s.id BETWEEN :first AND :last {_INTERSECTION_FILTERS[predicate]}
+            ORDER BY s.id, p.id;
+        """)
+        partitions = [
+            {'first': start, 'last': min(start + partition_size - 1, last_id)}
+            for start in range(first_id, last_id + 1, partition_size)
+        ]
+
+        def run_partition(params):
+            with self.engine.begin() as conn:
+                conn.execute(text("DELETE FROM sector_intersections WHERE sector_id BETWEEN :first AND :last;"),
+                             params)
+                return conn.execute(query, params).rowcount
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            n_rows = sum(executor.map(run_partition, partitions))
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(_BUMP_VERSION, {'table_name': 'sector_intersections'})
+        return n_rows
+
+    def get_stage(self, stage):
+        """Повертає стан етапу конвеєра (fingerprint, completed, chunks_done, rows_done) або None."""
+        query = text("""
+            SELECT fingerprint, completed, chunks_done, rows_done
+            FROM pipeline_stages WHERE stage = :stage;
+        """)
+        with self.engine.connect() as conn:
+            row = conn.execute(query, {'stage': stage}).mappings().first()
+        return dict(row) if row is not None else None
+
+    def start_stage(self, stage, fingerprint, table_name=None):
+        """
+        Починає етап з новим відбитком: очищає його таблицю (якщо задана, див. _clear_table)
+        та скидає прогрес. Обидві дії виконуються в одній транзакції.
+        """
+        raw_conn = self.engine.raw_connection()
         try:
-            with self.engine.connect() as conn:
-                # Перевірка, чи є залежні таблиці, та їх очищення
-                if table_name == 'grid_squares':
-                    conn.execute(text("DELETE FROM sector_intersections;"))
+            cursor = raw_conn.cursor()
+            if table_name is not None:
+                self._clear_table(cursor, table_name)
+            cursor.execute("""
+                INSERT INTO pipeline_stages (stage, fingerprint, completed, chunks_done, rows_done, updated_at)
+                VALUES (%(stage)s, %(fingerprint)s, FALSE, 0, 0, now())
+                ON CONFLICT (stage) DO UPDATE
+                SET fingerprint = EXCLUDED.fingerprint, completed = FALSE,
+                    chunks_done = 0, rows_done = 0, updated_at = now();
+            """, {'stage': stage, 'fingerprint': fingerprint})
+            raw_conn.commit()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+
+    def complete_stage(self, stage, fingerprint):
+        """Позначає етап завершеним для заданого відбитка."""
+        with self.engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO pipeline_stages (stage, fingerprint, completed, updated_at)
+                VALUES (:stage, :fingerprint, TRUE, now())
+                ON CONFLICT (stage) DO UPDATE
+                SET fingerprint = EXCLUDED.fingerprint, completed = TRUE, updated_at = now();
+            """), {'stage': stage, 'fingerprint': fingerprint})
 
-                # Очищення основної таблиці з використанням CASCADE
-                conn.execute(text(f"TRUNCATE TABLE {table_name} RESTART IDENTITY CASCADE;"))
+    def get_lod_levels(self):
+        """
+        Рівні деталізації {шар: [рівень]} від найдетальнішого (див. LodPyramid);
+        порожній словник, якщо піраміду ще не побудовано.
+        """
+        if not self.table_exists('lod_levels'):
+            return {}
+        query = text("""
+            SELECT layer, kind, detail, min_zoom, max_zoom, table_name
+            FROM lod_levels ORDER BY layer, min_zoom DESC;
+        """)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).mappings().all()
+        levels = {}
+        for row in rows:
+            levels.setdefault(row['layer'], []).append(dict(row))
+        return levels
 
-            # Збереження нових даних
-            geodata.to_postgis(table_name, self.engine, if_exists='append', index=False)
+    def save_lod_levels(self, levels):
+        """Замінює опис рівнів деталізації в lod_levels однією транзакцією."""
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM lod_levels;"))
+            if levels:
+                conn.execute(text("""
+                    INSERT INTO lod_levels (layer, min_zoom, max_zoom, kind, detail, table_name)
+                    VALUES (:layer, :min_zoom, :max_zoom, :kind, :detail, :table_name);
+                """), [dict(level) for level in levels])
+            conn.exec_driver_sql(_BUMP_VERSION, {'table_name': 'lod_levels'})
+
+    def bump_data_version(self, name):
+        """Збільшує версію даних name поза записом у таблицю (наприклад, 'tiles' після заповнення TileCache)."""
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(_CREATE_DATA_VERSIONS)
+            conn.exec_driver_sql(_BUMP_VERSION, {'table_name': name})
+
+    def get_data_versions(self):
+        """Версії даних таблиць {таблиця: версія}; None, якщо таблицю data_versions ще не створено."""
+        if not self.table_exists('data_versions'):
+            return None
+        with self.engine.connect() as conn:
+            rows = conn.execute(text("SELECT table_name, version FROM data_versions;")).all()
+        return {table_name: version for table_name, version in rows}
+
+    def create_sweep_tables(self, name):
+        """Створює таблиці результатів конфігурації ParameterSweep: sweep_<name>_vertices, _sectors, _intersections."""
+        prefix = f"sweep_{name}"
+        with self.engine.begin() as conn:
+            # save_geodata оновлює версії даних – таблиця потрібна й без create_tables
+            conn.exec_driver_sql(_CREATE_DATA_VERSIONS)
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {prefix}_vertices (
+                    id SERIAL PRIMARY KEY,
+                    geometry GEOMETRY(Point, 4326) NOT NULL
+                );
+            """))
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {prefix}_sectors (
+                    id SERIAL PRIMARY KEY,
+                    apex_lon DOUBLE PRECISION,
+                    apex_lat DOUBLE PRECISION,
+                    azimuth DOUBLE PRECISION,
+                    radius_km DOUBLE PRECISION,
+                    aperture DOUBLE PRECISION,
+                    geometry GEOMETRY(Polygon, 4326)
+                );
+            """))
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {prefix}_intersections (
+                    id SERIAL PRIMARY KEY,
+                    sector_id INTEGER NOT NULL,
+                    point_id INTEGER NOT NULL
+                );
+            """))
+            for table_name in (f"{prefix}_vertices", f"{prefix}_sectors"):
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {table_name}_geometry_gist ON {table_name} USING GIST (geometry);"
+                ))
+
+    def save_sweep_summary(self, summaries):
+        """Записує (або оновлює за назвою) підсумки конфігурацій ParameterSweep у таблицю sweep_summary."""
+        with self.engine.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS sweep_summary (
+                    name VARCHAR(64) PRIMARY KEY,
+                    step_km DOUBLE PRECISION NOT NULL,
+                    radius_km DOUBLE PRECISION NOT NULL,
+                    azimuths VARCHAR(256) NOT NULL,
+                    aperture DOUBLE PRECISION NOT NULL,
+                    angle_step DOUBLE PRECISION NOT NULL,
+                    n_vertices INTEGER NOT NULL,
+                    n_sectors INTEGER NOT NULL,
+                    n_pairs BIGINT NOT NULL,
+                    covered_vertices INTEGER NOT NULL,
+                    coverage_ratio DOUBLE PRECISION NOT NULL,
+                    mean_overlap DOUBLE PRECISION NOT NULL,
+                    max_overlap INTEGER NOT NULL,
+                    seconds DOUBLE PRECISION NOT NULL,
+                    updated_at TIMESTAMP NOT NULL DEFAULT now()
+                );
+            """))
+            if summaries:
+                columns = list(summaries[0])
+                updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in columns if column != 'name')
+                conn.execute(text(f"""
+                    INSERT INTO sweep_summary ({', '.join(columns)})
+                    VALUES ({', '.join(':' + column for column in columns)})
+                    ON CONFLICT (name) DO UPDATE SET {updates}, updated_at = now();
+                """), summaries)
+
+    def save_geodata(self, geodata, table_name, chunk_size=50000):
+        """Замінює дані таблиці новими (див. copy_geodata); рядки залежних таблиць видаляються."""
+        try:
+            self.copy_geodata(geodata, table_name, chunk_size)
             print(f"Дані успішно збережено в таблиці {table_name}.")
         except Exception as e:
             print(f"Помилка при збереженні даних у таблицю {table_name}: {e}")
             raise e
 
-    def save_intersections(self, intersections):
+    def save_intersections(self, intersections, chunk_size=50000):
         """Зберігає результати перетину у таблицю sector_intersections."""
-        with self.engine.connect() as conn:
-            for intersection in intersections:
-                query = text("""
-                    INSERT INTO sector_intersections (sector_id, point_id, point_coordinates)
-                    VALUES (:sector_id, :point_id, ST_GeomFromText(:point_wkt, 4326))
-                """)
-                conn.execute(query, {
-                    'sector_id': intersection['sector_id'],
-                    'point_id': intersection['point_id'],
-                    'point_wkt': intersection['point_coordinates'].wkt
-                })
-        print("Перетини успішно збережені у таблиці sector_intersections.")
\ No newline at end of file
+        if not isinstance(intersections, gpd.GeoDataFrame):
+            intersections = list(intersections)
+            intersections = gpd.GeoDataFrame({
+                'sector_id': [item['sector_id'] for item in intersections],
+                'point_id': [item['point_id'] for item in intersections],
+            }, geometry=[item['point_coordinates'] for item in intersections], crs="EPSG:4326")
+
+        self.copy_geodata(intersections, 'sector_intersections', chunk_size)
+        print("Перетини успішно збережені у таблиці sector_intersections.")
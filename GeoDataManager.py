@@ -4,24 +4,268 @@ import pandas as pd
 import geopandas as gpd
 import numpy as np
 import multiprocessing as mp
+import glob
+import os
+from collections import deque
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import shapely
+
+from BorderIndex import BorderIndex
+from GridLattice import GridLattice
+from Instrumentation import instrumented, pool_task, PoolTracker, result_len, first_len
+
+
+# Параметри еліпсоїда WGS84 (ті самі, що використовує geopy за замовчуванням)
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+
+def _geodesic_direct(lat, lon, azimuth, distance_m, max_iter=50, tol=1e-12):
+    """
+    Векторизована пряма геодезична задача (формули Вінсенті) на еліпсоїді WGS84.
+
+    Приймає масиви (або скаляри) однакової чи сумісної для broadcasting форми:
+    широту та довготу початкової точки і азимут у градусах, відстань у метрах.
+    Повертає кортеж (lat, lon) кінцевих точок у градусах.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    alpha1 = np.radians(np.asarray(azimuth, dtype=np.float64))
+    distance_m = np.asarray(distance_m, dtype=np.float64)
+
+    sin_alpha1 = np.sin(alpha1)
+    cos_alpha1 = np.cos(alpha1)
+
+    tan_u1 = (1 - WGS84_F) * np.tan(np.radians(lat))
+    cos_u1 = 1 / np.sqrt(1 + tan_u1 ** 2)
+    sin_u1 = tan_u1 * cos_u1
+
+    # sin/cos(2·sigma1) без тригонометрії: tan(sigma1) = tan_u1 / cos_alpha1
+    norm = np.hypot(tan_u1, cos_alpha1)
+    sin_sigma1 = tan_u1 / norm
+    cos_sigma1 = cos_alpha1 / norm
+    sin_2sigma1 = 2 * sin_sigma1 * cos_sigma1
+    cos_2sigma1 = cos_sigma1 ** 2 - sin_sigma1 ** 2
+
+    sin_alpha = cos_u1 * sin_alpha1
+    cos_sq_alpha = 1 - sin_alpha ** 2
+    u_sq = cos_sq_alpha * ((WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2)
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+
+    sigma_0 = distance_m / (WGS84_B * big_a)
+    sigma = sigma_0
+    for _ in range(max_iter):
+        sin_sigma = np.sin(sigma)
+        cos_sigma = np.cos(sigma)
+        # cos(2·sigma1 + sigma) через формулу суми кутів
+        cos_2sigma_m = cos_2sigma1 * cos_sigma - sin_2sigma1 * sin_sigma
+        cos_sq_2sigma_m = cos_2sigma_m ** 2
+        delta_sigma = big_b * sin_sigma * (
+            cos_2sigma_m + big_b / 4 * (
+                cos_sigma * (2 * cos_sq_2sigma_m - 1)
+                - big_b / 6 * cos_2sigma_m * (4 * sin_sigma ** 2 - 3) * (4 * cos_sq_2sigma_m - 3)
+            )
+        )
+        sigma_new = sigma_0 + delta_sigma
+        converged = np.max(np.abs(sigma_new - sigma), initial=0.0) < tol
+        sigma = sigma_new
+        if converged:
+            break
+
+    sin_sigma = np.sin(sigma)
+    cos_sigma = np.cos(sigma)
+    cos_2sigma_m = cos_2sigma1 * cos_sigma - sin_2sigma1 * sin_sigma
+
+    tmp = sin_u1 * sin_sigma - cos_u1 * cos_sigma * cos_alpha1
+    lat2 = np.arctan2(
+        sin_u1 * cos_sigma + cos_u1 * sin_sigma * cos_alpha1,
+        (1 - WGS84_F) * np.sqrt(sin_alpha ** 2 + tmp ** 2)
+    )
+    lam = np.arctan2(sin_sigma * sin_alpha1, cos_u1 * cos_sigma - sin_u1 * sin_sigma * cos_alpha1)
+    c = WGS84_F / 16 * cos_sq_alpha * (4 + WGS84_F * (4 - 3 * cos_sq_alpha))
+    big_l = lam - (1 - c) * WGS84_F * sin_alpha * (
+        sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (2 * cos_2sigma_m ** 2 - 1))
+    )
+
+    lon2 = (lon + np.degrees(big_l) + 180) % 360 - 180
+    return np.degrees(lat2), lon2
+
+
+def _geodesic_inverse(lat1, lon1, lat2, lon2, max_iter=50, tol=1e-12):
+    """
+    Векторизована обернена геодезична задача (формули Вінсенті) на еліпсоїді WGS84.
+
+    Приймає масиви координат двох наборів точок у градусах. Повертає кортеж
+    (відстань у метрах, початковий азимут з першої точки на другу в градусах [0, 360)).
+    Для точок, що збігаються, відстань і азимут дорівнюють 0.
+    """
+    lat1 = np.asarray(lat1, dtype=np.float64)
+    lat2 = np.asarray(lat2, dtype=np.float64)
+    big_l = np.radians((np.asarray(lon2, dtype=np.float64) - np.asarray(lon1, dtype=np.float64) + 180) % 360 - 180)
+
+    tan_u1 = (1 - WGS84_F) * np.tan(np.radians(lat1))
+    cos_u1 = 1 / np.sqrt(1 + tan_u1 ** 2)
+    sin_u1 = tan_u1 * cos_u1
+    tan_u2 = (1 - WGS84_F) * np.tan(np.radians(lat2))
+    cos_u2 = 1 / np.sqrt(1 + tan_u2 ** 2)
+    sin_u2 = tan_u2 * cos_u2
+
+    lam = big_l
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iter):
+            sin_lam = np.sin(lam)
+            cos_lam = np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma > 0, cos_u1 * cos_u2 * sin_lam / sin_sigma, 0.0)
+            cos_sq_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(cos_sq_alpha > 0, cos_sigma - 2 * sin_u1 * sin_u2 / cos_sq_alpha, 0.0)
+            c = WGS84_F / 16 * cos_sq_alpha * (4 + WGS84_F * (4 - 3 * cos_sq_alpha))
+            lam_new = big_l + (1 - c) * WGS84_F * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (2 * cos_2sigma_m ** 2 - 1))
+            )
+            converged = np.max(np.abs(lam_new - lam), initial=0.0) < tol
+            lam = lam_new
+            if converged:
+                break
+
+    sin_lam = np.sin(lam)
+    cos_lam = np.cos(lam)
+    u_sq = cos_sq_alpha * ((WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2)
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    cos_sq_2sigma_m = cos_2sigma_m ** 2
+    delta_sigma = big_b * sin_sigma * (
+        cos_2sigma_m + big_b / 4 * (
+            cos_sigma * (2 * cos_sq_2sigma_m - 1)
+            - big_b / 6 * cos_2sigma_m * (4 * sin_sigma ** 2 - 3) * (4 * cos_sq_2sigma_m - 3)
+        )
+    )
+    distance_m = WGS84_B * big_a * (sigma - delta_sigma)
+    azimuth = np.degrees(np.arctan2(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)) % 360
+    return distance_m, azimuth
+
+
+def _points_to_lonlat(points):
+    """Повертає масив (N, 2) координат (lon, lat) з GeoDataFrame/GeoSeries точок або масиву."""
+    if hasattr(points, 'geometry'):
+        geometries = np.asarray(points.geometry.values)
+        # Беремо лише точки, як і раніше при перевірці geom_type == 'Point'
+        geometries = geometries[shapely.get_type_id(geometries) == 0]
+        return shapely.get_coordinates(geometries)
+    return np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Джерело кордону та його локальна копія, з якої кордон читається без доступу до мережі
+BORDER_URL = "https://datahub.io/core/geo-countries/r/0.geojson"
+BORDER_PATH = os.path.join(PROJECT_ROOT, "data", "ukraine_border.geojson")
+
+
+# Дерево точок сітки, яке кожен процес пулу будує один раз в ініціалізаторі
+_worker_point_tree = None
+
+
+def _init_intersection_worker(point_coords):
+    """Ініціалізатор процесу пулу: будує STRtree по координатах точок сітки."""
+    global _worker_point_tree
+    _worker_point_tree = shapely.STRtree(shapely.points(point_coords))
+
+
+@pool_task
+def _query_sector_chunk(args):
+    """Повертає пари (сектор, точка) для одного пакета секторів, переданих у WKB."""
+    offset, sector_wkb = args
+    sectors = shapely.from_wkb(sector_wkb)
+    sector_idx, point_idx = _worker_point_tree.query(sectors, predicate="contains")
+    return sector_idx + offset, point_idx
+
+
+# Стан процесу пулу для потокової генерації секторів
+_stream_state = {}
+
+
+def _init_stream_worker(border_index, params):
+    """Ініціалізатор процесу пулу: індекс кордону та параметри секторів передаються один раз."""
+    _stream_state.update(border_index=border_index, params=params, geo_manager=GeoDataManager())
+
+
+def _stream_tasks(lonlat, batch_size, start, radius_km, with_intersections):
+    """
+    Завдання потокової обробки: (вершини пакета, позиції та координати вершин-кандидатів).
+
+    Кандидати – вершини в охоплюючому прямокутнику пакета, розширеному на радіус сектора
+    (смуга, як у TiledExecutor), тож процес отримує лише їх, а не всю сітку.
+    Пошук за широтою йде по відсортованих один раз індексах вершин.
+    """
+    if with_intersections:
+        lat_order = np.argsort(lonlat[:, 1], kind='stable')
+        sorted_lat = lonlat[lat_order, 1]
+        # Запас як в _find_intersection_pairs_analytic: найкоротший градус меридіана ~110.57 км
+        dlat = radius_km * 1000.0 / 110574.0 * 1.01
+    for batch_start in range(start, len(lonlat), batch_size):
+        batch = lonlat[batch_start:batch_start + batch_size]
+        if not with_intersections:
+            yield batch, None, None
+            continue
+        min_lon, min_lat = batch.min(axis=0)
+        max_lon, max_lat = batch.max(axis=0)
+        lat_far = min(max(abs(min_lat), abs(max_lat)) + dlat, 89.9)
+        dlon = radius_km * 1000.0 / (111320.0 * np.cos(np.radians(lat_far))) * 1.01
+
+        lo = np.searchsorted(sorted_lat, min_lat - dlat, side='left')
+        hi = np.searchsorted(sorted_lat, max_lat + dlat, side='right')
+        positions = np.sort(lat_order[lo:hi])
+        candidate_lon = lonlat[positions, 0]
+        positions = positions[(candidate_lon >= min_lon - dlon) & (candidate_lon <= max_lon + dlon)]
+        yield batch, positions, lonlat[positions]
+
+
+@pool_task
+def _stream_sector_batch(task):
+    """Будує сектори пакета вершин, залишає ті, що в межах кордону, і знаходить їх перетини з кандидатами."""
+    lonlat, candidate_positions, candidate_lonlat = task
+    params = _stream_state['params']
+    geo_manager = _stream_state['geo_manager']
+
+    sectors = geo_manager.generate_sectors_batch(
+        lonlat, params['azimuths'], params['radius_km'], params['aperture'], params['angle_step']
+    )
+    sectors = sectors[_stream_state['border_index'].contains(sectors.geometry.values)].reset_index(drop=True)
+
+    if candidate_positions is None:
+        return sectors, None, None
+    candidates = gpd.GeoDataFrame(geometry=shapely.points(candidate_lonlat), crs="EPSG:4326")
+    sector_idx, point_idx = geo_manager.find_intersection_pairs(
+        sectors, candidates, method=params['intersection_method']
+    )
+    return sectors, sector_idx, candidate_positions[point_idx]
+
+
+def _bounded_imap(pool, func, tasks, max_in_flight):
+    """
+    Як pool.imap, але тримає в роботі не більше max_in_flight завдань.
+
+    pool.imap/imap_unordered забирають з генератора завдань усе одразу, а результати
+    накопичуються, якщо споживач повільніший; тут нове завдання подається лише після того,
+    як споживач забрав найстаріший результат (зворотний тиск). Порядок результатів збережено.
+    """
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
 
-from shapely.geometry import Point, Polygon, shape, box
-from geopy.distance import distance
-
-
-def _find_intersections_for_sector(sector_id, sector, grid):
-    """Допоміжна функція для паралельного знаходження перетинів для одного сектора."""
-    sector_intersections = []
-    for point_id, row in grid.iterrows():
-        point = row.geometry
-        if sector.contains(point):
-            sector_intersections.append({
-                'sector_id': sector_id,
-                'point_id': point_id,
-                'point_coordinates': point
-            })
-        print(point_id)
-    return sector_intersections
 class GeoDataManager:
     """
         Клас GeoDataManager відповідає за роботу з геопросторовими даними, такими як кордон України,
@@ -33,52 +277,115 @@ class GeoDataManager:
         3. Фільтрація сітки, щоб залишити тільки частини, що перетинають кордон України.
         4. Генерація секторів для заданих точок сітки з певним азимутом.
         5. Використання багатопоточності для оптимізації генерації секторів.
+        6. Локальне сховище результатів етапів (артефактів) у форматі Arrow IPC.
     """
+    def __init__(self, artifact_dir=None, border_path=BORDER_PATH):
+        self.artifact_dir = artifact_dir or os.path.join(PROJECT_ROOT, "artifacts")
+        self.border_path = border_path
+        self._border_index = None
+
+    @instrumented()
     def load_ukraine_border(self):
+        """
+        Завантажує кордон України з локального файлу, а якщо його немає – з інтернету.
+        Завантажений з інтернету кордон зберігається у локальний файл для наступних запусків.
+        """
+        if self.border_path and os.path.exists(self.border_path):
+            ukraine = gpd.read_file(self.border_path)
+            print("Кордони України завантажено з локального файлу.")
+            return ukraine
+
         try:
-                url = "https://datahub.io/core/geo-countries/r/0.geojson"
-                countries = gpd.read_file(url)
+                countries = gpd.read_file(BORDER_URL)
                 ukraine = countries[countries['ADMIN'] == 'Ukraine']
                 print("Кордони України завантажено з інтернету.")
         except Exception as e:
                 print(f"Помилка при завантаженні кордону України: {e}")
                 return None  # Повертаємо None у разі помилки
 
+        if self.border_path:
+            os.makedirs(os.path.dirname(self.border_path), exist_ok=True)
+            ukraine.to_file(self.border_path, driver="GeoJSON")
+
         return ukraine
 
+    def _artifact_path(self, stage, fingerprint):
+        return os.path.join(self.artifact_dir, f"{stage}-{fingerprint[:16]}.arrow")
+
+    def has_artifact(self, stage, fingerprint):
+        """Перевіряє, чи є збережений результат етапу для заданого відбитка."""
+        return os.path.exists(self._artifact_path(stage, fingerprint))
+
+    @instrumented()
+    def save_artifact(self, stage, fingerprint, data):
+        """
+        Зберігає результат етапу у файл Arrow IPC без стиснення (щоб його можна було відобразити в пам'ять).
+
+        data – GeoDataFrame (геометрія зберігається як WKB у форматі GeoArrow/GeoParquet-метаданих)
+        або словник {назва колонки: масив numpy} для пар перетинів.
+        Файли цього етапу з іншими відбитками видаляються.
+        """
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        path = self._artifact_path(stage, fingerprint)
+        # Пишемо у тимчасовий файл і перейменовуємо, щоб перерваний запис не лишив зіпсований артефакт
+        tmp_path = path + ".tmp"
+        if isinstance(data, gpd.GeoDataFrame):
+            data.to_feather(tmp_path, compression='uncompressed')
+        else:
+            feather.write_feather(pa.table(data), tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+
+        for old_path in glob.glob(os.path.join(self.artifact_dir, f"{stage}-*.arrow")):
+            if old_path != path:
+                os.remove(old_path)
+
+    @instrumented()
+    def load_artifact(self, stage, fingerprint):
+        """
+        Завантажує результат етапу, відображаючи файл у пам'ять.
+
+        Для GeoDataFrame повертає GeoDataFrame (числові колонки без копіювання, геометрія
+        декодується з WKB), для пар перетинів – словник масивів numpy, що посилаються
+        безпосередньо на відображений файл. Повертає None, якщо артефакту немає.
+        """
+        path = self._artifact_path(stage, fingerprint)
+        if not os.path.exists(path):
+            return None
+
+        reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+        if b'geo' in (reader.schema.metadata or {}):
+            return gpd.read_feather(path, memory_map=True)
+
+        table = reader.read_all()
+        return {
+            name: table.column(name).combine_chunks().to_numpy(zero_copy_only=True)
+            for name in table.column_names
+        }
+
+    @instrumented()
+    def border_index(self, border_union):
+        """
+        Повертає індекс BorderIndex для геометрії кордону. Індекс будується один раз і
+        використовується повторно, поки кордон не зміниться.
+        """
+        cached = self._border_index
+        if cached is None or not (cached.border is border_union
+                                  or shapely.equals_exact(cached.border, border_union, 0)):
+            self._border_index = BorderIndex(border_union)
+        return self._border_index
+
+    @instrumented(items=result_len)
+    def generate_lattice(self, bounds, step_km):
+        """Повертає решітку вершин сітки квадратів (GridLattice) з кроком step_km (км) у межах bounds."""
+        return GridLattice.from_bounds(bounds, step_km)
+
+    @instrumented(items=result_len)
     def generate_grid(self, bounds, step_km):
         """Генерує сітку квадратів заданого розміру (step_km у км)."""
-        # Перетворюємо систему координат кордону України в метричну систему
-        border_m = bounds.to_crs(epsg=3857)
-
-        # Отримуємо межі в метрах
-        minx, miny, maxx, maxy = border_m.total_bounds
-
-        # Крок у метрах (10 км = 10000 м)
-        step_m = step_km * 1000
-
-        # Генерація сітки
-        polygons = []
-        x_coords = np.arange(minx, maxx, step_m)
-        y_coords = np.arange(miny, maxy, step_m)
-
-        for x in x_coords:
-            for y in y_coords:
-                polygon = Polygon([
-                    (x, y),
-                    (x + step_m, y),
-                    (x + step_m, y + step_m),
-                    (x, y + step_m)
-                ])
-                polygons.append(polygon)
-
-        # Створюємо GeoDataFrame з усіма квадратами в метричній системі координат
-        grid = gpd.GeoDataFrame(geometry=polygons, crs="EPSG:3857")
-
-        # Перетворюємо сітку назад у систему координат EPSG:4326 для подальшого використання
-        grid = grid.to_crs(epsg=4326)
-        return grid
+        # Квадрати будуються одним викликом shapely.box з масивів координат решітки
+        return self.generate_lattice(bounds, step_km).to_squares()
 
+    @instrumented(items=result_len)
     def filter_grid_by_border_squares(self, grid, border):
         """Повертає сітку квадратів, які перетинаються з кордоном України."""
         try:
@@ -86,7 +393,7 @@ class GeoDataManager:
             border_union = border.unary_union
 
             # Залишаємо тільки ті квадрати, що перетинають або знаходяться всередині кордону
-            clipped_grid = grid[grid.intersects(border_union)]
+            clipped_grid = grid[self.border_index(border_union).intersects(grid.geometry.values)]
 
         except Exception as e:
             print(f"Помилка при фільтрації квадратів: {e}")
@@ -94,27 +401,28 @@ class GeoDataManager:
 
         return clipped_grid
 
+    @instrumented(items=result_len)
     def filter_grid_by_border(self, grid, border):
-        """Повертає тільки точки вершин квадратів, які знаходяться на території України."""
+        """
+        Повертає тільки точки вершин квадратів, які знаходяться на території України.
+
+        grid – решітка GridLattice (вершини впорядковані за рядками) або GeoDataFrame квадратів
+        (унікальні вершини впорядковані за координатами). Кожна вершина перевіряється один раз
+        через індекс кордону (BorderIndex).
+        """
         try:
             # Об'єднуємо всі частини кордону України в одну геометрію
             border_union = border.unary_union
 
-            # Список для зберігання вершин, що знаходяться всередині кордону
-            valid_points = []
+            border_index = self.border_index(border_union)
 
-            # Перевірка кожного квадрата в сітці
-            for _, row in grid.iterrows():
-                geometry = row.geometry
-                if geometry.geom_type == 'Polygon':
-                    for coord in geometry.exterior.coords:
-                        point = Point(coord)
-                        # Додаємо точку, якщо вона знаходиться всередині кордону
-                        if border_union.contains(point):
-                            valid_points.append(point)
+            if isinstance(grid, GridLattice):
+                return grid.filter(border_index).to_points()
 
-            # Створюємо GeoDataFrame з унікальними точками
-            unique_points = gpd.GeoDataFrame(geometry=list(set(valid_points)), crs=grid.crs)
+            exteriors = shapely.get_exterior_ring(np.asarray(grid.geometry.values))
+            coords = np.unique(shapely.get_coordinates(exteriors), axis=0)
+            coords = coords[border_index.contains_xy(coords[:, 0], coords[:, 1])]
+            unique_points = gpd.GeoDataFrame(geometry=shapely.points(coords), crs=grid.crs)
 
         except Exception as e:
             print(f"Помилка при фільтрації вершин: {e}")
@@ -122,62 +430,254 @@ class GeoDataManager:
 
         return unique_points
 
-    def generate_sector(self, point, azimuth, radius_km=10):
+    def generate_sector(self, point, azimuth, radius_km=10, aperture=60, angle_step=1):
         """Генерує сектор для заданої точки та азимуту."""
-        angle_step = 1  # Крок для малювання сектору
-        angles = np.arange(azimuth - 30, azimuth + 30 + angle_step, angle_step)
-
-        points = [
-            (
-                distance(kilometers=radius_km).destination((point.y, point.x), angle).longitude,
-                distance(kilometers=radius_km).destination((point.y, point.x), angle).latitude
+        sectors = self.generate_sectors_batch([(point.x, point.y)], [azimuth], radius_km, aperture, angle_step)
+        return sectors.geometry.iloc[0]
+
+    @instrumented(items=result_len)
+    def generate_sectors_batch(self, points, azimuths=(0, 120, 240), radius_km=10, aperture=60, angle_step=1):
+        """
+        Генерує сектори для всіх точок і всіх азимутів однією векторною операцією.
+
+        points – GeoDataFrame точок або масив (N, 2) координат (lon, lat).
+        aperture – кут розкриття сектора в градусах, angle_step – крок дуги в градусах.
+        Повертає GeoDataFrame з параметрами секторів (вершина, азимут, радіус, розкриття)
+        та їх геометрією; порядок: для кожної точки всі азимути.
+        """
+        lonlat = _points_to_lonlat(points)
+        azimuths = np.asarray(azimuths, dtype=np.float64)
+
+        return self.sectors_from_params(
+            np.repeat(lonlat[:, 0], len(azimuths)),
+            np.repeat(lonlat[:, 1], len(azimuths)),
+            np.tile(azimuths, len(lonlat)),
+            radius_km, aperture, angle_step
+        )
+
+    @instrumented(items=result_len)
+    def sectors_from_params(self, apex_lon, apex_lat, azimuth, radius_km=10, aperture=60, angle_step=1):
+        """
+        Будує сектори за їх параметрами: масивами вершин (apex_lon, apex_lat) та азимутів
+        (по одному значенню на сектор). Повертає GeoDataFrame як generate_sectors_batch.
+        """
+        apex_lon = np.asarray(apex_lon, dtype=np.float64)
+        apex_lat = np.asarray(apex_lat, dtype=np.float64)
+        azimuth = np.asarray(azimuth, dtype=np.float64)
+
+        # Кути дуги відносно азимуту; кількість кроків округлюємо, щоб краї дуги були точними
+        n_steps = max(int(round(aperture / angle_step)), 1)
+        offsets = np.linspace(-aperture / 2, aperture / 2, n_steps + 1)
+
+        # Зсув кінцевої точки відносно вершини залежить лише від широти вершини та азимуту,
+        # а вершини одного рядка сітки мають однакову широту. Тому розв'язуємо геодезичну
+        # задачу лише для унікальних широт і азимутів і розносимо результат на всі сектори.
+        unique_lat, lat_index = np.unique(apex_lat, return_inverse=True)
+        unique_azimuth, azimuth_index = np.unique(azimuth, return_inverse=True)
+        table_lat, table_dlon = _geodesic_direct(
+            unique_lat[:, None, None],
+            0.0,
+            unique_azimuth[None, :, None] + offsets[None, None, :],
+            radius_km * 1000.0
+        )
+
+        # Масиви форми (сектори, точки дуги)
+        arc_lat = table_lat[lat_index, azimuth_index]
+        arc_lon = (table_dlon[lat_index, azimuth_index] + apex_lon[:, None] + 180) % 360 - 180
+
+        # Кільце: точки дуги, потім вершина сектора (замикання додає shapely)
+        coords = np.empty((len(apex_lon), len(offsets) + 1, 2), dtype=np.float64)
+        coords[:, :-1, 0] = arc_lon
+        coords[:, :-1, 1] = arc_lat
+        coords[:, -1, 0] = apex_lon
+        coords[:, -1, 1] = apex_lat
+
+        geometries = shapely.polygons(coords) if len(coords) else np.array([], dtype=object)
+
+        return gpd.GeoDataFrame({
+            'apex_lon': apex_lon,
+            'apex_lat': apex_lat,
+            'azimuth': azimuth,
+            'radius_km': np.full(len(apex_lon), float(radius_km)),
+            'aperture': np.full(len(apex_lon), float(aperture)),
+        }, geometry=geometries, crs="EPSG:4326")
+
+    @instrumented(items=result_len)
+    def generate_sectors_parallel(self, clipped_grid, border_union, radius_km=10, azimuths=(0, 120, 240),
+                                  aperture=60, angle_step=1, chunk_size=20000):
+        """
+        Генерація секторів для всіх вершин сітки на території України.
+
+        Сектори будуються векторно пакетами по chunk_size вершин (див. generate_sectors_batch),
+        тому пул процесів тут більше не потрібен. Залишаються тільки сектори,
+        що повністю знаходяться в межах кордону.
+        """
+        lonlat = _points_to_lonlat(clipped_grid)
+        border_index = self.border_index(border_union)
+
+        chunks = []
+        for start in range(0, len(lonlat), chunk_size):
+            sectors = self.generate_sectors_batch(
+                lonlat[start:start + chunk_size], azimuths, radius_km, aperture, angle_step
+            )
+            # Фільтруємо сектори, щоб залишити тільки ті, що повністю знаходяться в межах кордону України
+            inside = border_index.contains(sectors.geometry.values)
+            chunks.append(sectors[inside])
+
+        if not chunks:
+            return self.generate_sectors_batch(lonlat, azimuths, radius_km, aperture, angle_step)
+        return gpd.GeoDataFrame(pd.concat(chunks, ignore_index=True), crs="EPSG:4326")
+
+    def iter_sector_batches(self, vertices, border_union, radius_km=10, azimuths=(0, 120, 240), aperture=60,
+                            angle_step=1, batch_size=20000, with_intersections=True, intersection_method='strtree',
+                            start=0, processes=None, max_in_flight=None):
+        """
+        Потоково генерує сектори (та їх перетини з вершинами) пакетами по batch_size вершин.
+
+        Для кожного пакета повертає (сектори, sector_idx, point_idx): GeoDataFrame секторів пакета,
+        що повністю в межах кордону, та пари перетинів – номер сектора в пакеті й позицію вершини
+        у vertices (None, якщо with_intersections=False). В обробці одночасно не більше
+        max_in_flight пакетів. Процеси пулу не тримають сітку: з кожним пакетом їм передаються
+        лише вершини-кандидати в його межах, розширених на радіус сектора (див. _stream_tasks),
+        а для їх пошуку батьківський процес тримає лише координати вершин і їх порядок за широтою.
+        start – позиція першої вершини (для продовження перерваної обробки).
+        """
+        lonlat = _points_to_lonlat(vertices)
+        processes = processes or mp.cpu_count()
+        params = {
+            'azimuths': tuple(azimuths), 'radius_km': radius_km, 'aperture': aperture,
+            'angle_step': angle_step, 'intersection_method': intersection_method,
+        }
+        initargs = (self.border_index(border_union), params)
+        tasks = _stream_tasks(lonlat, batch_size, start, radius_km, with_intersections)
+
+        tracker = PoolTracker('GeoDataManager.iter_sector_batches', processes)
+        with mp.Pool(processes, initializer=_init_stream_worker, initargs=initargs) as pool:
+            yield from tracker.unwrap(
+                _bounded_imap(pool, _stream_sector_batch, tasks, max_in_flight or 2 * processes)
             )
-            for angle in angles
-        ]
-        points.append((point.x, point.y))  # Додаємо початкову точку
-
-        return Polygon(points)
-
-    def generate_sectors_parallel(self, clipped_grid, border_union):
-        """Паралельна генерація секторів для всіх вершин сітки на території України."""
-        pool = mp.Pool(mp.cpu_count())  # Пул процесів
-        tasks = []
-
-        # Створюємо завдання для кожної вершини та азимуту
-        for _, row in clipped_grid.iterrows():
-            geometry = row.geometry
-
-            if geometry.geom_type == 'Point':  # Перевірка, що геометрія є точкою
-                for azimuth in [0, 120, 240]:
-                    tasks.append((geometry, azimuth))
-
-        # Виконуємо завдання паралельно
-        results = pool.map(self._generate_sector_for_task, tasks)
-        pool.close()
-        pool.join()
-
-        # Фільтруємо сектори, щоб залишити тільки ті, що повністю знаходяться в межах кордону України
-        valid_sectors = [sector for sector in results if border_union.contains(sector)]
-
-        return gpd.GeoDataFrame(geometry=valid_sectors, crs="EPSG:4326")
-
-    def _generate_sector_for_task(self, args):
-        """Функція для паралельного виклику, генерує сектор для однієї точки та азимуту."""
-        point, azimuth = args
-        return self.generate_sector(Point(point), azimuth)
-
-
-
-    def find_intersections(self, sectors, grid):
-        """Знаходить перетини вершин квадратів з секторами з використанням паралельної обробки."""
-        # Підготовка завдань для паралельної обробки
-        tasks = [(sector_id, sector, grid) for sector_id, sector in enumerate(sectors.geometry)]
-
-        # Використання пулу процесів для паралельної обробки
-        with mp.Pool(mp.cpu_count()) as pool:
-            results = pool.starmap(_find_intersections_for_sector, tasks)
 
-        # Об'єднання результатів з усіх процесів
-        intersections = [item for sublist in results for item in sublist]
+    @instrumented(items=first_len)
+    def find_intersection_pairs(self, sectors, grid, parallel=False, chunk_size=50000, processes=None,
+                                method='strtree', point_tree=None):
+        """
+        Знаходить, які вершини сітки містить кожен сектор, за допомогою просторового індексу STRtree.
+
+        Повертає два масиви int64 однакової довжини: позиції секторів у sectors та позиції
+        точок у grid. У паралельному режимі сектори обробляються пакетами по chunk_size,
+        а кожен процес будує дерево точок один раз.
+
+        method='analytic' замість перевірки полігонів перевіряє вершини за параметрами сектора
+        (див. _find_intersection_pairs_analytic). point_tree – вже побудоване STRtree точок grid
+        для повторних викликів з тією самою сіткою.
+        """
+        if method == 'analytic':
+            return self._find_intersection_pairs_analytic(sectors, grid, chunk_size, point_tree)
+        if method != 'strtree':
+            raise ValueError(f"Невідомий метод пошуку перетинів: {method}")
+
+        sector_geoms = np.asarray(sectors.geometry.values)
+        point_geoms = np.asarray(grid.geometry.values)
+
+        if not parallel or len(sector_geoms) <= chunk_size:
+            tree = point_tree if point_tree is not None else shapely.STRtree(point_geoms)
+            sector_idx, point_idx = tree.query(sector_geoms, predicate="contains")
+            return sector_idx.astype(np.int64), point_idx.astype(np.int64)
+
+        tasks = [
+            (start, shapely.to_wkb(sector_geoms[start:start + chunk_size]))
+            for start in range(0, len(sector_geoms), chunk_size)
+        ]
+        point_coords = shapely.get_coordinates(point_geoms)
+
+        processes = processes or mp.cpu_count()
+        tracker = PoolTracker('GeoDataManager.find_intersection_pairs', processes)
+        with mp.Pool(processes, initializer=_init_intersection_worker,
+                     initargs=(point_coords,)) as pool:
+            results = tracker.unwrap_list(pool.map(_query_sector_chunk, tasks))
+
+        sector_idx = np.concatenate([result[0] for result in results]).astype(np.int64)
+        point_idx = np.concatenate([result[1] for result in results]).astype(np.int64)
+        return sector_idx, point_idx
+
+    def _find_intersection_pairs_analytic(self, sectors, grid, chunk_size=50000, point_tree=None):
+        """
+        Аналітична перевірка належності вершин секторам без полігонів.
+
+        Сектор задається вершиною (apex_lon, apex_lat), азимутом, радіусом та кутом розкриття.
+        Кандидатами є лише точки сітки в охоплюючому прямокутнику кола радіуса сектора;
+        для них обчислюються геодезична відстань та азимут від вершини сектора.
+        Точка належить сектору, якщо відстань не більша за радіус, а відхилення азимуту –
+        не більше половини розкриття. Це точний геодезичний сектор, а не полігон з кроком дуги 1°.
+        Сама вершина сектора не враховується, як і при перевірці contains для полігона.
+        """
+        required = ('apex_lon', 'apex_lat', 'azimuth', 'radius_km', 'aperture')
+        missing = [column for column in required if column not in sectors.columns]
+        if missing:
+            raise ValueError(f"Для аналітичного методу секторам бракує параметрів: {', '.join(missing)}")
+
+        apex_lon = sectors['apex_lon'].to_numpy(dtype=np.float64)
+        apex_lat = sectors['apex_lat'].to_numpy(dtype=np.float64)
+        azimuth = sectors['azimuth'].to_numpy(dtype=np.float64)
+        radius_m = sectors['radius_km'].to_numpy(dtype=np.float64) * 1000.0
+        half_aperture = sectors['aperture'].to_numpy(dtype=np.float64) / 2
+
+        point_coords = _points_to_lonlat(grid) if len(grid) else np.empty((0, 2))
+        tree = point_tree if point_tree is not None else shapely.STRtree(shapely.points(point_coords))
+
+        # Охоплюючий прямокутник кола з запасом: найкоротший градус меридіана ~110.57 км
+        dlat = radius_m / 110574.0 * 1.01
+        lat_far = np.minimum(np.abs(apex_lat) + dlat, 89.9)
+        dlon = radius_m / (111320.0 * np.cos(np.radians(lat_far))) * 1.01
+
+        sector_parts = []
+        point_parts = []
+        for start in range(0, len(apex_lon), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            boxes = shapely.box(
+                apex_lon[chunk] - dlon[chunk], apex_lat[chunk] - dlat[chunk],
+                apex_lon[chunk] + dlon[chunk], apex_lat[chunk] + dlat[chunk]
+            )
+            # Без предиката STRtree повертає кандидатів за перетином обмежувальних прямокутників
+            candidate_sector, candidate_point = tree.query(boxes)
+            candidate_sector = candidate_sector + start
 
-        return intersections
\ No newline at end of file
+            distance_m, bearing = _geodesic_inverse(
+                apex_lat[candidate_sector], apex_lon[candidate_sector],
+                point_coords[candidate_point, 1], point_coords[candidate_point, 0]
+            )
+            deviation = np.abs((bearing - azimuth[candidate_sector] + 180) % 360 - 180)
+            inside = (
+                (distance_m > 0)
+                & (distance_m <= radius_m[candidate_sector])
+                & (deviation <= half_aperture[candidate_sector])
+            )
+            sector_parts.append(candidate_sector[inside])
+            point_parts.append(candidate_point[inside])
+
+        if not sector_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return (np.concatenate(sector_parts).astype(np.int64),
+                np.concatenate(point_parts).astype(np.int64))
+
+    @instrumented(items=result_len)
+    def find_intersections(self, sectors, grid, parallel=False, method='strtree', point_tree=None):
+        """
+        Знаходить перетини вершин квадратів з секторами (див. find_intersection_pairs).
+        point_tree – готове STRtree точок grid (див. find_intersection_pairs).
+
+        Повертає GeoDataFrame з колонками sector_id, point_id та геометрією point_coordinates.
+        Ідентифікатори беруться з колонки id (дані з бази), а для щойно згенерованих даних
+        дорівнюють позиції + 1, що збігається з SERIAL id після збереження через save_geodata.
+        """
+        sector_idx, point_idx = self.find_intersection_pairs(sectors, grid, parallel=parallel, method=method,
+                                                             point_tree=point_tree)
+
+        sector_ids = sectors['id'].to_numpy() if 'id' in sectors.columns else np.arange(1, len(sectors) + 1)
+        point_ids = grid['id'].to_numpy() if 'id' in grid.columns else np.arange(1, len(grid) + 1)
+
+        intersections = gpd.GeoDataFrame({
+            'sector_id': sector_ids[sector_idx],
+            'point_id': point_ids[point_idx],
+        }, geometry=np.asarray(grid.geometry.values)[point_idx], crs=grid.crs)
+        return intersections.rename_geometry('point_coordinates')
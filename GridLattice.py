@@ -0,0 +1,118 @@
+import numpy as np
+import geopandas as gpd
+import shapely
+
+from BorderIndex import BorderIndex
+
+
+# Радіус сфери проєкції Web Mercator (EPSG:3857)
+MERCATOR_RADIUS = 6378137.0
+
+
+def _mercator_to_lonlat(x, y):
+    """Переводить координати EPSG:3857 у (lon, lat) EPSG:4326 (точна формула сферичного Меркатора)."""
+    lon = np.degrees(x / MERCATOR_RADIUS)
+    lat = np.degrees(2 * np.arctan(np.exp(y / MERCATOR_RADIUS)) - np.pi / 2)
+    return lon, lat
+
+
+def _contains_xy(border, x, y):
+    """Перевірка точок на індексі кордону BorderIndex або на (підготовленій) геометрії кордону."""
+    if isinstance(border, BorderIndex):
+        return border.contains_xy(x, y)
+    shapely.prepare(border)
+    return shapely.contains_xy(border, x, y)
+
+
+class GridLattice:
+    """
+        Клас GridLattice – компактне представлення вершин сітки квадратів.
+
+        Сітка задається початком (origin_x, origin_y) і кроком step_m у EPSG:3857 та має
+        ny × nx вершин. Вибрані вершини зберігаються як масиви int32 індексів (j – рядок, i – стовпець),
+        тобто 8 байт на вершину; геометрії створюються лише під час виведення (to_points, to_squares).
+        Вершини впорядковані за рядками решітки. Індекси повної решітки створюються лише
+        при першому зверненні, тож її можна дешево передавати процесам пулу.
+    """
+
+    def __init__(self, origin_x, origin_y, step_m, nx, ny, j=None, i=None):
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.step_m = step_m
+        self.nx = nx
+        self.ny = ny
+        self._j = j
+        self._i = i
+
+    @property
+    def j(self):
+        if self._j is None:
+            self._j = (np.arange(self.ny * self.nx, dtype=np.int64) // self.nx).astype(np.int32)
+        return self._j
+
+    @property
+    def i(self):
+        if self._i is None:
+            self._i = (np.arange(self.ny * self.nx, dtype=np.int64) % self.nx).astype(np.int32)
+        return self._i
+
+    @classmethod
+    def from_bounds(cls, bounds, step_km):
+        """Повна решітка з кроком step_km (км), що покриває межі bounds (GeoDataFrame)."""
+        minx, miny, maxx, maxy = bounds.to_crs(epsg=3857).total_bounds
+        step_m = step_km * 1000
+        # Квадрати починаються в точках np.arange(min, max, step), вершин на одну більше
+        nx = len(np.arange(minx, maxx, step_m)) + 1
+        ny = len(np.arange(miny, maxy, step_m)) + 1
+        return cls(minx, miny, step_m, nx, ny)
+
+    def __len__(self):
+        return self.ny * self.nx if self._j is None else len(self._j)
+
+    def mercator(self, j=None, i=None):
+        """Координати вершин у EPSG:3857 (за замовчуванням – вибраних вершин)."""
+        j = self.j if j is None else j
+        i = self.i if i is None else i
+        return self.origin_x + i * self.step_m, self.origin_y + j * self.step_m
+
+    def lonlat(self, j=None, i=None):
+        """Координати (lon, lat) вершин у EPSG:4326."""
+        return _mercator_to_lonlat(*self.mercator(j, i))
+
+    def inside_mask(self, border, rows=None):
+        """
+        Маска ny × nx вершин усередині кордону (border – BorderIndex або геометрія кордону).
+        rows – діапазон рядків (j0, j1) для обробки частини решітки.
+        """
+        j0, j1 = rows if rows is not None else (0, self.ny)
+        jj, ii = np.mgrid[j0:j1, 0:self.nx]
+        lon, lat = self.lonlat(jj, ii)
+        return _contains_xy(border, lon, lat)
+
+    def filter(self, border, block_rows=512):
+        """Нова решітка лише з вершинами всередині кордону; маска рахується блоками по block_rows рядків."""
+        if self._j is not None:
+            inside = _contains_xy(border, *self.lonlat())
+            return GridLattice(self.origin_x, self.origin_y, self.step_m, self.nx, self.ny,
+                               self._j[inside], self._i[inside])
+
+        js, is_ = [], []
+        for j0 in range(0, self.ny, block_rows):
+            jj, ii = np.nonzero(self.inside_mask(border, (j0, min(j0 + block_rows, self.ny))))
+            js.append((jj + j0).astype(np.int32))
+            is_.append(ii.astype(np.int32))
+        j = np.concatenate(js) if js else np.empty(0, dtype=np.int32)
+        i = np.concatenate(is_) if is_ else np.empty(0, dtype=np.int32)
+        return GridLattice(self.origin_x, self.origin_y, self.step_m, self.nx, self.ny, j, i)
+
+    def to_points(self):
+        """GeoDataFrame точок вершин у EPSG:4326."""
+        lon, lat = self.lonlat()
+        return gpd.GeoDataFrame(geometry=shapely.points(lon, lat), crs="EPSG:4326")
+
+    def to_squares(self):
+        """GeoDataFrame квадратів (у EPSG:4326), лівим нижнім кутом яких є вершини решітки, крім крайніх."""
+        keep = (self.j < self.ny - 1) & (self.i < self.nx - 1)
+        x, y = self.mercator(self.j[keep], self.i[keep])
+        squares = gpd.GeoDataFrame(geometry=shapely.box(x, y, x + self.step_m, y + self.step_m), crs="EPSG:3857")
+        return squares.to_crs(epsg=4326)
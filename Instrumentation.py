@@ -0,0 +1,284 @@
+"""
+Вимірювання етапів конвеєра та метрики веб-сервера.
+
+Вимірювання вмикається змінною середовища GEO_INSTRUMENTATION=1 і вирішується один раз
+під час імпорту: коли її немає, декоратор instrumented повертає функцію без змін, а stage
+та PoolTracker нічого не роблять, тож вимкнене вимірювання не додає накладних витрат.
+Якщо задано GEO_INSTRUMENTATION_LOG, кожен запис також дописується у файл JSON Lines
+(разом із записами процесів пулу).
+
+HttpMetrics збирає затримки та розміри відповідей за ендпоінтами і віддає їх у
+текстовому форматі Prometheus (див. server.py, /metrics).
+"""
+import bisect
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import deque
+
+
+ENABLED = os.environ.get('GEO_INSTRUMENTATION', '').lower() not in ('', '0', 'false', 'no')
+LOG_PATH = os.environ.get('GEO_INSTRUMENTATION_LOG')
+
+# Останні записи та сумарні тривалість і кількість викликів за назвою (для довготривалого сервера)
+_records = deque(maxlen=10000)
+_totals = {}
+_lock = threading.Lock()
+
+
+def peak_rss_mb():
+    """Пікова резидентна пам'ять поточного процесу в МБ."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux повертає кілобайти, macOS – байти
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def record(kind, name, seconds, items=None, **extra):
+    """Додає запис вимірювання (тривалість, кількість об'єктів, об'єктів за секунду, пікова пам'ять)."""
+    entry = {
+        'kind': kind,
+        'name': name,
+        'seconds': seconds,
+        'items': items,
+        'items_per_s': items / seconds if items is not None and seconds > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'pid': os.getpid(),
+        **extra,
+    }
+    with _lock:
+        _records.append(entry)
+        total_seconds, count = _totals.get(name, (0.0, 0))
+        _totals[name] = (total_seconds + seconds, count + 1)
+        if LOG_PATH:
+            with open(LOG_PATH, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+    return entry
+
+
+def records():
+    """Копія останніх записів поточного процесу."""
+    with _lock:
+        return list(_records)
+
+
+def totals():
+    """Сумарні {назва: (тривалість, кількість)} усіх записів поточного процесу."""
+    with _lock:
+        return dict(_totals)
+
+
+def result_len(result, *args, **kwargs):
+    """Кількість об'єктів – довжина результату."""
+    return len(result)
+
+
+def first_len(result, *args, **kwargs):
+    """Кількість об'єктів – довжина першого елемента результату (наприклад, пар перетинів)."""
+    return len(result[0])
+
+
+def arg_len(position):
+    """Кількість об'єктів – довжина позиційного аргументу (position рахується з self)."""
+    def count(result, *args, **kwargs):
+        return len(args[position])
+    return count
+
+
+def instrumented(name=None, items=None):
+    """
+    Декоратор вимірювання функції: тривалість, кількість об'єктів items(результат, *args, **kwargs)
+    та пікова пам'ять. Коли вимірювання вимкнене, функція повертається без обгортки.
+    """
+    def decorator(func):
+        if not ENABLED:
+            return func
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            record('call', label, seconds, items(result, *args, **kwargs) if items is not None else None)
+            return result
+
+        return wrapper
+    return decorator
+
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+        self.items = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record('stage', self.name, time.perf_counter() - self._start, self.items, failed=exc_type is not None)
+        return False
+
+
+class _NullStage:
+    items = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, key, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name):
+    """Контекст вимірювання етапу: with stage('grid_sectors') as s: ...; s.items = n."""
+    return _Stage(name) if ENABLED else _NULL_STAGE
+
+
+def pool_task(func):
+    """
+    Декоратор функції-завдання пулу процесів: при ввімкненому вимірюванні завдання повертає
+    (тривалість, результат), що дозволяє PoolTracker порахувати завантаженість пулу.
+    """
+    if not ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        return time.perf_counter() - start, result
+
+    return wrapper
+
+
+class PoolTracker:
+    """
+    Рахує завантаженість пулу: сумарний час завдань / (кількість процесів × час роботи пулу).
+    Створюється перед запуском завдань; unwrap повертає результати завдань pool_task.
+    """
+
+    def __init__(self, name, processes):
+        self.name = name
+        self.processes = processes
+        self._start = time.perf_counter()
+
+    def unwrap(self, results):
+        if not ENABLED:
+            return results
+        return self._unwrap(results)
+
+    def _unwrap(self, results):
+        busy = 0.0
+        tasks = 0
+        try:
+            for seconds, result in results:
+                busy += seconds
+                tasks += 1
+                yield result
+        finally:
+            # Запис і при достроковому виході споживача (break, виняток, закриття генератора)
+            wall = time.perf_counter() - self._start
+            record('pool', self.name, wall, tasks, processes=self.processes,
+                   utilization=busy / (self.processes * wall) if wall > 0 else None)
+
+    def unwrap_list(self, results):
+        """Як unwrap, але для результатів pool.map – повертає список."""
+        return results if not ENABLED else list(self._unwrap(results))
+
+
+def report():
+    """Друкує підсумок записів поточного процесу."""
+    if not ENABLED:
+        return
+    for entry in records():
+        rate = f", {entry['items_per_s']:.0f}/с" if entry['items_per_s'] else ''
+        items = f", {entry['items']} об'єктів" if entry['items'] is not None else ''
+        utilization = f", завантаженість пулу {entry['utilization']:.0%}" if entry.get('utilization') else ''
+        print(f"[{entry['kind']}] {entry['name']}: {entry['seconds']:.3f} с{items}{rate}, "
+              f"пікова пам'ять {entry['peak_rss_mb']:.0f} МБ{utilization}")
+
+
+class HttpMetrics:
+    """
+        Клас HttpMetrics збирає метрики HTTP-запитів за ендпоінтами: гістограми затримки
+        та розміру відповіді і лічильник запитів за кодом статусу. render() повертає
+        текстовий формат Prometheus.
+    """
+
+    LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._size = {}
+        self._requests = {}
+
+    @staticmethod
+    def _observe(histograms, buckets, key, value):
+        histogram = histograms.setdefault(key, [[0] * (len(buckets) + 1), 0.0, 0])
+        histogram[0][bisect.bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    def observe(self, endpoint, method, status, seconds, size):
+        with self._lock:
+            self._observe(self._latency, self.LATENCY_BUCKETS, (endpoint, method), seconds)
+            if size is not None:
+                self._observe(self._size, self.SIZE_BUCKETS, (endpoint, method), size)
+            key = (endpoint, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+    @staticmethod
+    def _labels(**labels):
+        return ','.join(f'{name}="{str(value)}"' for name, value in labels.items())
+
+    def _render_histogram(self, lines, metric, help_text, histograms, buckets):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (endpoint, method), (counts, total, count) in sorted(histograms.items()):
+            labels = self._labels(endpoint=endpoint, method=method)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{{labels}}} {total}')
+            lines.append(f'{metric}_count{{{labels}}} {count}')
+
+    def render(self):
+        lines = []
+        with self._lock:
+            self._render_histogram(lines, 'http_request_duration_seconds', "Тривалість обробки запиту.",
+                                   self._latency, self.LATENCY_BUCKETS)
+            self._render_histogram(lines, 'http_response_size_bytes', "Розмір тіла відповіді.",
+                                   self._size, self.SIZE_BUCKETS)
+            lines.append("# HELP http_requests_total Кількість запитів.")
+            lines.append("# TYPE http_requests_total counter")
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                labels = self._labels(endpoint=endpoint, method=method, status=status)
+                lines.append(f'http_requests_total{{{labels}}} {count}')
+
+        if ENABLED:
+            # Виклики методів у процесі сервера (читання з бази, генерація плиток)
+            call_totals = totals()
+            lines.append("# HELP geo_call_seconds_total Сумарна тривалість викликів методів.")
+            lines.append("# TYPE geo_call_seconds_total counter")
+            for name, (seconds, _) in sorted(call_totals.items()):
+                lines.append(f'geo_call_seconds_total{{{self._labels(name=name)}}} {seconds}')
+            lines.append("# HELP geo_calls_total Кількість викликів методів.")
+            lines.append("# TYPE geo_calls_total counter")
+            for name, (_, count) in sorted(call_totals.items()):
+                lines.append(f'geo_calls_total{{{self._labels(name=name)}}} {count}')
+        return '\n'.join(lines) + '\n'
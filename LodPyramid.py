@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from GridLattice import MERCATOR_RADIUS, _mercator_to_lonlat
+from TileCache import TILE_LAYERS, LOD_TABLES
+
+
+# Довжина екватора у EPSG:3857 та розмір плитки в пікселях
+MERCATOR_WORLD = 2 * np.pi * MERCATOR_RADIUS
+TILE_SIZE = 256
+
+# Найбільший масштаб піраміди (index.html запитує плитки до maxNativeZoom 14)
+MAX_ZOOM = 14
+# Бюджет відображення: найбільша кількість вершин геометрій в одній плитці
+MAX_VERTICES_PER_TILE = 20000
+# Сторона агрегованої комірки на екрані, пікселів: не більше (256 / 16)² = 256 комірок на плитку
+CELL_PX = 16
+# Кроки дуги спрощених секторів, градусів (від детальнішого до грубішого)
+ARC_STEPS = (5, 10, 15)
+
+
+def _lonlat_to_mercator(lon, lat):
+    """Переводить (lon, lat) EPSG:4326 у координати EPSG:3857."""
+    x = MERCATOR_RADIUS * np.radians(lon)
+    y = MERCATOR_RADIUS * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+    return x, y
+
+
+def _bins(x, y, size_m):
+    """Індекси квадратних комірок зі стороною size_m, відрахованих від кута світу Web Mercator."""
+    bx = np.floor((x + MERCATOR_WORLD / 2) / size_m).astype(np.int64)
+    by = np.floor((y + MERCATOR_WORLD / 2) / size_m).astype(np.int64)
+    return bx, by
+
+
+def _max_per_tile(x, y, zoom):
+    """Найбільша кількість точок в одній плитці масштабу zoom."""
+    if len(x) == 0:
+        return 0
+    bx, by = _bins(x, y, MERCATOR_WORLD / 2 ** zoom)
+    _, counts = np.unique(bx * 2 ** zoom + by, return_counts=True)
+    return int(counts.max())
+
+
+def _sector_vertices(aperture, angle_step):
+    """Кількість вершин полігона сектора (точки дуги, вершина та замикання кільця)."""
+    return max(int(round(aperture / angle_step)), 1) + 3
+
+
+class LodPyramid:
+    """
+        Клас LodPyramid будує піраміду рівнів деталізації (LOD) шарів сітки та секторів для веб-карти.
+
+        Масштаби 0..max_zoom розбиваються на діапазони: для кожного масштабу обирається
+        найдетальніше представлення шару, за якого найзаповненіша плитка містить не більше
+        budget вершин геометрій (кількість об'єктів у плитці рахується за вершиною сітки чи
+        вершиною сектора). Для секторів це повна деталізація, далі – дуги з кроком ARC_STEPS;
+        коли жодне не вкладається в бюджет, цей і дрібніші масштаби отримують агреговані
+        комірки (кількість вершин або секторів у комірці розміром cell_px пікселів), окремий
+        діапазон на кожен масштаб. Тому вартість відображення плитки обмежена на будь-якому масштабі.
+
+        Рівні описуються словниками {'layer', 'kind', 'detail', 'min_zoom', 'max_zoom', 'table_name'}:
+        kind – 'full' (вихідна таблиця шару), 'arc' (спрощені сектори, detail – крок дуги) або
+        'cells' (комірки, detail – розмір у пікселях); min_zoom є значенням zoom_band у таблиці рівня,
+        max_zoom найдетальнішого рівня дорівнює None (усі більші масштаби).
+    """
+
+    def __init__(self, geo_manager, max_zoom=MAX_ZOOM, budget=MAX_VERTICES_PER_TILE, cell_px=CELL_PX,
+                 arc_steps=ARC_STEPS):
+        self.geo_manager = geo_manager
+        self.max_zoom = max_zoom
+        self.budget = budget
+        self.cell_px = cell_px
+        self.arc_steps = tuple(arc_steps)
+
+    def params(self):
+        """Параметри побудови (для відбитка етапу конвеєра)."""
+        return {'max_zoom': self.max_zoom, 'budget': self.budget, 'cell_px': self.cell_px,
+                'arc_steps': list(self.arc_steps)}
+
+    def plan(self, layer, x, y, variants):
+        """
+        Розбиває масштаби на діапазони рівнів шару.
+
+        x, y – координати об'єктів у EPSG:3857; variants – [(kind, detail, вершин на об'єкт)]
+        від найдетальнішого. Повертає рівні від найдетальнішого до найгрубішого.
+        """
+        levels = []
+        for zoom in range(self.max_zoom, -1, -1):
+            per_tile = _max_per_tile(x, y, zoom)
+            choice = next(((kind, detail) for kind, detail, n_vertices in variants
+                           if per_tile * n_vertices <= self.budget), None)
+            if choice is None:
+                # Розмір комірки залежить від масштабу, тож кожен масштаб – окремий діапазон
+                levels.extend({'layer': layer, 'kind': 'cells', 'detail': self.cell_px,
+                               'min_zoom': z, 'max_zoom': z, 'table_name': LOD_TABLES[(layer, 'cells')]}
+                              for z in range(zoom, -1, -1))
+                break
+            if levels and (levels[-1]['kind'], levels[-1]['detail']) == choice:
+                levels[-1]['min_zoom'] = zoom
+            else:
+                kind, detail = choice
+                table_name = TILE_LAYERS[layer] if kind == 'full' else LOD_TABLES[(layer, kind)]
+                levels.append({'layer': layer, 'kind': kind, 'detail': detail,
+                               'min_zoom': zoom, 'max_zoom': zoom, 'table_name': table_name})
+        if levels:
+            levels[0]['max_zoom'] = None
+        return levels
+
+    def _cells(self, x, y, zoom):
+        """Агреговані комірки масштабу zoom: (геометрії в EPSG:4326, кількість точок у комірці)."""
+        n_cells = 2 ** zoom * TILE_SIZE // self.cell_px
+        size_m = MERCATOR_WORLD / n_cells
+        bx, by = _bins(x, y, size_m)
+        # Один ключ int64 на комірку: np.unique по одновимірному масиву значно швидший, ніж з axis=0
+        cells, counts = np.unique(bx * n_cells + by, return_counts=True)
+        # Прямокутник у EPSG:3857 залишається прямокутником у EPSG:4326 – достатньо перевести кути
+        min_x = cells // n_cells * size_m - MERCATOR_WORLD / 2
+        min_y = cells % n_cells * size_m - MERCATOR_WORLD / 2
+        lon0, lat0 = _mercator_to_lonlat(min_x, min_y)
+        lon1, lat1 = _mercator_to_lonlat(min_x + size_m, min_y + size_m)
+        return shapely.box(lon0, lat0, lon1, lat1), counts
+
+    def _cell_table(self, levels, x, y, count_column):
+        bands, counts, geometries = [], [], []
+        for level in levels:
+            if level['kind'] != 'cells':
+                continue
+            cell_geoms, cell_counts = self._cells(x, y, level['min_zoom'])
+            bands.append(np.full(len(cell_counts), level['min_zoom'], dtype=np.int64))
+            counts.append(cell_counts)
+            geometries.append(cell_geoms)
+        return gpd.GeoDataFrame({
+            'zoom_band': np.concatenate(bands) if bands else np.empty(0, dtype=np.int64),
+            count_column: np.concatenate(counts) if counts else np.empty(0, dtype=np.int64),
+        }, geometry=np.concatenate(geometries) if geometries else np.empty(0, dtype=object), crs="EPSG:4326")
+
+    def _arc_table(self, levels, params):
+        """Спрощені сектори рівнів 'arc'; сектори з різними радіусом і розкриттям будуються окремо."""
+        frames = []
+        radius_aperture = np.column_stack([params['radius_km'], params['aperture']])
+        groups = np.unique(radius_aperture, axis=0) if len(radius_aperture) else []
+        for level in levels:
+            if level['kind'] != 'arc':
+                continue
+            for radius_km, aperture in groups:
+                mask = (radius_aperture[:, 0] == radius_km) & (radius_aperture[:, 1] == aperture)
+                sectors = self.geo_manager.sectors_from_params(
+                    params['apex_lon'][mask], params['apex_lat'][mask], params['azimuth'][mask],
+                    radius_km, aperture, angle_step=level['detail']
+                )
+                frames.append(gpd.GeoDataFrame({
+                    'zoom_band': np.full(len(sectors), level['min_zoom'], dtype=np.int64),
+                    'sector_id': params['id'][mask].astype(np.int64),
+                    'azimuth': params['azimuth'][mask],
+                }, geometry=sectors.geometry.values, crs="EPSG:4326"))
+        if not frames:
+            return gpd.GeoDataFrame({'zoom_band': np.empty(0, dtype=np.int64), 'sector_id': np.empty(0, dtype=np.int64),
+                                     'azimuth': np.empty(0)}, geometry=np.empty(0, dtype=object), crs="EPSG:4326")
+        return gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs="EPSG:4326")
+
+    def build(self, vertices, sector_params, angle_step=1):
+        """
+        Будує піраміду для вершин сітки (GeoDataFrame точок) та секторів, заданих параметрами
+        sector_params – {'id', 'apex_lon', 'apex_lat', 'azimuth', 'radius_km', 'aperture'} масивами
+        (див. DatabaseManager.fetch_columns). angle_step – крок дуги секторів повної деталізації.
+
+        Повертає (рівні обох шарів, {таблиця рівня: GeoDataFrame}); таблиці невикористаних
+        типів рівнів порожні, щоб при збереженні з них зникли дані попередньої піраміди.
+        """
+        vertex_x, vertex_y = _lonlat_to_mercator(np.asarray(vertices.geometry.x), np.asarray(vertices.geometry.y))
+        grid_levels = self.plan('grid', vertex_x, vertex_y, [('full', None, 1)])
+
+        apex_x, apex_y = _lonlat_to_mercator(sector_params['apex_lon'], sector_params['apex_lat'])
+        aperture = float(np.max(sector_params['aperture'])) if len(sector_params['aperture']) else 0.0
+        variants = [('full', angle_step, _sector_vertices(aperture, angle_step))]
+        variants += [('arc', step, _sector_vertices(aperture, step)) for step in self.arc_steps if step > angle_step]
+        sector_levels = self.plan('sectors', apex_x, apex_y, variants)
+
+        tables = {
+            LOD_TABLES[('grid', 'cells')]: self._cell_table(grid_levels, vertex_x, vertex_y, 'vertex_count'),
+            LOD_TABLES[('sectors', 'arc')]: self._arc_table(sector_levels, sector_params),
+            LOD_TABLES[('sectors', 'cells')]: self._cell_table(sector_levels, apex_x, apex_y, 'sector_count'),
+        }
+        return grid_levels + sector_levels, tables
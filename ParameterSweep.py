@@ -0,0 +1,251 @@
+import re
+import time
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+import Instrumentation
+from GeoDataManager import _geodesic_inverse, _points_to_lonlat
+from GridLattice import MERCATOR_RADIUS
+
+
+# Запас для перевірки «коло радіуса сектора всередині кордону» за відстанню до кордону:
+# масштаб Меркатора змінюється в межах кола, тому відстань береться з запасом 2%
+CLEARANCE_MARGIN = 0.02
+
+
+def _config_name(config):
+    """Назва конфігурації для імен таблиць: лише латинські літери, цифри та _, до 32 символів."""
+    name = config.get('name') or "s{step_km}_r{radius_km}_a{aperture}_z{azimuths}".format(
+        step_km=config['step_km'], radius_km=config['radius_km'], aperture=config['aperture'],
+        azimuths='_'.join(str(azimuth) for azimuth in config['azimuths'])
+    )
+    return re.sub(r'[^a-z0-9_]', '_', str(name).lower())[:32]
+
+
+def _border_segments(border_union):
+    """Відрізки меж кордону (зовнішніх і внутрішніх кілець) у EPSG:3857."""
+    boundary = gpd.GeoSeries([border_union.boundary], crs="EPSG:4326").to_crs(epsg=3857).iloc[0]
+    segments = []
+    for line in shapely.get_parts(boundary):
+        coords = shapely.get_coordinates(line)
+        segments.append(shapely.linestrings(np.stack([coords[:-1], coords[1:]], axis=1)))
+    return np.concatenate(segments) if segments else np.empty(0, dtype=object)
+
+
+class ParameterSweep:
+    """
+        Клас ParameterSweep обчислює кілька конфігурацій сітки та секторів (step_km, radius_km,
+        azimuths, aperture, angle_step) за один прохід замість повного запуску ProjectController
+        для кожної з них.
+
+        Спільне для всіх конфігурацій: кордон та його індекс BorderIndex. Спільне для конфігурацій
+        з однаковим кроком сітки: вершини, STRtree вершин, відстань від кожної вершини до кордону
+        та таблиця сусідів – геодезичні відстань і азимут від кожної вершини до вершин у межах
+        найбільшого радіуса групи. Перетини всіх радіусів, азимутів і розкриттів групи вибираються
+        з цієї таблиці порівнянням (як у методі 'analytic' GeoDataManager), без полігонів і
+        повторних геодезичних обчислень. Сектор, коло якого вміщується у відстань від вершини до
+        кордону, лежить у межах кордону без перевірки полігона; перевіряються лише сектори біля кордону.
+
+        Результати кожної конфігурації записуються в таблиці sweep_<назва>_vertices, _sectors,
+        _intersections, а підсумок (покриття, кількість перекриттів) – у таблицю sweep_summary.
+    """
+
+    def __init__(self, db_manager, geo_manager, chunk_size=20000, with_geometry=True):
+        self.db_manager = db_manager
+        self.geo_manager = geo_manager
+        self.chunk_size = chunk_size
+        self.with_geometry = with_geometry
+
+    @staticmethod
+    def normalize(config):
+        """Доповнює конфігурацію значеннями за замовчуванням (як у ProjectController) та назвою."""
+        config = {'step_km': 10, 'radius_km': 10, 'azimuths': (0, 120, 240), 'aperture': 60, 'angle_step': 1,
+                  **config}
+        config['azimuths'] = tuple(config['azimuths'])
+        config['name'] = _config_name(config)
+        return config
+
+    def _clearance_m(self, lonlat, segments):
+        """Приблизна відстань (м) від вершин до кордону: відстань у EPSG:3857, зведена до масштабу широти."""
+        if len(segments) == 0:
+            return np.full(len(lonlat), np.inf)
+        x = MERCATOR_RADIUS * np.radians(lonlat[:, 0])
+        y = MERCATOR_RADIUS * np.log(np.tan(np.pi / 4 + np.radians(lonlat[:, 1]) / 2))
+        _, distance = shapely.STRtree(segments).query_nearest(shapely.points(x, y), return_distance=True,
+                                                              all_matches=False)
+        return distance * np.cos(np.radians(lonlat[:, 1]))
+
+    def _sectors_inside(self, config, lonlat, clearance, border_index):
+        """
+        Маска (вершини, азимути) секторів конфігурації, що повністю в межах кордону.
+        Полігони будуються лише для секторів, коло яких не вміщується у відстань до кордону.
+        """
+        n_azimuths = len(config['azimuths'])
+        inside = np.repeat(clearance >= config['radius_km'] * 1000.0 * (1 + CLEARANCE_MARGIN), n_azimuths)
+        uncertain = np.flatnonzero(~inside)
+        apex = uncertain // n_azimuths
+        azimuths = np.asarray(config['azimuths'], dtype=np.float64)[uncertain % n_azimuths]
+        for start in range(0, len(uncertain), self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            sectors = self.geo_manager.sectors_from_params(
+                lonlat[apex[chunk], 0], lonlat[apex[chunk], 1], azimuths[chunk],
+                config['radius_km'], config['aperture'], config['angle_step']
+            )
+            inside[uncertain[chunk]] = border_index.contains(sectors.geometry.values)
+        return inside.reshape(-1, n_azimuths)
+
+    def _neighbour_chunks(self, lonlat, tree, max_radius_m):
+        """
+        Пакетами по chunk_size вершин повертає (вершина, сусідня вершина, відстань, азимут)
+        для всіх пар на відстані (0, max_radius_m], впорядковані за відстанню, – спільна таблиця
+        для всіх радіусів групи.
+        """
+        dlat = max_radius_m / 110574.0 * 1.01
+        for start in range(0, len(lonlat), self.chunk_size):
+            apex_lon = lonlat[start:start + self.chunk_size, 0]
+            apex_lat = lonlat[start:start + self.chunk_size, 1]
+            dlon = max_radius_m / (111320.0 * np.cos(np.radians(np.minimum(np.abs(apex_lat) + dlat, 89.9)))) * 1.01
+            apex, point = tree.query(shapely.box(apex_lon - dlon, apex_lat - dlat, apex_lon + dlon, apex_lat + dlat))
+            distance_m, bearing = _geodesic_inverse(apex_lat[apex], apex_lon[apex],
+                                                    lonlat[point, 1], lonlat[point, 0])
+            keep = np.flatnonzero((distance_m > 0) & (distance_m <= max_radius_m))
+            # За зростанням відстані: пари для меншого радіуса – префікс масивів
+            keep = keep[np.argsort(distance_m[keep], kind='stable')]
+            yield apex[keep] + start, point[keep], distance_m[keep], bearing[keep]
+
+    def _summary(self, config, n_vertices, n_sectors, point_ids, seconds):
+        overlap = np.bincount(point_ids, minlength=n_vertices + 1)[1:]
+        covered = int(np.count_nonzero(overlap))
+        return {
+            'name': config['name'],
+            'step_km': float(config['step_km']),
+            'radius_km': float(config['radius_km']),
+            'azimuths': ','.join(str(azimuth) for azimuth in config['azimuths']),
+            'aperture': float(config['aperture']),
+            'angle_step': float(config['angle_step']),
+            'n_vertices': int(n_vertices),
+            'n_sectors': int(n_sectors),
+            'n_pairs': int(len(point_ids)),
+            'covered_vertices': covered,
+            'coverage_ratio': covered / n_vertices if n_vertices else 0.0,
+            'mean_overlap': float(overlap[overlap > 0].mean()) if covered else 0.0,
+            'max_overlap': int(overlap.max()) if n_vertices else 0,
+            'seconds': seconds,
+        }
+
+    def _save(self, config, vertices, lonlat, inside, sector_idx, point_idx):
+        """Записує вершини, сектори та перетини конфігурації у її таблиці."""
+        name = config['name']
+        apex, azimuth_index = np.nonzero(inside)
+        azimuths = np.asarray(config['azimuths'], dtype=np.float64)[azimuth_index]
+        self.db_manager.create_sweep_tables(name)
+        self.db_manager.save_geodata(vertices, f"sweep_{name}_vertices")
+
+        # Полігони секторів будуються та дописуються пакетами, щоб не тримати їх усі в пам'яті
+        table_name = f"sweep_{name}_sectors"
+        for start in range(0, max(len(apex), 1), self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            if self.with_geometry:
+                sectors = self.geo_manager.sectors_from_params(
+                    lonlat[apex[chunk], 0], lonlat[apex[chunk], 1], azimuths[chunk],
+                    config['radius_km'], config['aperture'], config['angle_step']
+                )
+            else:
+                sectors = pd.DataFrame({
+                    'apex_lon': lonlat[apex[chunk], 0], 'apex_lat': lonlat[apex[chunk], 1],
+                    'azimuth': azimuths[chunk],
+                    'radius_km': float(config['radius_km']), 'aperture': float(config['aperture']),
+                })
+            if start == 0:
+                self.db_manager.save_geodata(sectors, table_name)
+            else:
+                self.db_manager.append_geodata(sectors, table_name, id_offset=start)
+
+        # id секторів і вершин – позиція + 1, як явні id, що записує save_geodata
+        intersections = pd.DataFrame({'sector_id': sector_idx + 1, 'point_id': point_idx + 1})
+        self.db_manager.save_geodata(intersections, f"sweep_{name}_intersections")
+        return len(apex), intersections['point_id'].to_numpy()
+
+    def _run_step(self, step_km, configs, border, border_index, segments):
+        """Обчислює всі конфігурації з однаковим кроком сітки на спільних вершинах і таблиці сусідів."""
+        start_time = time.perf_counter()
+        lattice = self.geo_manager.generate_lattice(border, step_km)
+        vertices = self.geo_manager.filter_grid_by_border(lattice, border)
+        lonlat = _points_to_lonlat(vertices)
+        tree = shapely.STRtree(shapely.points(lonlat))
+        clearance = self._clearance_m(lonlat, segments)
+        shared_seconds = time.perf_counter() - start_time
+
+        # Номер сектора конфігурації для кожної пари (вершина, азимут); -1 – сектор поза кордоном
+        states = []
+        for config in configs:
+            config_start = time.perf_counter()
+            inside = self._sectors_inside(config, lonlat, clearance, border_index)
+            sector_number = np.full(inside.shape, -1, dtype=np.int64)
+            sector_number[inside] = np.arange(np.count_nonzero(inside))
+            states.append({'config': config, 'inside': inside, 'sector_number': sector_number,
+                           'sectors': [], 'points': [], 'seconds': time.perf_counter() - config_start})
+
+        max_radius_m = max(config['radius_km'] for config in configs) * 1000.0
+        for apex, point, distance_m, bearing in self._neighbour_chunks(lonlat, tree, max_radius_m):
+            for state in states:
+                config_start = time.perf_counter()
+                config = state['config']
+                n_near = np.searchsorted(distance_m, config['radius_km'] * 1000.0, side='right')
+                near_apex, near_point, near_bearing = apex[:n_near], point[:n_near], bearing[:n_near]
+                for k, azimuth in enumerate(config['azimuths']):
+                    deviation = np.abs((near_bearing - azimuth + 180) % 360 - 180)
+                    hit = np.flatnonzero(deviation <= config['aperture'] / 2)
+                    sector = state['sector_number'][near_apex[hit], k]
+                    valid = sector >= 0
+                    state['sectors'].append(sector[valid])
+                    state['points'].append(near_point[hit[valid]])
+                state['seconds'] += time.perf_counter() - config_start
+
+        summaries = []
+        for state in states:
+            config = state['config']
+            with Instrumentation.stage(f"sweep:{config['name']}") as measured:
+                config_start = time.perf_counter()
+                # Пари впорядковані за сектором, як у таблиці sector_intersections
+                sectors = np.concatenate(state['sectors']) if state['sectors'] else np.empty(0, dtype=np.int64)
+                points = np.concatenate(state['points']) if state['points'] else np.empty(0, dtype=np.int64)
+                order = np.lexsort((points, sectors))
+                n_sectors, point_ids = self._save(config, vertices, lonlat, state['inside'],
+                                                  sectors[order], points[order])
+                seconds = state['seconds'] + time.perf_counter() - config_start + shared_seconds / len(configs)
+                summaries.append(self._summary(config, len(vertices), n_sectors, point_ids, seconds))
+                measured.items = n_sectors
+            print(f"Конфігурацію '{config['name']}' обчислено: {n_sectors} секторів, "
+                  f"покриття {summaries[-1]['coverage_ratio']:.1%}.")
+        return summaries
+
+    def run(self, configs, border=None):
+        """
+        Обчислює конфігурації (список словників з ключами step_km, radius_km, azimuths, aperture,
+        angle_step та необов'язковою назвою name) і повертає список підсумків, записаних у sweep_summary.
+        """
+        configs = [self.normalize(config) for config in configs]
+        names = [config['name'] for config in configs]
+        if len(set(names)) != len(names):
+            raise ValueError("Назви конфігурацій мають бути унікальними.")
+
+        if border is None:
+            border = self.geo_manager.load_ukraine_border()
+        if border is None:
+            raise RuntimeError("Кордон України недоступний.")
+        border_union = border.unary_union
+        border_index = self.geo_manager.border_index(border_union)
+        segments = _border_segments(border_union)
+
+        summaries = []
+        for step_km in sorted({config['step_km'] for config in configs}):
+            group = [config for config in configs if config['step_km'] == step_km]
+            print(f"Крок сітки {step_km} км: {len(group)} конфігурацій...")
+            summaries.extend(self._run_step(step_km, group, border, border_index, segments))
+
+        self.db_manager.save_sweep_summary(summaries)
+        return summaries
@@ -1,7 +1,17 @@
+import hashlib
+import json
+
 import geopandas as gpd
+import numpy as np
+import shapely
 from shapely.geometry import Polygon, MultiPolygon, LineString
 import matplotlib.pyplot as plt
 
+import Instrumentation
+from LodPyramid import LodPyramid
+from ParameterSweep import ParameterSweep
+from TiledExecutor import TiledExecutor
+
 
 class ProjectController:
     """
@@ -14,76 +24,342 @@ class ProjectController:
         3. Генерувати сітку квадратів та сектори, якщо їх ще не існує.
         4. Відображати отримані дані у вигляді графіків через MapVisualizer.
 
+        Етапи конвеєра (кордон → сітка → вершини → сектори → перетини) мають відбиток
+        своїх вхідних даних і параметрів, який зберігається в таблиці pipeline_stages.
+        Етап пропускається лише тоді, коли відбиток збігається, а перерваний етап
+        продовжується з останнього збереженого пакета. Результати пропущених етапів
+        читаються з локальних артефактів GeoDataManager, а не з бази даних.
+
+        У потоковому режимі (streaming=True) сектори та перетини обчислюються пакетами
+        й одразу записуються в базу, тому всі сектори ніколи не тримаються в пам'яті.
+
+        З intersection_method='postgis' перетини обчислюються в самій базі
+        (DatabaseManager.compute_intersections), без передачі геометрій у Python.
+
+        Останній етап (lod=True) будує піраміду рівнів деталізації для веб-карти (LodPyramid).
+
         Використовує бібліотеку GeoPandas для роботи з геопросторовими даними.
     """
 
 
-    def __init__(self, db_manager, geo_manager, visualizer):
+    def __init__(self, db_manager, geo_manager, visualizer, step_km=10, radius_km=10,
+                 azimuths=(0, 120, 240), aperture=60, angle_step=1, intersection_method='strtree',
+                 chunk_size=20000, tiled=False, streaming=False, lod=True):
         self.db_manager = db_manager
         self.geo_manager = geo_manager
         self.visualizer = visualizer
+        self.step_km = step_km
+        self.radius_km = radius_km
+        self.azimuths = tuple(azimuths)
+        self.aperture = aperture
+        self.angle_step = angle_step
+        self.intersection_method = intersection_method
+        self.chunk_size = chunk_size
+        self.tiled = tiled
+        self.streaming = streaming
+        if intersection_method == 'postgis' and tiled:
+            raise ValueError("Метод перетинів 'postgis' не підтримується у виконанні по плитках (tiled=True).")
+        self.lod_pyramid = LodPyramid(geo_manager) if lod else None
+
+    @staticmethod
+    def _fingerprint(stage, params, upstream=None):
+        """Відбиток етапу: SHA-256 від назви, параметрів та відбитка попереднього етапу."""
+        payload = json.dumps({'stage': stage, 'params': params, 'upstream': upstream}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _stage_done(self, stage, fingerprint):
+        state = self.db_manager.get_stage(stage)
+        return state is not None and state['completed'] and state['fingerprint'] == fingerprint
+
+    def _read_table(self, table_name):
+        return gpd.read_postgis(
+            f"SELECT * FROM {table_name} ORDER BY id",
+            self.db_manager.engine,
+            geom_col='geometry'
+        )
+
+    def _load_stage(self, stage, fingerprint):
+        """Повертає результат завершеного етапу з артефакту, а за його відсутності – з бази (і зберігає артефакт)."""
+        geodata = self.geo_manager.load_artifact(stage, fingerprint)
+        if geodata is None:
+            geodata = self._read_table(stage)
+            self.geo_manager.save_artifact(stage, fingerprint, geodata)
+        return geodata
+
+    def _run_chunked_stage(self, stage, fingerprint, n_items, compute_chunk):
+        """
+        Виконує етап пакетами по chunk_size елементів вхідних даних.
+
+        Кожен пакет дописується в таблицю етапу разом з відміткою прогресу, тому при
+        тому самому відбитку обробка продовжується з першого незбереженого пакета.
+        """
+        state = self.db_manager.get_stage(stage)
+        if state is not None and state['fingerprint'] == fingerprint:
+            chunks_done, rows_done = state['chunks_done'], state['rows_done']
+            if chunks_done:
+                print(f"Продовжуємо етап '{stage}' з пакета {chunks_done}.")
+        else:
+            self.db_manager.start_stage(stage, fingerprint, table_name=stage)
+            chunks_done, rows_done = 0, 0
+
+        n_chunks = -(-n_items // self.chunk_size)
+        with Instrumentation.stage(stage) as measured:
+            for chunk_index in range(chunks_done, n_chunks):
+                start = chunk_index * self.chunk_size
+                geodata = compute_chunk(start, start + self.chunk_size)
+                self.db_manager.append_geodata(geodata, stage, id_offset=rows_done,
+                                               stage=stage, chunk_index=chunk_index)
+                rows_done += len(geodata)
+            measured.items = rows_done
+
+        self.db_manager.complete_stage(stage, fingerprint)
+
+    def _run_tiled(self, ukraine, vertices_fp, sectors_fp, intersections_fp):
+        """Обчислює вершини, сектори та перетини паралельно по плитках (TiledExecutor) і зберігає їх."""
+        print("Обчислюємо сітку, сектори та перетини по плитках...")
+        with Instrumentation.stage('tiled') as measured:
+            vertices, sectors, intersections = TiledExecutor(self.geo_manager).run(
+                ukraine, self.step_km, self.radius_km, self.azimuths, self.aperture, self.angle_step,
+                self.intersection_method
+            )
+            measured.items = len(sectors)
+        for stage, fingerprint, geodata in (('grid_squares', vertices_fp, vertices),
+                                             ('grid_sectors', sectors_fp, sectors),
+                                             ('sector_intersections', intersections_fp, intersections)):
+            self.db_manager.save_geodata(geodata, stage)
+            self.db_manager.complete_stage(stage, fingerprint)
+            if stage != 'sector_intersections':
+                self.geo_manager.save_artifact(stage, fingerprint, geodata)
+
+    def _run_db_intersections(self, intersections_fp):
+        """Обчислює перетини в базі даних (DatabaseManager.compute_intersections)."""
+        print("Обраховуємо перетини секторів з вершинами квадратів у базі даних...")
+        state = self.db_manager.get_stage('sector_intersections')
+        if state is None or state['fingerprint'] != intersections_fp:
+            self.db_manager.start_stage('sector_intersections', intersections_fp, table_name='sector_intersections')
+        with Instrumentation.stage('sector_intersections') as measured:
+            measured.items = self.db_manager.compute_intersections()
+        self.db_manager.complete_stage('sector_intersections', intersections_fp)
+
+    def _run_streaming(self, clipped_grid, ukraine, stages):
+        """
+        Потоково обчислює сектори та перетини пакетами по chunk_size вершин.
+
+        stages – {етап: відбиток}: 'grid_sectors' та, якщо перетини рахуються в Python,
+        'sector_intersections'. Кожен пакет секторів і його перетинів записується однією
+        транзакцією разом із прогресом етапів; наступний пакет забирається з пулу лише
+        після запису попереднього.
+        """
+        with_intersections = 'sector_intersections' in stages
+        states = {stage: self.db_manager.get_stage(stage) for stage in stages}
+        resumable = all(
+            state is not None and state['fingerprint'] == stages[stage] for stage, state in states.items()
+        ) and len({state['chunks_done'] for state in states.values()}) == 1
+        if resumable:
+            chunks_done = states['grid_sectors']['chunks_done']
+            sector_rows = states['grid_sectors']['rows_done']
+            pair_rows = states['sector_intersections']['rows_done'] if with_intersections else 0
+            if chunks_done:
+                print(f"Продовжуємо потокову обробку з пакета {chunks_done}.")
+        else:
+            for stage, fingerprint in stages.items():
+                self.db_manager.start_stage(stage, fingerprint, table_name=stage)
+            chunks_done, sector_rows, pair_rows = 0, 0, 0
+
+        point_geoms = np.asarray(clipped_grid.geometry.values)
+        point_ids = clipped_grid['id'].to_numpy() if 'id' in clipped_grid.columns else np.arange(1, len(clipped_grid) + 1)
+        batches = self.geo_manager.iter_sector_batches(
+            clipped_grid, ukraine.unary_union, self.radius_km, self.azimuths, self.aperture, self.angle_step,
+            batch_size=self.chunk_size, with_intersections=with_intersections,
+            intersection_method=self.intersection_method, start=chunks_done * self.chunk_size
+        )
+        with Instrumentation.stage('streaming') as measured:
+            for chunk_index, (sectors, sector_idx, point_idx) in enumerate(batches, start=chunks_done):
+                sectors.insert(0, 'id', np.arange(sector_rows + 1, sector_rows + len(sectors) + 1))
+                batch = {'grid_sectors': (sectors, sector_rows)}
+                if with_intersections:
+                    intersections = gpd.GeoDataFrame({
+                        'sector_id': sector_idx + sector_rows + 1,
+                        'point_id': point_ids[point_idx],
+                    }, geometry=point_geoms[point_idx], crs="EPSG:4326").rename_geometry('point_coordinates')
+                    batch['sector_intersections'] = (intersections, pair_rows)
+                    pair_rows += len(intersections)
+                self.db_manager.append_batch(batch, chunk_index)
+                sector_rows += len(sectors)
+            measured.items = sector_rows
+
+        for stage, fingerprint in stages.items():
+            self.db_manager.complete_stage(stage, fingerprint)
+
+    def _run_lod(self, clipped_grid, lod_fp):
+        """Будує піраміду рівнів деталізації з вершин сітки та параметрів секторів, збережених у базі."""
+        if self.lod_pyramid is None:
+            return
+        if self._stage_done('lod_pyramid', lod_fp):
+            print("Піраміда рівнів деталізації вже побудована.")
+            return
+        print("Будуємо піраміду рівнів деталізації...")
+        with Instrumentation.stage('lod_pyramid') as measured:
+            # Лише параметри секторів, без геометрій – працює і в потоковому режимі
+            sector_params, _ = self.db_manager.fetch_columns('grid_sectors', {
+                name: name for name in ('apex_lon', 'apex_lat', 'azimuth', 'radius_km', 'aperture')
+            })
+            levels, tables = self.lod_pyramid.build(clipped_grid, sector_params, self.angle_step)
+            for table_name, geodata in tables.items():
+                self.db_manager.save_geodata(geodata, table_name)
+            self.db_manager.save_lod_levels(levels)
+            measured.items = sum(len(geodata) for geodata in tables.values())
+        self.db_manager.complete_stage('lod_pyramid', lod_fp)
 
     def run(self):
         """Основна логіка програми: перевірка, створення та завантаження даних."""
+        try:
+            self._run_pipeline()
+        finally:
+            # Підсумок вимірювань етапів (лише з GEO_INSTRUMENTATION=1)
+            Instrumentation.report()
+
+    def _run_pipeline(self):
 
         # Створення таблиць, якщо їх ще немає
         self.db_manager.create_tables()
 
 
-        # Завантаження кордону України
-        if not self.db_manager.data_exists('ukraine_border'):
-            print("Завантажуємо кордон України...")
+        # Завантаження кордону України (відбиток етапу – хеш самої геометрії кордону)
+        with Instrumentation.stage('ukraine_border') as measured:
             ukraine = self.geo_manager.load_ukraine_border()
-            self.db_manager.save_geodata(ukraine, 'ukraine_border')
-        else:
-            print("Кордони України вже завантажені.")
-            ukraine = gpd.read_postgis(
-                "SELECT * FROM ukraine_border",
-                self.db_manager.engine,
-                geom_col='geometry'
-            )
+            if ukraine is not None:
+                digest = hashlib.sha256(b''.join(shapely.to_wkb(np.asarray(ukraine.geometry.values)))).hexdigest()
+                border_fp = self._fingerprint('ukraine_border', {'sha256': digest})
+                if not self._stage_done('ukraine_border', border_fp):
+                    self.db_manager.save_geodata(ukraine, 'ukraine_border')
+                    self.db_manager.complete_stage('ukraine_border', border_fp)
+                else:
+                    print("Кордони України вже завантажені.")
+            else:
+                # Кордон недоступний – працюємо з тим, що вже збережено
+                state = self.db_manager.get_stage('ukraine_border')
+                if state is None or not state['completed']:
+                    raise RuntimeError("Кордон України недоступний і ще не збережений у базі даних.")
+                border_fp = state['fingerprint']
+                ukraine = self._load_stage('ukraine_border', border_fp)
+            measured.items = len(ukraine)
+
 
+        # Відбитки решти етапів залежать лише від параметрів та відбитка кордону.
+        # Порядок секторів (а отже, їх id) у виконанні по плитках інший, тому режим входить у відбиток сітки.
+        grid_fp = self._fingerprint('grid', {'step_km': self.step_km, 'tiled': self.tiled}, border_fp)
+        vertices_fp = self._fingerprint('grid_squares', {}, grid_fp)
+        sectors_fp = self._fingerprint('grid_sectors', {
+            'radius_km': self.radius_km,
+            'azimuths': list(self.azimuths),
+            'aperture': self.aperture,
+            'angle_step': self.angle_step,
+        }, vertices_fp)
+        intersections_fp = self._fingerprint('sector_intersections',
+                                             {'method': self.intersection_method}, sectors_fp)
+        lod_fp = self._fingerprint('lod_pyramid', self.lod_pyramid.params() if self.lod_pyramid else {}, sectors_fp)
 
-        # Генерація сітки квадратів
-        if not self.db_manager.data_exists('grid_squares'):
+        if self.tiled and not all(self._stage_done(stage, fingerprint) for stage, fingerprint in (
+                ('grid_squares', vertices_fp), ('grid_sectors', sectors_fp),
+                ('sector_intersections', intersections_fp))):
+            self._run_tiled(ukraine, vertices_fp, sectors_fp, intersections_fp)
+
+        # Генерація сітки квадратів (проміжний етап без таблиці) та її вершин
+        if not self._stage_done('grid_squares', vertices_fp):
             print("Генеруємо сітку квадратів...")
-            grid = self.geo_manager.generate_grid(ukraine, 10)
-            # Обрізання сітки по кордону України
-            clipped_grid = self.geo_manager.filter_grid_by_border(grid, ukraine)
-            # Зберігаємо обрізану сітку, а не початкову
-            self.db_manager.save_geodata(clipped_grid, 'grid_squares')
+            with Instrumentation.stage('grid_squares') as measured:
+                # Решітка вершин (масиви індексів) замість квадратів-полігонів
+                lattice = self.geo_manager.generate_lattice(ukraine, self.step_km)
+                # Обрізання сітки по кордону України
+                clipped_grid = self.geo_manager.filter_grid_by_border(lattice, ukraine)
+                # Зберігаємо обрізану сітку, а не початкову
+                self.db_manager.save_geodata(clipped_grid, 'grid_squares')
+                measured.items = len(clipped_grid)
+            self.db_manager.complete_stage('grid_squares', vertices_fp)
+            # id збігаються з SERIAL id, які save_geodata записує явно (1..N)
+            clipped_grid.insert(0, 'id', np.arange(1, len(clipped_grid) + 1))
+            self.geo_manager.save_artifact('grid_squares', vertices_fp, clipped_grid)
         else:
             print("Сітка квадратів вже завантажена.")
-            clipped_grid = gpd.read_postgis(
-                "SELECT * FROM grid_squares",
-                self.db_manager.engine,
-                geom_col='geometry'
-            )
+            clipped_grid = self._load_stage('grid_squares', vertices_fp)
         plt.show()
 
+        in_db = self.intersection_method == 'postgis'
+        if self.streaming:
+            # Перетини в базі рахуються окремим етапом після запису всіх секторів
+            streamed = {'grid_sectors': sectors_fp}
+            if not in_db:
+                streamed['sector_intersections'] = intersections_fp
+            streamed_done = all(self._stage_done(stage, fingerprint) for stage, fingerprint in streamed.items())
+            if not streamed_done:
+                print("Потоково генеруємо сектори..." if in_db else "Потоково генеруємо сектори та перетини...")
+                self._run_streaming(clipped_grid, ukraine, streamed)
+            if in_db and not self._stage_done('sector_intersections', intersections_fp):
+                self._run_db_intersections(intersections_fp)
+            elif streamed_done:
+                print("Сектори та перетини вже збережені у базі даних.")
+            self._run_lod(clipped_grid, lod_fp)
+            # Сектори не завантажуються з бази цілком – на графіку лише кордон і сітка
+            self.visualizer.display_combined(ukraine, clipped_grid, gpd.GeoDataFrame(geometry=[], crs="EPSG:4326"),
+                                             "Карта України із сіткою")
+            return
+
         # Генерація та збереження секторів
-        if not self.db_manager.data_exists('grid_sectors'):
+        if not self._stage_done('grid_sectors', sectors_fp):
             print("Генеруємо сектори...")
             border_union = ukraine.unary_union  # Об'єднана геометрія кордону України
-            sectors = self.geo_manager.generate_sectors_parallel(clipped_grid, border_union)
-            self.db_manager.save_geodata(sectors, 'grid_sectors')
+            self._run_chunked_stage(
+                'grid_sectors', sectors_fp, len(clipped_grid),
+                lambda start, stop: self.geo_manager.generate_sectors_parallel(
+                    clipped_grid.iloc[start:stop], border_union, self.radius_km,
+                    self.azimuths, self.aperture, self.angle_step
+                )
+            )
         else:
             print("Сектори вже згенеровані.")
-            sectors = gpd.read_postgis(
-                "SELECT * FROM grid_sectors",
-                self.db_manager.engine,
-                geom_col='geometry'
-            )
+        sectors = self._load_stage('grid_sectors', sectors_fp)
+
         #Рахуєм та зберігаєм, які вершини квадратів перетинають сектори
-        # if not self.db_manager.data_exists('sector_intersections'):
-        #     print("Обраховуємо перетини секторів з вершинами квадратів...")
-        #     intersections = self.geo_manager.find_intersections(sectors, clipped_grid)
-        #     self.db_manager.save_intersections(intersections)
-        # else:
-        #     print("Перетини вже збережені у базі даних.")
+        if in_db and not self._stage_done('sector_intersections', intersections_fp):
+            self._run_db_intersections(intersections_fp)
+        elif not self._stage_done('sector_intersections', intersections_fp):
+            print("Обраховуємо перетини секторів з вершинами квадратів...")
+            # Дерево вершин спільне для всіх пакетів секторів
+            point_tree = shapely.STRtree(np.asarray(clipped_grid.geometry.values))
+            self._run_chunked_stage(
+                'sector_intersections', intersections_fp, len(sectors),
+                lambda start, stop: self.geo_manager.find_intersections(
+                    sectors.iloc[start:stop], clipped_grid, method=self.intersection_method, point_tree=point_tree
+                )
+            )
+        else:
+            print("Перетини вже збережені у базі даних.")
+        if not self.geo_manager.has_artifact('sector_intersections', intersections_fp):
+            pairs = self.db_manager.read_intersection_pairs()
+            self.geo_manager.save_artifact('sector_intersections', intersections_fp, pairs)
+
+        # Піраміда рівнів деталізації для веб-карти
+        self._run_lod(clipped_grid, lod_fp)
 
         # Візуалізація кордону, сітки та секторів
         self.visualizer.display_combined(ukraine, clipped_grid, sectors,
                                          "Карта України із сіткою та секторами")
 
+    def run_sweep(self, configs):
+        """
+        Обчислює кілька конфігурацій (ParameterSweep) за один прохід. Основні таблиці конвеєра
+        не змінюються: результати записуються в таблиці sweep_<назва>_* та sweep_summary.
+        """
+        try:
+            return ParameterSweep(self.db_manager, self.geo_manager, self.chunk_size).run(configs)
+        finally:
+            Instrumentation.report()
+
+    def seed_tiles(self, tile_cache, min_zoom=0, max_zoom=10):
+        """Заповнює кеш векторних плиток для веб-версії поточними даними з бази."""
+        print("Генеруємо векторні плитки...")
+        ukraine = gpd.read_postgis("SELECT * FROM ukraine_border", self.db_manager.engine, geom_col='geometry')
+        tile_cache.seed(self.db_manager, ukraine.total_bounds, min_zoom, max_zoom)
+
 
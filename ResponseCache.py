@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+# Заголовок файлу запису на диску: довжина метаданих JSON (ключ і заголовки відповіді)
+_ENTRY_HEADER = struct.Struct('<I')
+
+
+class ResponseCache:
+    """
+        Клас ResponseCache зберігає готові відповіді API (тіло та заголовки) у пам'яті та на диску.
+
+        Ключ відповіді містить версії даних таблиць, з яких її побудовано (DatabaseManager.get_data_versions),
+        тому після нового запуску main.py старі записи більше не запитуються і поступово витісняються:
+        у пам'яті – найдавніше використані понад max_memory_bytes, на диску – файли з найдавнішим
+        зверненням понад max_disk_bytes. Запис, більший за чверть ліміту рівня, у цей рівень не потрапляє.
+
+        Дисковий рівень переживає перезапуск сервера і спільний для кількох його процесів: файли
+        записуються у тимчасовий файл і атомарно перейменовуються.
+    """
+
+    def __init__(self, directory, max_memory_bytes=64 * 1024 * 1024, max_disk_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith('.bin'))
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.bin')
+
+    def _remember(self, key, body, headers):
+        """Додає запис у пам'ять і витісняє найдавніше використані (викликається під self._lock)."""
+        if len(body) > self.max_memory_bytes // 4:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous[0])
+        self._memory[key] = (body, headers)
+        self._memory_bytes += len(body)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # час звернення для витіснення з диска
+        except OSError:
+            return None
+        (meta_size,) = _ENTRY_HEADER.unpack_from(data, 0)
+        meta = json.loads(data[_ENTRY_HEADER.size:_ENTRY_HEADER.size + meta_size])
+        if meta['key'] != key:
+            return None
+        return data[_ENTRY_HEADER.size + meta_size:], meta['headers']
+
+    def get(self, key):
+        """Повертає (тіло, заголовки) або None, якщо відповіді немає в кеші."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return entry
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+            self._remember(key, *entry)
+        return entry
+
+    def put(self, key, body, headers):
+        """Зберігає відповідь (тіло bytes, заголовки dict) у пам'яті та на диску."""
+        with self._lock:
+            self._remember(key, body, headers)
+        if len(body) > self.max_disk_bytes // 4:
+            return
+
+        meta = json.dumps({'key': key, 'headers': headers}).encode('utf-8')
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_ENTRY_HEADER.pack(len(meta)))
+                f.write(meta)
+                f.write(body)
+            # Запис, що замінюється, вже врахований у _disk_bytes
+            try:
+                replaced_size = os.path.getsize(path)
+            except OSError:
+                replaced_size = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Не вдалося записати відповідь у кеш: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self._disk_bytes += _ENTRY_HEADER.size + len(meta) + len(body) - replaced_size
+            evict = self._disk_bytes > self.max_disk_bytes
+        if evict:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Видаляє файли з найдавнішим зверненням, доки кеш на диску не займе 90% ліміту."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.bin'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+    def render(self):
+        """Лічильники звернень і розмір кешу у текстовому форматі Prometheus."""
+        with self._lock:
+            stats = dict(self._stats)
+            memory_bytes, disk_bytes, entries = self._memory_bytes, self._disk_bytes, len(self._memory)
+        lines = [
+            "# HELP response_cache_requests_total Звернення до кешу відповідей.",
+            "# TYPE response_cache_requests_total counter",
+            f'response_cache_requests_total{{result="memory_hit"}} {stats["memory_hits"]}',
+            f'response_cache_requests_total{{result="disk_hit"}} {stats["disk_hits"]}',
+            f'response_cache_requests_total{{result="miss"}} {stats["misses"]}',
+            "# HELP response_cache_bytes Розмір кешу відповідей.",
+            "# TYPE response_cache_bytes gauge",
+            f'response_cache_bytes{{level="memory"}} {memory_bytes}',
+            f'response_cache_bytes{{level="disk"}} {disk_bytes}',
+            "# HELP response_cache_memory_entries Кількість відповідей у пам'яті.",
+            "# TYPE response_cache_memory_entries gauge",
+            f"response_cache_memory_entries {entries}",
+        ]
+        return '\n'.join(lines) + '\n'
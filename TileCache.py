@@ -0,0 +1,178 @@
+import math
+import os
+import sqlite3
+from contextlib import contextmanager
+
+
+# Шари векторних плиток: назва шару -> таблиця в базі даних
+TILE_LAYERS = {
+    'border': 'ukraine_border',
+    'grid': 'grid_squares',
+    'sectors': 'grid_sectors',
+}
+
+# Мінімальний масштаб, з якого шар потрапляє у плитки, поки не побудовано піраміду деталізації
+# (дрібніше – порожні плитки)
+TILE_MIN_ZOOM = {
+    'border': 0,
+    'grid': 7,
+    'sectors': 9,
+}
+
+# Колонки, що потрапляють у властивості об'єктів плитки
+TILE_ATTRIBUTES = {
+    'border': (),
+    'grid': (),
+    'sectors': ('azimuth',),
+}
+
+# Таблиці рівнів деталізації (див. LodPyramid) за шаром і типом рівня та їх колонки у плитках
+LOD_TABLES = {
+    ('grid', 'cells'): 'grid_lod',
+    ('sectors', 'arc'): 'sector_lod',
+    ('sectors', 'cells'): 'sector_density_lod',
+}
+LOD_ATTRIBUTES = {
+    ('grid', 'cells'): ('vertex_count',),
+    ('sectors', 'arc'): ('sector_id', 'azimuth'),
+    ('sectors', 'cells'): ('sector_count',),
+}
+
+# Назва версії вмісту кешу плиток у data_versions (DatabaseManager.bump_data_version)
+TILES_VERSION = 'tiles'
+
+
+def tile_source(lod_levels, layer, zoom):
+    """
+    Джерело шару на масштабі zoom: {'kind', 'detail', 'table_name', 'zoom_band', 'attributes'}
+    або None, якщо на цьому масштабі шар не відображається.
+
+    lod_levels – рівні деталізації з DatabaseManager.get_lod_levels(); якщо для шару їх немає
+    (піраміду не побудовано), шар віддається з вихідної таблиці, починаючи з TILE_MIN_ZOOM.
+    """
+    full = {'kind': 'full', 'detail': None, 'table_name': TILE_LAYERS[layer], 'zoom_band': None,
+            'attributes': TILE_ATTRIBUTES[layer]}
+    levels = lod_levels.get(layer)
+    if not levels:
+        return full if zoom >= TILE_MIN_ZOOM[layer] else None
+    for level in levels:
+        if level['min_zoom'] <= zoom and (level['max_zoom'] is None or zoom <= level['max_zoom']):
+            if level['kind'] == 'full':
+                return full
+            return {'kind': level['kind'], 'detail': level['detail'], 'table_name': level['table_name'],
+                    'zoom_band': level['min_zoom'], 'attributes': LOD_ATTRIBUTES[(layer, level['kind'])]}
+    return None
+
+
+def tiles_for_bounds(bounds, zoom):
+    """Повертає координати (x, y) усіх плиток XYZ масштабу zoom, що покривають bounds (EPSG:4326)."""
+    minx, miny, maxx, maxy = bounds
+    n = 2 ** zoom
+
+    def tile_x(lon):
+        return min(n - 1, max(0, int((lon + 180.0) / 360.0 * n)))
+
+    def tile_y(lat):
+        lat = max(min(lat, 85.0511), -85.0511)
+        lat_rad = math.radians(lat)
+        return min(n - 1, max(0, int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)))
+
+    for x in range(tile_x(minx), tile_x(maxx) + 1):
+        for y in range(tile_y(maxy), tile_y(miny) + 1):
+            yield x, y
+
+
+class TileCache:
+    """
+        Клас TileCache зберігає згенеровані векторні плитки на диску у форматі MBTiles (SQLite).
+
+        Кожен шар зберігається в окремому файлі <назва шару>.mbtiles у каталозі кешу.
+        Рядки плиток зберігаються за схемою TMS, як того вимагає MBTiles, а API приймає XYZ.
+        Порожні плитки теж кешуються, щоб не звертатися за ними до бази даних повторно.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        for layer in TILE_LAYERS:
+            with self._connect(layer) as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS tiles (
+                        zoom_level INTEGER,
+                        tile_column INTEGER,
+                        tile_row INTEGER,
+                        tile_data BLOB,
+                        PRIMARY KEY (zoom_level, tile_column, tile_row)
+                    );
+                """)
+                conn.executemany("INSERT OR IGNORE INTO metadata (name, value) VALUES (?, ?);", [
+                    ('name', layer),
+                    ('format', 'pbf'),
+                    ('json', '{"vector_layers": [{"id": "%s", "fields": {}}]}' % layer),
+                ])
+
+    @contextmanager
+    def _connect(self, layer):
+        """Відкриває з'єднання з файлом шару, фіксує зміни та закриває його після використання."""
+        # Окреме з'єднання на кожну операцію: кеш використовується з потоків Flask
+        conn = sqlite3.connect(os.path.join(self.directory, f"{layer}.mbtiles"), timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL;")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, layer, z, x, y):
+        """Повертає дані плитки або None, якщо її немає в кеші."""
+        with self._connect(layer) as conn:
+            row = conn.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?;",
+                (z, x, (2 ** z - 1) - y)
+            ).fetchone()
+        return bytes(row[0]) if row is not None else None
+
+    def put(self, layer, z, x, y, data):
+        """Зберігає плитку в кеші."""
+        self.put_many(layer, [(z, x, y, data)])
+
+    def put_many(self, layer, tiles):
+        """Зберігає набір плиток (z, x, y, data) однією транзакцією."""
+        with self._connect(layer) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?);",
+                [(z, x, (2 ** z - 1) - y, sqlite3.Binary(data)) for z, x, y, data in tiles]
+            )
+
+    def clear(self, layer=None):
+        """Видаляє всі плитки шару (або всіх шарів) – після зміни даних у базі."""
+        for name in ([layer] if layer is not None else TILE_LAYERS):
+            with self._connect(name) as conn:
+                conn.execute("DELETE FROM tiles;")
+
+    def seed(self, db_manager, bounds, min_zoom=0, max_zoom=10, layers=None):
+        """
+        Заповнює кеш плитками для області bounds (EPSG:4326) у діапазоні масштабів.
+
+        Попередні плитки шару видаляються, тому кеш відповідає поточним даним у базі.
+        Джерело плиток кожного масштабу обирається за рівнями деталізації (tile_source).
+        Після заповнення збільшується версія даних 'tiles' (TILES_VERSION), що входить у ключ
+        кешу відповідей server.py: плитки, закешовані з попереднього вмісту, більше не віддаються.
+        """
+        lod_levels = db_manager.get_lod_levels()
+        for layer in (layers or TILE_LAYERS):
+            self.clear(layer)
+            for z in range(min_zoom, max_zoom + 1):
+                source = tile_source(lod_levels, layer, z)
+                if source is None:
+                    continue
+                tiles = [
+                    (z, x, y, db_manager.get_mvt_tile(source['table_name'], layer, z, x, y,
+                                                      attributes=source['attributes'],
+                                                      zoom_band=source['zoom_band']))
+                    for x, y in tiles_for_bounds(bounds, z)
+                ]
+                self.put_many(layer, tiles)
+            print(f"Плитки шару '{layer}' згенеровано.")
+        db_manager.bump_data_version(TILES_VERSION)
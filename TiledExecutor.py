@@ -0,0 +1,194 @@
+import math
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+from GeoDataManager import GeoDataManager
+from GridLattice import GridLattice
+from Instrumentation import pool_task, PoolTracker
+
+
+# Стан процесу пулу: кордон, параметри решітки та масиви у спільній пам'яті
+_tile_state = {}
+
+
+def _attach_shared_array(name, shape, dtype):
+    """Підключається до масиву у спільній пам'яті, створеного батьківським процесом."""
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _init_tile_worker(border_index, lattice, shared_arrays, params):
+    """Ініціалізатор процесу пулу: індекс кордону, решітка та спільні масиви передаються один раз."""
+    _tile_state.update(border_index=border_index, lattice=lattice, params=params,
+                       geo_manager=GeoDataManager(), handles=[])
+    for key, (name, shape, dtype) in shared_arrays.items():
+        shm, array = _attach_shared_array(name, shape, dtype)
+        _tile_state['handles'].append(shm)
+        _tile_state[key] = array
+
+
+def _lattice_lonlat(jj, ii):
+    return _tile_state['lattice'].lonlat(jj, ii)
+
+
+@pool_task
+def _filter_tile(tile):
+    """Етап 1: позначає у спільній масці вершини плитки, що знаходяться всередині кордону."""
+    j0, j1, i0, i1 = tile
+    jj, ii = np.mgrid[j0:j1, i0:i1]
+    lon, lat = _lattice_lonlat(jj, ii)
+    inside = _tile_state['border_index'].contains_xy(lon, lat)
+    _tile_state['inside'][j0:j1, i0:i1] = inside
+    return int(inside.sum())
+
+
+@pool_task
+def _process_tile(tile):
+    """
+    Етап 2: сектори для вершин плитки та їх перетини з вершинами плитки і смуги навколо неї.
+
+    Смуга (halo) шириною в радіус сектора покриває сектори, що виходять за межі плитки.
+    Повертає параметри та геометрію (WKB) збережених секторів і пари (локальний номер сектора, id вершини).
+    """
+    j0, j1, i0, i1 = tile
+    params = _tile_state['params']
+    inside = _tile_state['inside']
+    vertex_id = _tile_state['vertex_id']
+    geo_manager = _tile_state['geo_manager']
+
+    jj, ii = np.nonzero(inside[j0:j1, i0:i1])
+    lon, lat = _lattice_lonlat(jj + j0, ii + i0)
+    sectors = geo_manager.generate_sectors_batch(
+        np.column_stack([lon, lat]), params['azimuths'], params['radius_km'],
+        params['aperture'], params['angle_step']
+    )
+    sectors = sectors[_tile_state['border_index'].contains(sectors.geometry.values)]
+
+    halo = params['halo']
+    h_j0, h_j1 = max(j0 - halo, 0), min(j1 + halo, inside.shape[0])
+    h_i0, h_i1 = max(i0 - halo, 0), min(i1 + halo, inside.shape[1])
+    hj, hi = np.nonzero(inside[h_j0:h_j1, h_i0:h_i1])
+    candidate_lon, candidate_lat = _lattice_lonlat(hj + h_j0, hi + h_i0)
+    candidate_ids = vertex_id[hj + h_j0, hi + h_i0]
+    candidates = gpd.GeoDataFrame(geometry=shapely.points(candidate_lon, candidate_lat), crs="EPSG:4326")
+
+    sector_idx, point_idx = geo_manager.find_intersection_pairs(
+        sectors, candidates, method=params['intersection_method']
+    )
+    return {
+        'apex_lon': sectors['apex_lon'].to_numpy(),
+        'apex_lat': sectors['apex_lat'].to_numpy(),
+        'azimuth': sectors['azimuth'].to_numpy(),
+        'geometry': shapely.to_wkb(sectors.geometry.values),
+        'sector_idx': sector_idx,
+        'point_id': candidate_ids[point_idx].astype(np.int64),
+    }
+
+
+class TiledExecutor:
+    """
+        Клас TiledExecutor виконує весь геометричний конвеєр (сітка → фільтр вершин → сектори → перетини)
+        паралельно по плитках решітки.
+
+        Решітка вершин задається початком і кроком у EPSG:3857 (GridLattice, як у GeoDataManager.generate_lattice)
+        і розбивається на плитки по tile_size × tile_size вершин. Маска вершин усередині кордону
+        та їх id зберігаються у спільній пам'яті, тому процеси не отримують копій сітки:
+        їм передаються лише межі плитки.
+    """
+
+    def __init__(self, geo_manager, tile_size=256, processes=None):
+        self.geo_manager = geo_manager
+        self.tile_size = tile_size
+        self.processes = processes or mp.cpu_count()
+
+    def run(self, border, step_km, radius_km=10, azimuths=(0, 120, 240), aperture=60, angle_step=1,
+            intersection_method='strtree'):
+        """
+        Повертає (вершини, сектори, перетини) у вигляді GeoDataFrame.
+
+        Вершини впорядковані за рядками решітки, сектори – за плитками; їх id (1..N) збігаються
+        з SERIAL id після збереження через DatabaseManager.save_geodata.
+        """
+        border_union = border.unary_union
+        # Процесам передаються лише початок, крок і розміри решітки
+        lattice = GridLattice.from_bounds(border, step_km)
+        nx, ny, step_m = lattice.nx, lattice.ny, lattice.step_m
+
+        # Ширина смуги у вершинах: радіус у метрах Меркатора зростає як 1/cos(широти)
+        max_lat = np.max(np.abs(border.total_bounds[[1, 3]]))
+        halo = math.ceil(radius_km * 1000 / math.cos(math.radians(max_lat)) / step_m) + 1
+
+        tiles = [
+            (j0, min(j0 + self.tile_size, ny), i0, min(i0 + self.tile_size, nx))
+            for j0 in range(0, ny, self.tile_size)
+            for i0 in range(0, nx, self.tile_size)
+        ]
+
+        segments = {}
+        arrays = {}
+        try:
+            for key, dtype in (('inside', np.bool_), ('vertex_id', np.int32)):
+                size = max(ny * nx * np.dtype(dtype).itemsize, 1)
+                segments[key] = shared_memory.SharedMemory(create=True, size=size)
+                arrays[key] = np.ndarray((ny, nx), dtype=dtype, buffer=segments[key].buf)
+                arrays[key][:] = 0
+
+            shared_arrays = {key: (segments[key].name, (ny, nx), arrays[key].dtype.str) for key in arrays}
+            params = {
+                'azimuths': tuple(azimuths), 'radius_km': radius_km, 'aperture': aperture,
+                'angle_step': angle_step, 'halo': halo, 'intersection_method': intersection_method,
+            }
+            initargs = (self.geo_manager.border_index(border_union), lattice, shared_arrays, params)
+
+            with mp.Pool(self.processes, initializer=_init_tile_worker, initargs=initargs) as pool:
+                tracker = PoolTracker('TiledExecutor.filter_tiles', self.processes)
+                tracker.unwrap_list(pool.map(_filter_tile, tiles))
+
+                # id вершин у порядку рядків решітки; процеси бачать їх через спільну пам'ять
+                inside = arrays['inside']
+                arrays['vertex_id'][:] = np.where(inside, np.cumsum(inside).reshape(ny, nx), 0)
+
+                tracker = PoolTracker('TiledExecutor.process_tiles', self.processes)
+                results = tracker.unwrap_list(pool.map(_process_tile, tiles))
+
+            jj, ii = np.nonzero(arrays['inside'])
+            lon, lat = lattice.lonlat(jj, ii)
+        finally:
+            for key in list(arrays):
+                del arrays[key]
+            for segment in segments.values():
+                segment.close()
+                segment.unlink()
+
+        vertices = gpd.GeoDataFrame({'id': np.arange(1, len(lon) + 1)},
+                                    geometry=shapely.points(lon, lat), crs="EPSG:4326")
+
+        # Геометрії секторів уже побудовані процесами – лише розбираємо їх WKB
+        apex_lon = np.concatenate([result['apex_lon'] for result in results])
+        sectors = gpd.GeoDataFrame({
+            'id': np.arange(1, len(apex_lon) + 1),
+            'apex_lon': apex_lon,
+            'apex_lat': np.concatenate([result['apex_lat'] for result in results]),
+            'azimuth': np.concatenate([result['azimuth'] for result in results]),
+            'radius_km': np.full(len(apex_lon), float(radius_km)),
+            'aperture': np.full(len(apex_lon), float(aperture)),
+        }, geometry=shapely.from_wkb(np.concatenate([result['geometry'] for result in results])), crs="EPSG:4326")
+
+        # Локальні номери секторів плитки зсуваються на кількість секторів попередніх плиток
+        offsets = np.cumsum([0] + [len(result['apex_lon']) for result in results[:-1]])
+        sector_ids = np.concatenate([
+            result['sector_idx'] + offset + 1 for result, offset in zip(results, offsets)
+        ])
+        point_ids = np.concatenate([result['point_id'] for result in results])
+
+        intersections = gpd.GeoDataFrame({
+            'sector_id': sector_ids,
+            'point_id': point_ids,
+        }, geometry=np.asarray(vertices.geometry.values)[point_ids - 1], crs="EPSG:4326")
+        intersections = intersections.rename_geometry('point_coordinates')
+
+        return vertices, sectors, intersections
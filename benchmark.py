@@ -0,0 +1,257 @@
+"""
+Виконав: Стоян Олександр
+Версія: Вимірювання продуктивності
+
+Цей код вимірює продуктивність етапів GeoDataManager (сітка, фільтрація вершин, сектори,
+перетини) та запису даних DatabaseManager без доступу до мережі. Замість кордону з інтернету
+використовується локальний файл data/ukraine_border.geojson, а за його відсутності –
+синтетичний полігон розміром з Україну.
+
+Кожен крок сітки (step_km) виконується в окремому процесі, тому пікова пам'ять (RSS)
+не залежить від попередніх запусків. Для кожного етапу записуються час, кількість
+об'єктів, об'єктів за секунду та пікова пам'ять процесу після етапу.
+
+Запис даних: з --db user:password@host/db_name – у PostGIS через DatabaseManager
+(таблиці бази очищаються, тому використовуйте окрему базу для вимірювань), без нього –
+у тимчасовий файл SQLite (геометрія у WKB) як заміну для оцінки вводу-виводу.
+
+Приклади:
+    python benchmark.py --steps 50 20 10 --output results.json
+    python benchmark.py --compare old.json new.json --threshold 0.15
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+from DatabaseManager import DatabaseManager
+from GeoDataManager import GeoDataManager, BORDER_PATH
+
+
+DEFAULT_STEPS = (50, 20, 10, 5, 1)
+
+
+def synthetic_border(n_vertices=4000, seed=0):
+    """Синтетичний кордон: замкнена хвиляста крива в межах області України (≈22–40° сх. д., 44–52.4° пн. ш.)."""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 2 * np.pi, n_vertices, endpoint=False)
+    r = 1 + 0.08 * np.sin(5 * t) + 0.03 * np.sin(23 * t) + 0.004 * rng.standard_normal(n_vertices)
+    lon = 31.0 + 8.5 * r * np.cos(t)
+    lat = 48.2 + 3.6 * r * np.sin(t)
+    polygon = shapely.make_valid(shapely.Polygon(np.column_stack([lon, lat])))
+    return gpd.GeoDataFrame(geometry=[polygon], crs="EPSG:4326")
+
+
+def load_border():
+    """Повертає (кордон, назва джерела): локальний файл кордону або синтетичний полігон."""
+    if os.path.exists(BORDER_PATH):
+        return gpd.read_file(BORDER_PATH), os.path.basename(BORDER_PATH)
+    return synthetic_border(), "synthetic"
+
+
+def peak_rss_mb():
+    """Пікова резидентна пам'ять поточного процесу в МБ."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux повертає кілобайти, macOS – байти
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StageTimer:
+    """Збирає результати етапів одного запуску."""
+
+    def __init__(self):
+        self.stages = []
+
+    def measure(self, stage, func, count=len):
+        """Виконує func(), записує час, кількість об'єктів count(результат) та пікову пам'ять."""
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        items = int(count(result))
+        self.stages.append({
+            'stage': stage,
+            'seconds': round(seconds, 6),
+            'items': items,
+            'items_per_s': round(items / seconds, 1) if seconds > 0 else None,
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        })
+        print(f"  {stage}: {seconds:.3f} с, {items} об'єктів", file=sys.stderr)
+        return result
+
+
+def _sqlite_writer(path):
+    """Записувач у SQLite: таблиця замінюється, геометрія зберігається як WKB."""
+    conn = sqlite3.connect(path)
+
+    def write(geodata, table_name):
+        frame = geodata.drop(columns=geodata.geometry.name)
+        frame[geodata.geometry.name] = shapely.to_wkb(np.asarray(geodata.geometry.values))
+        frame.to_sql(table_name, conn, if_exists='replace', index=False, chunksize=50000)
+        conn.commit()
+        return len(geodata)
+
+    return conn, write
+
+
+def _postgis_writer(db):
+    """Записувач у PostGIS через DatabaseManager (рядок підключення user:password@host/db_name)."""
+    credentials, location = db.rsplit('@', 1)
+    user, password = credentials.split(':', 1)
+    host, db_name = location.split('/', 1)
+    db_manager = DatabaseManager(user, password, host, db_name)
+    db_manager.create_tables()
+
+    def write(geodata, table_name):
+        if table_name == 'sector_intersections':
+            db_manager.save_intersections(geodata)
+        else:
+            db_manager.save_geodata(geodata, table_name)
+        return len(geodata)
+
+    return db_manager.engine, write
+
+
+def run_step(step_km, radius_km, db=None):
+    """Виконує всі етапи для одного кроку сітки та повертає результати."""
+    geo_manager = GeoDataManager()
+    border, border_name = load_border()
+    border_union = border.unary_union
+    timer = StageTimer()
+
+    timer.measure('generate_grid', lambda: geo_manager.generate_grid(border, step_km))
+    lattice = timer.measure('generate_lattice', lambda: geo_manager.generate_lattice(border, step_km))
+    vertices = timer.measure('filter_grid_by_border', lambda: geo_manager.filter_grid_by_border(lattice, border))
+    sectors = timer.measure('generate_sectors_parallel',
+                            lambda: geo_manager.generate_sectors_parallel(vertices, border_union, radius_km))
+    intersections = timer.measure('find_intersections', lambda: geo_manager.find_intersections(sectors, vertices))
+
+    if db is not None:
+        connection, write = _postgis_writer(db)
+        backend = 'postgis'
+    else:
+        handle, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(handle)
+        connection, write = _sqlite_writer(path)
+        backend = 'sqlite'
+    try:
+        for table_name, geodata in (('grid_squares', vertices), ('grid_sectors', sectors),
+                                    ('sector_intersections', intersections)):
+            timer.measure(f'write:{table_name}', lambda: write(geodata, table_name), count=int)
+    finally:
+        if backend == 'sqlite':
+            connection.close()
+            os.remove(path)
+        else:
+            connection.dispose()
+
+    return {'step_km': step_km, 'radius_km': radius_km, 'border': border_name,
+            'writer': backend, 'stages': timer.stages}
+
+
+def run_suite(steps, radius_km, db=None):
+    """Запускає кожен крок сітки в окремому процесі та збирає результати."""
+    runs = []
+    for step_km in steps:
+        print(f"Крок сітки {step_km} км...", file=sys.stderr)
+        command = [sys.executable, os.path.abspath(__file__), '--run-step', str(step_km), '--radius', str(radius_km)]
+        if db is not None:
+            command += ['--db', db]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        sys.stderr.write(completed.stderr)
+        if completed.returncode != 0:
+            runs.append({'step_km': step_km, 'radius_km': radius_km, 'error': completed.returncode})
+            continue
+        runs.append(json.loads(completed.stdout))
+
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'runs': runs,
+    }
+
+
+def compare(old_path, new_path, threshold):
+    """
+    Порівнює два файли результатів за часом кожного етапу.
+    Повертає кількість регресій (новий час більший за старий більш ніж на threshold).
+    """
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+
+    def index(results):
+        return {
+            (run['step_km'], stage['stage']): stage
+            for run in results['runs'] for stage in run.get('stages', [])
+        }
+
+    old_stages, new_stages = index(old), index(new)
+    print(f"{'крок':>6}  {'етап':<32}{'було, с':>10}{'стало, с':>10}{'зміна':>9}{'RSS, МБ':>16}")
+    regressions = 0
+    for key in sorted(old_stages.keys() & new_stages.keys()):
+        before, after = old_stages[key], new_stages[key]
+        ratio = after['seconds'] / before['seconds'] if before['seconds'] > 0 else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions += 1
+            flag = '  <-- регресія'
+        rss = f"{before['peak_rss_mb']:.0f} → {after['peak_rss_mb']:.0f}"
+        print(f"{key[0]:>6}  {key[1]:<32}{before['seconds']:>10.3f}{after['seconds']:>10.3f}"
+              f"{(ratio - 1) * 100:>+8.1f}%{rss:>16}{flag}")
+    print(f"{old.get('commit')} → {new.get('commit')}: регресій {regressions}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Вимірювання продуктивності етапів конвеєра.")
+    parser.add_argument('--steps', type=float, nargs='+', default=DEFAULT_STEPS, help="кроки сітки, км")
+    parser.add_argument('--radius', type=float, default=10, help="радіус секторів, км")
+    parser.add_argument('--db', help="PostGIS user:password@host/db_name (інакше – SQLite)")
+    parser.add_argument('--output', default='benchmark_results.json', help="файл результатів JSON")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="порівняти два файли результатів")
+    parser.add_argument('--threshold', type=float, default=0.1, help="допустиме сповільнення для --compare")
+    parser.add_argument('--run-step', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    if args.run_step is not None:
+        # Дочірній процес: результати одного кроку у stdout, повідомлення етапів – у stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run_step(args.run_step, args.radius, args.db)
+        json.dump(result, sys.stdout)
+        return
+
+    results = run_suite(args.steps, args.radius, args.db)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Результати збережено у {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
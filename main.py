@@ -8,14 +8,27 @@ GeoDataManager та MapVisualizer. Він дозволяє працювати з
 графіків у Python. Логіка контролює перевірку таблиць у базі даних, завантаження
 даних та візуалізацію.
 
+З параметром --sweep configs.json замість основного конвеєра обчислюються конфігурації
+зі списку у файлі JSON (див. ParameterSweep), наприклад:
+    [{"step_km": 10, "radius_km": 5}, {"step_km": 10, "radius_km": 10, "aperture": 90}]
+
 """
+import argparse
+import json
+import os
+
 from DatabaseManager import DatabaseManager
 from GeoDataManager import GeoDataManager
 from MapVisualizer import MapVisualizer
 from ProjectController import ProjectController
+from TileCache import TileCache
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сітка та сектори України.")
+    parser.add_argument('--sweep', help="файл JSON зі списком конфігурацій для ParameterSweep")
+    args = parser.parse_args()
+
     db_manager = DatabaseManager(
         user='geouser',
         password='1',
@@ -25,6 +38,16 @@ if __name__ == "__main__":
     geo_manager = GeoDataManager()
     visualizer = MapVisualizer()
 
-    # Запуск контролера проекту
     controller = ProjectController(db_manager, geo_manager, visualizer)
-    controller.run()
\ No newline at end of file
+
+    if args.sweep:
+        # Порівняння конфігурацій: результати у таблицях sweep_<назва>_* та sweep_summary
+        with open(args.sweep, encoding='utf-8') as f:
+            controller.run_sweep(json.load(f))
+    else:
+        # Запуск контролера проекту
+        controller.run()
+
+        # Попереднє заповнення кешу векторних плиток для server.py
+        tile_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tile_cache")
+        controller.seed_tiles(TileCache(tile_cache_dir))
\ No newline at end of file
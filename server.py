@@ -7,15 +7,39 @@
 PostgreSQL з розширенням PostGIS. Сервер також віддає статичний файл index.html для
 візуалізації карти через Leaflet.
 
+Відповіді API та плитки кешуються (ResponseCache) за версіями даних таблиць і віддаються з ETag:
+повторний запит з If-None-Match отримує 304 без звернення до бази. Асинхронний режим:
+uvicorn server:asgi_app (потрібен пакет asgiref), інакше – python server.py.
+
 """
-from flask import Flask, Response, send_from_directory
-from sqlalchemy import create_engine
-import geopandas as gpd
+from flask import Flask, Response, request, send_from_directory, abort, g
 from flask_cors import CORS
+import gzip
+import hashlib
+import json
 import os
+import time
+
+import numpy as np
+import shapely
 
+import CompactFormat
+from CoverageIndex import CoverageIndex
 from DatabaseManager import DatabaseManager
 from GeoDataManager import GeoDataManager
+from Instrumentation import HttpMetrics
+from ResponseCache import ResponseCache
+from TileCache import TileCache, TILE_LAYERS, LOD_TABLES, TILES_VERSION, tile_source
+
+try:
+    import brotli
+except ImportError:  # brotli необов'язковий – без нього відповіді стискаються gzip
+    brotli = None
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:  # asgiref необов'язковий – без нього сервер запускається лише як WSGI
+    WsgiToAsgi = None
 
 
 app = Flask(__name__)
@@ -26,35 +50,382 @@ USER = 'geouser'
 PASSWORD = '1'
 HOST = 'localhost'
 DB_NAME = 'geoproject'
+# Пул з'єднань: потоки сервера беруть готове з'єднання замість нового підключення на кожен запит;
+# pool_pre_ping відкидає з'єднання, розірвані після перезапуску бази
+POOL_OPTIONS = {'pool_size': 8, 'max_overflow': 8, 'pool_timeout': 10, 'pool_pre_ping': True, 'pool_recycle': 1800}
 
-
-engine = create_engine(f"postgresql+psycopg2://{USER}:{PASSWORD}@{HOST}/{DB_NAME}")
-db_manager = DatabaseManager(USER, PASSWORD, HOST, DB_NAME)
+db_manager = DatabaseManager(USER, PASSWORD, HOST, DB_NAME, **POOL_OPTIONS)
 geo_manager = GeoDataManager()
 
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 
+# Кеш векторних плиток (той самий каталог заповнює main.py)
+tile_cache = TileCache(os.path.join(PROJECT_ROOT, "tile_cache"))
+
+# Кеш відповідей API у пам'яті та на диску (спільний для процесів сервера)
+response_cache = ResponseCache(os.path.join(PROJECT_ROOT, "response_cache"))
+
+# Індекс покриття в пам'яті: будується при запуску, оновлюється при зміні відбитків етапів
+coverage_index = CoverageIndex(db_manager, geo_manager)
+try:
+    coverage_index.refresh()
+except Exception as e:
+    print(f"Індекс покриття недоступний: {e}")
+
+# Метрики запитів для Prometheus (/metrics)
+http_metrics = HttpMetrics()
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_metrics(response):
+    """Записує тривалість обробки та розмір відповіді за шаблоном маршруту (а не конкретним URL)."""
+    start = getattr(g, 'request_start', None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        size = None if response.direct_passthrough else response.calculate_content_length()
+        http_metrics.observe(endpoint, request.method, response.status_code, time.perf_counter() - start, size)
+    return response
+
+
+@app.route("/metrics")
+def get_metrics():
+    return Response(http_metrics.render() + response_cache.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route("/")
 def serve_index():
     """Віддає index.html з папки проекту."""
     return send_from_directory(PROJECT_ROOT, "index.html")
 
 
+# Версії даних перечитуються з бази не частіше ніж раз на VERSION_POLL_INTERVAL секунд –
+# на стільки відповіді можуть відставати від нового запуску main.py
+VERSION_POLL_INTERVAL = 2
+_version_state = {'versions': None, 'loaded_at': None}
+
+
+def data_version(tables):
+    """
+    Версія даних таблиць tables (DatabaseManager.get_data_versions) у вигляді рядка
+    або None, якщо версії недоступні (тоді відповіді не кешуються).
+    """
+    now = time.monotonic()
+    if _version_state['loaded_at'] is None or now - _version_state['loaded_at'] >= VERSION_POLL_INTERVAL:
+        # Час фіксується до запиту, тож недоступна база не опитується на кожен запит
+        _version_state['loaded_at'] = now
+        try:
+            _version_state['versions'] = db_manager.get_data_versions()
+        except Exception as e:
+            print(f"Версії даних недоступні: {e}")
+            _version_state['versions'] = None
+    versions = _version_state['versions']
+    if versions is None:
+        return None
+    return '.'.join(str(versions.get(table_name, 0)) for table_name in tables)
+
+
+def _accepted_encoding():
+    """Стиснення відповіді за Accept-Encoding клієнта: 'br', 'gzip' або None."""
+    if brotli is not None and 'br' in request.accept_encodings:
+        return 'br'
+    if 'gzip' in request.accept_encodings:
+        return 'gzip'
+    return None
+
+
+def _cached_response(tables, build, variant=''):
+    """
+    Відповідь з кешу відповідей або побудована build() і збережена в ньому.
+
+    Ключ містить шлях із параметрами запиту, variant (формат відповіді), стиснення та версію
+    даних таблиць tables; ETag – хеш ключа, тож на If-None-Match з поточним ETag сервер
+    відповідає 304, не будуючи відповідь і не звертаючись до бази.
+    """
+    version = data_version(tables)
+    if version is None:
+        return build()
+    key = f"{request.full_path}|{variant}|{_accepted_encoding()}|{version}"
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()[:32]
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        entry = response_cache.get(key)
+        if entry is None:
+            built = build()
+            if built.status_code != 200:
+                return built
+            entry = (built.get_data(), {name: value for name, value in built.headers.items()
+                                        if name in ('Content-Type', 'Content-Encoding')})
+            response_cache.put(key, *entry)
+        body, headers = entry
+        response = Response(body, headers=headers)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
+
+
+def _border_response():
+    ukraine, _ = db_manager.fetch_geodata('ukraine_border')
+    return _compressed_response(ukraine.to_json(), 'application/json')
+
+
 @app.route("/api/ukraine_border")
 def get_ukraine_border():
-    ukraine = gpd.read_postgis("SELECT * FROM ukraine_border", engine, geom_col='geometry')
-    return Response(ukraine.to_json(), mimetype='application/json')
+    return _cached_response(('ukraine_border',), _border_response)
+
+# Шар плиток за таблицею: джерело даних обирається за масштабом (див. TileCache.tile_source)
+TABLE_LAYERS = {table_name: layer for layer, table_name in TILE_LAYERS.items()}
+# Без таблиці версій рівні деталізації перечитуються з бази не частіше ніж раз на LOD_POLL_INTERVAL секунд
+LOD_POLL_INTERVAL = 30
+_lod_state = {'levels': {}, 'loaded_at': None, 'version': None}
+DEFAULT_PAGE_LIMIT = 5000
+MAX_PAGE_LIMIT = 50000
+
+
+def _layer_tables(layer):
+    """Таблиці, з яких будуються відповіді шару: вихідна, таблиці рівнів деталізації та lod_levels."""
+    return (TILE_LAYERS[layer], *(table_name for (name, _), table_name in LOD_TABLES.items() if name == layer),
+            'lod_levels')
+
+
+def lod_levels():
+    """Рівні деталізації з бази (DatabaseManager.get_lod_levels), перечитуються при зміні їх версії."""
+    now = time.monotonic()
+    version = data_version(('lod_levels',))
+    if (_lod_state['loaded_at'] is None or version != _lod_state['version']
+            or (version is None and now - _lod_state['loaded_at'] >= LOD_POLL_INTERVAL)):
+        # Час і версія фіксуються до запиту, тож недоступна база не опитується на кожен запит
+        _lod_state['loaded_at'] = now
+        _lod_state['version'] = version
+        try:
+            _lod_state['levels'] = db_manager.get_lod_levels()
+        except Exception as e:
+            print(f"Рівні деталізації недоступні: {e}")
+    return _lod_state['levels']
+
+
+def _viewport_args():
+    """Розбирає параметри bbox, zoom, limit та cursor запиту."""
+    try:
+        bbox = request.args.get('bbox')
+        if bbox is not None:
+            bbox = [float(value) for value in bbox.split(',')]
+            if len(bbox) != 4:
+                raise ValueError("bbox має містити 4 числа")
+        zoom = request.args.get('zoom', type=int)
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor', type=int)
+    except ValueError:
+        abort(400)
+
+    if limit is None and (bbox is not None or cursor is not None):
+        limit = DEFAULT_PAGE_LIMIT
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_LIMIT))
+    return bbox, zoom, limit, cursor
+
+
+# Колонки шарів для компактного формату (див. CompactFormat)
+COMPACT_COLUMNS = {
+    'grid_squares': {'lon': 'ST_X(geometry)', 'lat': 'ST_Y(geometry)'},
+    'grid_sectors': {name: name for name in ('apex_lon', 'apex_lat', 'azimuth', 'radius_km', 'aperture')},
+}
+# Менші відповіді не стискаються
+MIN_COMPRESS_SIZE = 1024
+
+
+def _wants_compact():
+    """Формат відповіді: ?format=compact|geojson, інакше за заголовком Accept."""
+    requested = request.args.get('format')
+    if requested is not None:
+        if requested not in ('compact', 'geojson'):
+            abort(400)
+        return requested == 'compact'
+    return request.accept_mimetypes.best_match(['application/json', CompactFormat.MIMETYPE]) == CompactFormat.MIMETYPE
+
+
+def _compressed_response(body, mimetype):
+    """Відповідь, стиснена brotli або gzip відповідно до Accept-Encoding клієнта."""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    encoding = _accepted_encoding() if len(body) >= MIN_COMPRESS_SIZE else None
+    if encoding == 'br':
+        body = brotli.compress(body, quality=5)
+    elif encoding == 'gzip':
+        body = gzip.compress(body, compresslevel=6)
+    response = Response(body, mimetype=mimetype)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
+
+
+def _compact_payload(table_name, columns, next_cursor):
+    if table_name == 'grid_sectors':
+        return CompactFormat.encode_sectors(
+            columns['id'], columns['apex_lon'], columns['apex_lat'], columns['azimuth'],
+            columns['radius_km'], columns['aperture'], next_cursor
+        )
+    return CompactFormat.encode_points(columns['id'], columns['lon'], columns['lat'], next_cursor)
+
+
+def _layer_response(table_name):
+    """
+    Віддає шар як GeoJSON FeatureCollection з полем next_cursor або у компактному форматі.
+
+    Без параметрів повертається вся таблиця, як і раніше; з bbox/limit/cursor –
+    лише сторінка об'єктів у межах області перегляду. З параметром zoom GeoJSON береться
+    з рівня деталізації цього масштабу (спрощені сектори, агреговані комірки). Компактний формат
+    містить лише параметри об'єктів, тому віддається для повної деталізації та спрощених дуг
+    (клієнт будує їх сам), а на рівнях комірок – порожній.
+    """
+    compact = _wants_compact()
+    bbox, zoom, limit, cursor = _viewport_args()
+    source = None
+    if zoom is not None:
+        source = tile_source(lod_levels(), TABLE_LAYERS[table_name], zoom)
+    hidden = zoom is not None and source is None
+
+    if compact:
+        columns = {'id': [], **{name: [] for name in COMPACT_COLUMNS[table_name]}}
+        next_cursor = None
+        if not hidden and (source is None or source['kind'] != 'cells'):
+            columns, next_cursor = db_manager.fetch_columns(table_name, COMPACT_COLUMNS[table_name],
+                                                            bbox=bbox, limit=limit, cursor=cursor)
+        return _compressed_response(_compact_payload(table_name, columns, next_cursor), CompactFormat.MIMETYPE)
+
+    if hidden:
+        payload = {"type": "FeatureCollection", "features": [], "next_cursor": None}
+        return Response(json.dumps(payload), mimetype='application/json')
+
+    if source is not None:
+        table_name = source['table_name']
+    geodata, next_cursor = db_manager.fetch_geodata(table_name, bbox=bbox, limit=limit, cursor=cursor,
+                                                    zoom_band=source['zoom_band'] if source is not None else None)
+    payload = geodata.to_geo_dict()
+    payload['next_cursor'] = next_cursor
+    return _compressed_response(json.dumps(payload), 'application/json')
+
+
+def _cached_layer_response(table_name):
+    variant = 'compact' if _wants_compact() else 'geojson'
+    return _cached_response(_layer_tables(TABLE_LAYERS[table_name]), lambda: _layer_response(table_name), variant)
+
 
 @app.route("/api/grid_squares")
 def get_grid_squares():
-    grid = gpd.read_postgis("SELECT * FROM grid_squares", engine, geom_col='geometry')
-    return Response(grid.to_json(), mimetype='application/json')
+    return _cached_layer_response('grid_squares')
 
 @app.route("/api/grid_sectors")
 def get_grid_sectors():
-    sectors = gpd.read_postgis("SELECT * FROM grid_sectors", engine, geom_col='geometry')
-    return Response(sectors.to_json(), mimetype='application/json')
+    return _cached_layer_response('grid_sectors')
+
+@app.route("/tiles/<layer>/<int:z>/<int:x>/<int:y>.pbf")
+def get_tile(layer, z, x, y):
+    """Віддає векторну плитку шару з кешу, генеруючи її через ST_AsMVT при відсутності."""
+    if layer not in TILE_LAYERS or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        abort(404)
+
+    def build():
+        tile = tile_cache.get(layer, z, x, y)
+        if tile is None:
+            source = tile_source(lod_levels(), layer, z)
+            if source is None:
+                tile = b''
+            else:
+                tile = db_manager.get_mvt_tile(source['table_name'], layer, z, x, y,
+                                               attributes=source['attributes'], zoom_band=source['zoom_band'])
+            tile_cache.put(layer, z, x, y, tile)
+        return Response(tile, mimetype='application/vnd.mapbox-vector-tile')
+
+    # Плитки беруться з tile_cache, тож ключ містить і версію його вмісту (TileCache.seed збільшує її після
+    # заповнення): інакше плитка, прочитана з кешу до перезаповнення, лишалася б під новими версіями таблиць
+    return _cached_response(_layer_tables(layer) + (TILES_VERSION,), build)
+
+@app.route("/api/lod")
+def get_lod():
+    """Рівні деталізації шарів {шар: [рівень]} – index.html обирає за ними джерело даних."""
+    return _cached_response(('lod_levels',), lambda: Response(json.dumps(lod_levels()), mimetype='application/json'))
+
+MAX_COVERAGE_POINTS = 100000
+
+
+@app.route("/api/coverage")
+def get_coverage():
+    """Сектори, що покривають точку ?lat=&lon=, та найближча вершина сітки."""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None or not np.isfinite([lat, lon]).all():
+        abort(400)
+    results = coverage_index.query_points([lon], [lat])
+    if results is None:
+        abort(503)  # Індекс покриття ще не побудовано
+    return Response(json.dumps(results[0]), mimetype='application/json')
+
+@app.route("/api/coverage", methods=["POST"])
+def post_coverage():
+    """
+    Пакетний запит покриття. Тіло JSON: {"points": [[lon, lat], ...]} – результат для кожної точки,
+    або {"geometry": <GeoJSON>} – сектори, що перетинають геометрію, та вершини всередині неї.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        abort(400)
+
+    if 'geometry' in body:
+        try:
+            geometry = shapely.from_geojson(json.dumps(body['geometry']))
+        except Exception:
+            abort(400)
+        if not np.isfinite(shapely.get_coordinates(geometry)).all():
+            abort(400)
+        result = coverage_index.query_geometry(geometry)
+        if result is None:
+            abort(503)
+        return Response(json.dumps(result), mimetype='application/json')
+
+    try:
+        points = np.asarray(body.get('points', []), dtype=np.float64).reshape(-1, 2)
+    except (TypeError, ValueError):
+        abort(400)
+    # NaN та нескінченності пройшли б перетворення в float64, але не є координатами
+    if not np.isfinite(points).all():
+        abort(400)
+    if len(points) > MAX_COVERAGE_POINTS:
+        abort(413)
+    results = coverage_index.query_points(points[:, 0], points[:, 1])
+    if results is None:
+        abort(503)
+    return Response(json.dumps({'results': results}), mimetype='application/json')
+
+# Відповіді, які index.html запитує при кожному відкритті сторінки, – заповнюються в кеші при запуску
+PREWARM_URLS = ('/api/lod', '/api/ukraine_border')
+
+
+def prewarm():
+    """Будує відповіді PREWARM_URLS для кожного стиснення (з диска вони лише підвантажуються в пам'ять)."""
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+    for url in PREWARM_URLS:
+        for encoding in encodings:
+            # Без before/after_request: прогрів не потрапляє в метрики запитів
+            with app.test_request_context(url, headers={'Accept-Encoding': encoding}):
+                app.dispatch_request()
+
+
+try:
+    prewarm()
+except Exception as e:
+    print(f"Кеш відповідей не прогріто: {e}")
+
+# Асинхронний режим: uvicorn server:asgi_app – запити обробляються в пулі потоків ASGI-сервера
+asgi_app = WsgiToAsgi(app) if WsgiToAsgi is not None else None
 
 #Якщо у бд немає таблиць або даних, спершу потрібно запустити main.py
 if __name__ == "__main__":
-    app.run(port='5000')
\ No newline at end of file
+    app.run(port='5000', threaded=True)
\ No newline at end of file
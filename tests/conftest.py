@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+# Модулі проєкту лежать у корені репозиторію
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Таблиці, що видаляються в тестовій базі перед кожним модулем тестів
+PIPELINE_TABLES = ('sector_intersections', 'grid_sectors', 'grid_squares', 'ukraine_border',
+                   'pipeline_stages', 'data_versions')
+
+
+@pytest.fixture(scope='module')
+def db_manager():
+    """
+    DatabaseManager окремої тестової бази PostgreSQL з PostGIS: GEO_TEST_DB=user:password@host/db_name.
+    Таблиці конвеєра в ній видаляються та створюються заново. Без GEO_TEST_DB тести пропускаються.
+    """
+    from sqlalchemy import text
+    from DatabaseManager import DatabaseManager
+
+    url = os.environ.get('GEO_TEST_DB')
+    if not url:
+        pytest.skip("GEO_TEST_DB не задано – тестова база PostGIS недоступна")
+    credentials, location = url.rsplit('@', 1)
+    user, password = credentials.split(':', 1)
+    host, db_name = location.split('/', 1)
+    manager = DatabaseManager(user, password, host, db_name)
+    try:
+        with manager.engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis;"))
+            for table_name in PIPELINE_TABLES:
+                conn.execute(text(f"DROP TABLE IF EXISTS {table_name} CASCADE;"))
+    except Exception as e:
+        pytest.skip(f"Тестова база PostGIS недоступна: {e}")
+    manager.create_tables()
+    yield manager
+    manager.engine.dispose()
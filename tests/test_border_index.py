@@ -0,0 +1,66 @@
+"""Відповіді BorderIndex збігаються з точними перевірками shapely на геометрії кордону."""
+import pickle
+
+import numpy as np
+import pytest
+import shapely
+
+from BorderIndex import BorderIndex
+
+
+@pytest.fixture(scope='module')
+def border():
+    # Дві частини, одна з діркою (як анклав), і увігнутий край
+    outer = shapely.Polygon([(30, 50), (34, 50), (34, 52), (32, 51), (30, 52)],
+                            [[(31, 50.5), (32, 50.5), (32, 51), (31, 51)]])
+    island = shapely.Polygon([(35, 50), (36, 50), (36, 51), (35, 51)])
+    return shapely.MultiPolygon([outer, island])
+
+
+@pytest.fixture(scope='module')
+def index(border):
+    return BorderIndex(border, resolution=128, coarse=16)
+
+
+def _points(border):
+    rng = np.random.default_rng(1)
+    x = rng.uniform(29.5, 36.5, 20000)
+    y = rng.uniform(49.5, 52.5, 20000)
+    # Вершини кордону та дірки, середини їх ребер і точки поза растром
+    rings = [shapely.get_coordinates(ring) for ring in shapely.get_rings(shapely.get_parts(border))]
+    midpoints = [(coords[:-1] + coords[1:]) / 2 for coords in rings]
+    extra = np.vstack(rings + midpoints + [[[0.0, 0.0], [40.0, 55.0]]])
+    return np.concatenate([x, extra[:, 0]]), np.concatenate([y, extra[:, 1]])
+
+
+def _geometries():
+    rng = np.random.default_rng(2)
+    x = rng.uniform(29.5, 36.5, 3000)
+    y = rng.uniform(49.5, 52.5, 3000)
+    size = rng.uniform(0.01, 0.8, 3000)
+    boxes = shapely.box(x, y, x + size, y + size / 2)
+    lines = shapely.linestrings(np.stack([np.column_stack([x, y]), np.column_stack([x + size, y - size])], axis=1))
+    # Дірка цілком, прямокутник на межі дірки та прямокутник, що охоплює весь кордон
+    special = [shapely.box(31, 50.5, 32, 51), shapely.box(31.2, 50.6, 31.8, 50.9), shapely.box(29, 49, 37, 53)]
+    return np.concatenate([boxes, lines, special])
+
+
+def test_contains_xy_matches_shapely(border, index):
+    x, y = _points(border)
+    np.testing.assert_array_equal(index.contains_xy(x, y), shapely.contains_xy(border, x, y))
+
+
+def test_contains_and_intersects_match_shapely(border, index):
+    geometries = _geometries()
+    np.testing.assert_array_equal(index.contains(geometries), shapely.contains(border, geometries))
+    np.testing.assert_array_equal(index.intersects(geometries), shapely.intersects(border, geometries))
+
+
+def test_pickle_round_trip(border, index):
+    restored = pickle.loads(pickle.dumps(index))
+    assert shapely.equals_exact(restored.border, border, 0)
+    np.testing.assert_array_equal(restored.cells, index.cells)
+    x, y = _points(border)
+    np.testing.assert_array_equal(restored.contains_xy(x, y), index.contains_xy(x, y))
+    geometries = _geometries()
+    np.testing.assert_array_equal(restored.contains(geometries), index.contains(geometries))
@@ -0,0 +1,73 @@
+"""Кодування CompactFormat та розбір decode повертають ті самі дані з точністю квантування."""
+import numpy as np
+import pytest
+
+import CompactFormat
+
+
+# Похибка квантування координат – половина кроку 1 / SCALE (з запасом на округлення float64)
+COORD_TOLERANCE = 0.5 / CompactFormat.SCALE + 1e-12
+
+
+@pytest.fixture(scope='module')
+def points():
+    rng = np.random.default_rng(3)
+    ids = np.sort(rng.choice(10 ** 6, 500, replace=False)) + 1
+    # Увесь діапазон координат, щоб дельти мали обидва знаки та великі значення
+    lon = np.concatenate([rng.uniform(22.0, 40.0, 497), [-180.0, 180.0, 0.0]])
+    lat = np.concatenate([rng.uniform(44.0, 52.5, 497), [-90.0, 90.0, 0.0]])
+    return ids, lon, lat
+
+
+def test_points_round_trip(points):
+    ids, lon, lat = points
+    decoded = CompactFormat.decode(CompactFormat.encode_points(ids, lon, lat, next_cursor=int(ids[-1])))
+    assert set(decoded) == {'id', 'lon', 'lat', 'next_cursor'}
+    np.testing.assert_array_equal(decoded['id'], ids)
+    assert np.abs(decoded['lon'] - lon).max() <= COORD_TOLERANCE
+    assert np.abs(decoded['lat'] - lat).max() <= COORD_TOLERANCE
+    assert decoded['next_cursor'] == ids[-1]
+
+
+def test_sectors_round_trip(points):
+    ids, lon, lat = points
+    rng = np.random.default_rng(4)
+    azimuth = rng.uniform(0, 360, len(ids))
+    radius_km = np.full(len(ids), 10.0)
+    aperture = rng.choice([30.0, 60.0, 90.0], len(ids))
+    decoded = CompactFormat.decode(CompactFormat.encode_sectors(ids, lon, lat, azimuth, radius_km, aperture))
+    np.testing.assert_array_equal(decoded['id'], ids)
+    assert np.abs(decoded['lon'] - lon).max() <= COORD_TOLERANCE
+    assert np.abs(decoded['lat'] - lat).max() <= COORD_TOLERANCE
+    # Параметри секторів передаються як float32
+    np.testing.assert_allclose(decoded['azimuth'], azimuth, rtol=2 ** -24)
+    np.testing.assert_array_equal(decoded['radius_km'], radius_km)
+    np.testing.assert_array_equal(decoded['aperture'], aperture)
+    assert decoded['next_cursor'] is None
+
+
+@pytest.mark.parametrize('next_cursor', [None, 0, 123456])
+def test_next_cursor(next_cursor):
+    decoded = CompactFormat.decode(CompactFormat.encode_points([1], [30.5], [50.5], next_cursor=next_cursor))
+    assert decoded['next_cursor'] == next_cursor
+
+
+def test_empty_payloads():
+    points = CompactFormat.decode(CompactFormat.encode_points([], [], []))
+    assert len(points['id']) == len(points['lon']) == len(points['lat']) == 0
+    assert points['next_cursor'] is None
+
+    empty = np.array([])
+    payload = CompactFormat.encode_sectors(empty, empty, empty, empty, empty, empty, next_cursor=7)
+    # Лише заголовок
+    assert len(payload) == CompactFormat._HEADER.size
+    sectors = CompactFormat.decode(payload)
+    assert all(len(sectors[name]) == 0 for name in ('id', 'lon', 'lat', 'azimuth', 'radius_km', 'aperture'))
+    assert sectors['next_cursor'] == 7
+
+
+def test_unknown_format():
+    payload = bytearray(CompactFormat.encode_points([1], [30.5], [50.5]))
+    payload[:4] = b'JSON'
+    with pytest.raises(ValueError):
+        CompactFormat.decode(bytes(payload))
@@ -0,0 +1,36 @@
+"""Відповідність результатів CoverageIndex.query_points вхідним точкам; відповідь без побудованого індексу."""
+import numpy as np
+import shapely
+
+from CoverageIndex import CoverageIndex
+
+
+def _index():
+    vertices = shapely.points([[0.0, 0.0], [10.0, 10.0]])
+    index = CoverageIndex(db_manager=None, geo_manager=None, poll_interval=float('inf'))
+    index._snapshot = {
+        'vertex_tree': shapely.STRtree(vertices),
+        'vertex_ids': np.array([1, 2]),
+        'vertex_xy': shapely.get_coordinates(vertices),
+        'sector_tree': shapely.STRtree(np.array([shapely.box(-1, -1, 1, 1)])),
+        'sector_ids': np.array([7]),
+        'sector_params': {},
+        'pair_sectors': np.array([7]),
+        'pair_offsets': np.array([0, 1, 1]),
+    }
+    return index
+
+
+def test_nearest_vertex_follows_input_point():
+    results = _index().query_points([np.nan, 9.9, 0.1], [0.0, 9.9, 0.1])
+    assert results[0]['vertex'] is None
+    assert results[1]['vertex']['id'] == 2
+    assert results[2]['vertex']['id'] == 1
+    assert [sector['id'] for sector in results[2]['sectors']] == [7]
+
+
+def test_queries_without_snapshot_return_none():
+    # Сервер відповідає 503, а не порожнім покриттям
+    index = CoverageIndex(db_manager=None, geo_manager=None, poll_interval=float('inf'))
+    assert index.query_points([0.1], [0.1]) is None
+    assert index.query_geometry(shapely.box(-1, -1, 1, 1)) is None
@@ -0,0 +1,108 @@
+"""
+Збереження через binary COPY (DatabaseManager.copy_geodata / append_geodata) та читання назад:
+id, геометрія, параметри секторів, перетини та узгодження послідовності id.
+
+Потрібна тестова база PostGIS (фікстура db_manager у conftest.py), інакше тести пропускаються.
+"""
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+from sqlalchemy import text
+
+from GeoDataManager import GeoDataManager
+
+
+def _next_id(db_manager, table_name, geometry):
+    """id, який SERIAL видасть наступному рядку (рядок одразу видаляється)."""
+    with db_manager.engine.begin() as conn:
+        new_id = conn.execute(text(
+            f"INSERT INTO {table_name} (geometry) VALUES (ST_GeomFromText(:wkt, 4326)) RETURNING id;"
+        ), {'wkt': geometry.wkt}).scalar()
+        conn.execute(text(f"DELETE FROM {table_name} WHERE id = :id;"), {'id': new_id})
+    return new_id
+
+
+@pytest.fixture(scope='module')
+def saved_data(db_manager):
+    """Кордон, вершини, сектори та перетини, збережені в базі."""
+    geo_manager = GeoDataManager()
+    border = gpd.GeoDataFrame({'name': ['Ukraine', None]}, geometry=[
+        shapely.MultiPolygon([
+            shapely.Polygon([(30, 50), (31, 50), (31, 51), (30, 51)],
+                            [[(30.2, 50.2), (30.4, 50.2), (30.4, 50.4), (30.2, 50.4)]]),
+            shapely.Polygon([(32, 50), (33, 50), (33, 51)]),
+        ]),
+        shapely.Polygon([(34, 50), (35, 50), (35, 51)]),
+    ], crs="EPSG:4326")
+    lon, lat = np.meshgrid(np.arange(30.0, 30.2, 0.025), np.arange(50.0, 50.15, 0.02))
+    vertices = gpd.GeoDataFrame(geometry=shapely.points(lon.ravel(), lat.ravel()), crs="EPSG:4326")
+    sectors = geo_manager.generate_sectors_batch(vertices, azimuths=(0, 180), radius_km=2,
+                                                 aperture=60, angle_step=1)
+
+    db_manager.save_geodata(border, 'ukraine_border')
+    db_manager.save_geodata(vertices, 'grid_squares')
+    db_manager.save_geodata(sectors, 'grid_sectors')
+    intersections = geo_manager.find_intersections(sectors, vertices)
+    db_manager.save_intersections(intersections)
+    return border, vertices, sectors, intersections
+
+
+def test_border_round_trip(db_manager, saved_data):
+    border = saved_data[0]
+    saved, next_cursor = db_manager.fetch_geodata('ukraine_border')
+    assert next_cursor is None
+    np.testing.assert_array_equal(saved['id'], [1, 2])
+    assert saved['name'].iloc[0] == 'Ukraine' and saved['name'].iloc[1] is None
+    assert shapely.equals(np.asarray(saved.geometry.values), np.asarray(border.geometry.values)).all()
+
+
+def test_points_and_sectors_round_trip(db_manager, saved_data):
+    _, vertices, sectors, _ = saved_data
+    for table_name, geodata in (('grid_squares', vertices), ('grid_sectors', sectors)):
+        saved, _ = db_manager.fetch_geodata(table_name)
+        np.testing.assert_array_equal(saved['id'], np.arange(1, len(geodata) + 1))
+        # EWKB передає координати без округлення
+        assert shapely.equals_exact(np.asarray(saved.geometry.values), np.asarray(geodata.geometry.values),
+                                    tolerance=0).all()
+
+    saved, _ = db_manager.fetch_geodata('grid_sectors')
+    for name in ('apex_lon', 'apex_lat', 'azimuth', 'radius_km', 'aperture'):
+        np.testing.assert_array_equal(saved[name].to_numpy(), sectors[name].to_numpy())
+
+
+def test_intersections_round_trip(db_manager, saved_data):
+    _, vertices, _, intersections = saved_data
+    assert len(intersections)
+    pairs = db_manager.read_intersection_pairs()
+    np.testing.assert_array_equal(pairs['sector_id'], intersections['sector_id'])
+    np.testing.assert_array_equal(pairs['point_id'], intersections['point_id'])
+
+    saved = gpd.read_postgis("SELECT * FROM sector_intersections ORDER BY id", db_manager.engine,
+                             geom_col='point_coordinates')
+    expected = np.asarray(vertices.geometry.values)[pairs['point_id'] - 1]
+    assert shapely.equals(np.asarray(saved.geometry.values), expected).all()
+
+
+def test_sequence_follows_explicit_ids(db_manager, saved_data):
+    _, vertices, _, _ = saved_data
+    assert _next_id(db_manager, 'grid_squares', shapely.Point(0, 0)) == len(vertices) + 1
+
+
+def test_append_with_offset_and_restart(db_manager, saved_data):
+    _, vertices, _, _ = saved_data
+    db_manager.start_stage('test_copy', 'a', table_name='grid_squares')
+    # Залежні таблиці очищено разом із grid_squares, послідовність скинуто
+    assert db_manager.fetch_geodata('grid_squares')[0].empty
+    assert len(db_manager.read_intersection_pairs()['sector_id']) == 0
+    assert db_manager.fetch_geodata('grid_sectors')[0].shape[0] > 0
+
+    half = len(vertices) // 2
+    db_manager.append_geodata(vertices.iloc[:half], 'grid_squares', stage='test_copy', chunk_index=0)
+    db_manager.append_geodata(vertices.iloc[half:], 'grid_squares', id_offset=half,
+                              stage='test_copy', chunk_index=1)
+    saved, _ = db_manager.fetch_geodata('grid_squares')
+    np.testing.assert_array_equal(saved['id'], np.arange(1, len(vertices) + 1))
+    assert shapely.equals(np.asarray(saved.geometry.values), np.asarray(vertices.geometry.values)).all()
+    assert db_manager.get_stage('test_copy')['chunks_done'] == 2
+    assert _next_id(db_manager, 'grid_squares', shapely.Point(0, 0)) == len(vertices) + 1
@@ -0,0 +1,56 @@
+"""
+Перетини, обчислені в PostGIS (DatabaseManager.compute_intersections), порівняно з Python-методами.
+
+Потрібна тестова база PostGIS (фікстура db_manager у conftest.py), інакше тести пропускаються.
+"""
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from GeoDataManager import GeoDataManager
+
+
+@pytest.fixture(scope='module')
+def grid_data(db_manager):
+    """Невелика сітка вершин і сектори (азимут 350° перевіряє перехід через північ), збережені в базі."""
+    geo_manager = GeoDataManager()
+    lon, lat = np.meshgrid(np.arange(30.0, 30.4, 0.025), np.arange(50.0, 50.3, 0.02))
+    rng = np.random.default_rng(0)
+    order = rng.permutation(lon.size)  # id не збігаються з порядком координат
+    vertices = gpd.GeoDataFrame(geometry=shapely.points(lon.ravel()[order], lat.ravel()[order]), crs="EPSG:4326")
+    sectors = geo_manager.generate_sectors_batch(vertices, azimuths=(0, 120, 240, 350), radius_km=3,
+                                                 aperture=60, angle_step=1)
+    db_manager.save_geodata(vertices, 'grid_squares')
+    db_manager.save_geodata(sectors, 'grid_sectors')
+    return geo_manager, vertices, sectors
+
+
+def _pairs(sector_ids, point_ids):
+    return set(zip(np.asarray(sector_ids).tolist(), np.asarray(point_ids).tolist()))
+
+
+def test_saved_ids_are_positions(db_manager, grid_data):
+    _, vertices, sectors = grid_data
+    for table_name, geodata in (('grid_squares', vertices), ('grid_sectors', sectors)):
+        saved, _ = db_manager.fetch_geodata(table_name)
+        np.testing.assert_array_equal(saved['id'], np.arange(1, len(geodata) + 1))
+        assert shapely.equals(np.asarray(saved.geometry.values), np.asarray(geodata.geometry.values)).all()
+
+
+@pytest.mark.parametrize('predicate, method', [('contains', 'strtree'), ('dwithin', 'analytic')])
+def test_matches_python_method(db_manager, grid_data, predicate, method):
+    geo_manager, vertices, sectors = grid_data
+    expected = geo_manager.find_intersections(sectors, vertices, method=method)
+    assert len(expected)
+
+    # Кілька діапазонів id, що обробляються паралельно
+    n_rows = db_manager.compute_intersections(predicate=predicate, partition_size=97, workers=3)
+    pairs = db_manager.read_intersection_pairs()
+
+    assert n_rows == len(pairs['sector_id'])
+    assert _pairs(pairs['sector_id'], pairs['point_id']) == _pairs(expected['sector_id'], expected['point_id'])
+
+    # Повторний запуск замінює перетини, а не дублює їх
+    assert db_manager.compute_intersections(predicate=predicate, partition_size=97, workers=3) == n_rows
+    assert len(db_manager.read_intersection_pairs()['sector_id']) == n_rows
@@ -0,0 +1,82 @@
+"""Точність векторизованих геодезичних задач (формули Вінсенті) порівняно з geopy."""
+import numpy as np
+import pytest
+
+geopy_distance = pytest.importorskip("geopy.distance")
+
+from GeoDataManager import GeoDataManager, _geodesic_direct, _geodesic_inverse
+
+
+# Допустима розбіжність з geopy (geographiclib), метрів
+TOLERANCE_M = 0.005
+
+LATITUDES = (-60.0, -10.0, 0.0, 44.5, 48.3794, 52.3, 75.0)
+AZIMUTHS = (0.0, 37.5, 90.0, 120.0, 179.9, 240.0, 315.0)
+RADII_KM = (0.1, 1.0, 5.0, 10.0, 50.0)
+
+
+def _cases():
+    lat, azimuth, radius_km = np.meshgrid(LATITUDES, AZIMUTHS, RADII_KM, indexing='ij')
+    lat, azimuth, radius_km = lat.ravel(), azimuth.ravel(), radius_km.ravel()
+    lon = np.linspace(-170.0, 170.0, len(lat))
+    return lat, lon, azimuth, radius_km
+
+
+def _reference_destinations(lat, lon, azimuth, radius_km):
+    points = [geopy_distance.geodesic(kilometers=r).destination((la, lo), bearing=az)
+              for la, lo, az, r in zip(lat, lon, azimuth, radius_km)]
+    return np.array([p.latitude for p in points]), np.array([p.longitude for p in points])
+
+
+def test_direct_matches_geopy():
+    lat, lon, azimuth, radius_km = _cases()
+    lat2, lon2 = _geodesic_direct(lat, lon, azimuth, radius_km * 1000.0)
+    ref_lat, ref_lon = _reference_destinations(lat, lon, azimuth, radius_km)
+
+    errors = [geopy_distance.geodesic(a, b).meters
+              for a, b in zip(zip(lat2, lon2), zip(ref_lat, ref_lon))]
+    assert max(errors) < TOLERANCE_M
+
+
+def test_inverse_matches_geopy():
+    lat, lon, azimuth, radius_km = _cases()
+    ref_lat, ref_lon = _reference_destinations(lat, lon, azimuth, radius_km)
+    distance_m, azimuth_out = _geodesic_inverse(lat, lon, ref_lat, ref_lon)
+
+    ref_distance = np.array([geopy_distance.geodesic(a, b).meters
+                             for a, b in zip(zip(lat, lon), zip(ref_lat, ref_lon))])
+    np.testing.assert_allclose(distance_m, ref_distance, rtol=0, atol=TOLERANCE_M)
+    # Розбіжність азимуту, переведена у зсув кінцевої точки, теж у межах допуску
+    deviation = (azimuth_out - azimuth + 180) % 360 - 180
+    assert np.max(np.abs(np.radians(deviation)) * ref_distance) < TOLERANCE_M
+
+
+def test_inverse_of_coincident_points_is_zero():
+    distance_m, azimuth = _geodesic_inverse([48.0], [31.0], [48.0], [31.0])
+    assert distance_m[0] == 0.0
+    assert azimuth[0] == 0.0
+
+
+def test_sector_vertex_layout():
+    apex_lon, apex_lat, radius_km, aperture, angle_step = 31.1656, 48.3794, 5, 60, 10
+    sectors = GeoDataManager().generate_sectors_batch(
+        np.array([[apex_lon, apex_lat]]), azimuths=(0, 120, 240),
+        radius_km=radius_km, aperture=aperture, angle_step=angle_step
+    )
+    assert list(sectors['azimuth']) == [0, 120, 240]
+
+    for azimuth, geometry in zip(sectors['azimuth'], sectors.geometry):
+        coords = np.asarray(geometry.exterior.coords)
+        # Точки дуги від azimuth - aperture/2 до azimuth + aperture/2, вершина, замикання кільця
+        n_arc = aperture // angle_step + 1
+        assert len(coords) == n_arc + 2
+        np.testing.assert_array_equal(coords[n_arc], [apex_lon, apex_lat])
+        np.testing.assert_array_equal(coords[-1], coords[0])
+
+        bearings = azimuth + np.linspace(-aperture / 2, aperture / 2, n_arc)
+        ref_lat, ref_lon = _reference_destinations(
+            np.full(n_arc, apex_lat), np.full(n_arc, apex_lon), bearings, np.full(n_arc, radius_km)
+        )
+        errors = [geopy_distance.geodesic((la, lo), (rla, rlo)).meters
+                  for (lo, la), rla, rlo in zip(coords[:n_arc], ref_lat, ref_lon)]
+        assert max(errors) < TOLERANCE_M
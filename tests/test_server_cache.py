@@ -0,0 +1,152 @@
+"""
+Кеш відповідей сервера: ETag і 304, інвалідація за версіями даних, дисковий рівень та сторінки за курсором.
+
+server.py підключається до бази при імпорті, тому DatabaseManager підміняється заглушкою з даними в пам'яті.
+"""
+import importlib
+import json
+import os
+import sys
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+import CompactFormat
+import DatabaseManager
+from ResponseCache import ResponseCache
+from TileCache import TileCache
+
+
+class StubDatabaseManager:
+    """Таблиці кордону та вершин у пам'яті; версії даних задає тест, calls рахує звернення до «бази»."""
+
+    def __init__(self, *args, **kwargs):
+        # Поки версій немає, відповіді не кешуються – прогрів під час імпорту server нічого не записує
+        self.versions = None
+        self.calls = 0
+        points = shapely.points(np.column_stack([np.linspace(30.0, 31.0, 5), np.linspace(50.0, 50.4, 5)]))
+        self.tables = {
+            'ukraine_border': gpd.GeoDataFrame({'id': [1], 'name': ['Ukraine']},
+                                               geometry=[shapely.box(30, 50, 31, 51)], crs="EPSG:4326"),
+            'grid_squares': gpd.GeoDataFrame({'id': np.arange(1, 6)}, geometry=points, crs="EPSG:4326"),
+        }
+
+    def get_data_versions(self):
+        return None if self.versions is None else dict(self.versions)
+
+    def get_lod_levels(self):
+        return {}
+
+    def get_stage(self, stage):
+        return None
+
+    def _page(self, table_name, limit, cursor):
+        self.calls += 1
+        geodata = self.tables[table_name]
+        if cursor is not None:
+            geodata = geodata[geodata['id'] > cursor]
+        next_cursor = None
+        if limit is not None and len(geodata) > limit:
+            geodata = geodata.iloc[:limit]
+            next_cursor = int(geodata['id'].iloc[-1])
+        return geodata, next_cursor
+
+    def fetch_geodata(self, table_name, bbox=None, limit=None, cursor=None, zoom_band=None):
+        return self._page(table_name, limit, cursor)
+
+    def fetch_columns(self, table_name, columns, bbox=None, limit=None, cursor=None, zoom_band=None):
+        geodata, next_cursor = self._page(table_name, limit, cursor)
+        coords = shapely.get_coordinates(geodata.geometry.values)
+        return {'id': geodata['id'].to_numpy(), 'lon': coords[:, 0], 'lat': coords[:, 1]}, next_cursor
+
+
+@pytest.fixture(scope='module')
+def server():
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(DatabaseManager, 'DatabaseManager', StubDatabaseManager)
+        sys.modules.pop('server', None)
+        module = importlib.import_module('server')
+    yield module
+    sys.modules.pop('server', None)
+
+
+@pytest.fixture
+def client(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, 'response_cache', ResponseCache(str(tmp_path / 'responses')))
+    monkeypatch.setattr(server, 'tile_cache', TileCache(str(tmp_path / 'tiles')))
+    # Версії перечитуються на кожен запит
+    monkeypatch.setattr(server, 'VERSION_POLL_INTERVAL', 0)
+    monkeypatch.setattr(server, '_version_state', {'versions': None, 'loaded_at': None})
+    server.db_manager.versions = {'ukraine_border': 1, 'grid_squares': 1, 'grid_sectors': 1}
+    server.db_manager.calls = 0
+    return server.app.test_client()
+
+
+def test_etag_and_not_modified(server, client):
+    first = client.get('/api/ukraine_border')
+    assert first.status_code == 200 and first.headers['ETag']
+    assert server.db_manager.calls == 1
+
+    not_modified = client.get('/api/ukraine_border', headers={'If-None-Match': first.headers['ETag']})
+    assert not_modified.status_code == 304 and not_modified.headers['ETag'] == first.headers['ETag']
+
+    repeated = client.get('/api/ukraine_border')
+    assert repeated.status_code == 200 and repeated.data == first.data
+    # 304 і повторна відповідь не звертаються до бази
+    assert server.db_manager.calls == 1
+
+
+def test_version_invalidates(server, client):
+    first = client.get('/api/ukraine_border')
+
+    # Версія іншої таблиці не змінює відповідь
+    server.db_manager.versions['grid_sectors'] = 2
+    assert client.get('/api/ukraine_border', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    server.db_manager.versions['ukraine_border'] = 2
+    changed = client.get('/api/ukraine_border', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200 and changed.headers['ETag'] != first.headers['ETag']
+    assert server.db_manager.calls == 2
+
+
+def test_disk_layer(server, client, tmp_path):
+    first = client.get('/api/ukraine_border')
+    assert server.db_manager.calls == 1
+
+    # Новий процес сервера: порожня пам'ять, той самий каталог
+    server.response_cache = ResponseCache(str(tmp_path / 'responses'))
+    restarted = client.get('/api/ukraine_border')
+    assert restarted.data == first.data and restarted.headers['ETag'] == first.headers['ETag']
+    assert server.db_manager.calls == 1
+    assert 'response_cache_requests_total{result="disk_hit"} 1' in server.response_cache.render()
+
+
+def test_cursor_pages(server, client):
+    first = client.get('/api/grid_squares?limit=2')
+    payload = json.loads(first.data)
+    assert [feature['properties']['id'] for feature in payload['features']] == [1, 2]
+    assert payload['next_cursor'] == 2
+
+    second = client.get(f"/api/grid_squares?limit=2&cursor={payload['next_cursor']}")
+    payload = json.loads(second.data)
+    assert [feature['properties']['id'] for feature in payload['features']] == [3, 4]
+    assert payload['next_cursor'] == 4
+    # Кожна сторінка кешується під власним ключем
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert client.get('/api/grid_squares?limit=2&cursor=2').data == second.data
+
+    compact = client.get('/api/grid_squares?format=compact&limit=2&cursor=4')
+    decoded = CompactFormat.decode(compact.data)
+    assert decoded['id'].tolist() == [5] and decoded['next_cursor'] is None
+    assert compact.headers['ETag'] != client.get('/api/grid_squares?limit=2&cursor=4').headers['ETag']
+    assert server.db_manager.calls == 4
+
+
+def test_overwrite_keeps_disk_size(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put('key', b'x' * 1000, {'Content-Type': 'application/json'})
+    cache.put('key', b'y' * 10, {'Content-Type': 'application/json'})
+    on_disk = sum(entry.stat().st_size for entry in os.scandir(tmp_path) if entry.name.endswith('.bin'))
+    assert cache._disk_bytes == on_disk
@@ -0,0 +1,29 @@
+"""Потокова обробка (GeoDataManager.iter_sector_batches) з вершинами-кандидатами пакета дає ті самі перетини."""
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from GeoDataManager import GeoDataManager
+
+
+@pytest.mark.parametrize('method', ['strtree', 'analytic'])
+def test_stream_batches_match_full_grid(method):
+    geo_manager = GeoDataManager()
+    border = shapely.box(30.0, 50.0, 30.5, 50.3)
+    lon, lat = np.meshgrid(np.arange(30.0, 30.5, 0.02), np.arange(50.0, 50.3, 0.015))
+    vertices = gpd.GeoDataFrame(geometry=shapely.points(lon.ravel(), lat.ravel()), crs="EPSG:4326")
+
+    expected_sectors = geo_manager.generate_sectors_parallel(vertices, border, radius_km=3)
+    expected = geo_manager.find_intersections(expected_sectors, vertices, method=method)
+
+    sector_parts, pairs = [], set()
+    # Пакети менші за рядок сітки: кандидати мають братися і з сусідніх рядків
+    for sectors, sector_idx, point_idx in geo_manager.iter_sector_batches(
+            vertices, border, radius_km=3, batch_size=7, intersection_method=method, processes=2):
+        offset = sum(len(part) for part in sector_parts)
+        pairs.update(zip((sector_idx + offset + 1).tolist(), (point_idx + 1).tolist()))
+        sector_parts.append(sectors)
+
+    assert sum(len(part) for part in sector_parts) == len(expected_sectors)
+    assert pairs and pairs == set(zip(expected['sector_id'].tolist(), expected['point_id'].tolist()))
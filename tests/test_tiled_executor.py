@@ -0,0 +1,59 @@
+"""Виконання по плитках (TiledExecutor) дає ті самі вершини, сектори та перетини, що й послідовний шлях."""
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from GeoDataManager import GeoDataManager
+from TiledExecutor import TiledExecutor
+
+
+@pytest.fixture(scope='module')
+def border():
+    # Увігнутий кордон: частина секторів виходить за його межі
+    polygon = shapely.Polygon([(30.0, 50.0), (30.6, 50.0), (30.6, 50.4), (30.3, 50.2), (30.0, 50.4)])
+    return gpd.GeoDataFrame({'name': ['test']}, geometry=[polygon], crs="EPSG:4326")
+
+
+def _serial(geo_manager, border, step_km, radius_km, azimuths, method):
+    lattice = geo_manager.generate_lattice(border, step_km)
+    vertices = geo_manager.filter_grid_by_border(lattice, border)
+    sectors = geo_manager.generate_sectors_parallel(vertices, border.unary_union, radius_km, azimuths)
+    intersections = geo_manager.find_intersections(sectors, vertices, method=method)
+    return vertices, sectors, intersections
+
+
+def _keys(vertices, sectors, intersections):
+    """Множини вершин, секторів і пар, що не залежать від порядку id."""
+    vertex_keys = [tuple(xy) for xy in shapely.get_coordinates(vertices.geometry.values).tolist()]
+    sector_keys = list(zip(sectors['apex_lon'].tolist(), sectors['apex_lat'].tolist(), sectors['azimuth'].tolist()))
+    sector_ids = sectors['id'].to_numpy() if 'id' in sectors.columns else np.arange(1, len(sectors) + 1)
+    sector_by_id = dict(zip(sector_ids.tolist(), sector_keys))
+    pairs = {(sector_by_id[sector_id], vertex_keys[point_id - 1])
+             for sector_id, point_id in zip(intersections['sector_id'].tolist(), intersections['point_id'].tolist())}
+    return set(vertex_keys), set(sector_keys), pairs
+
+
+@pytest.mark.parametrize('method', ['strtree', 'analytic'])
+def test_tiled_matches_serial(border, method):
+    geo_manager = GeoDataManager()
+    params = dict(step_km=2, radius_km=3, azimuths=(0, 120, 240), method=method)
+    serial = _serial(geo_manager, border, **params)
+    # Плитки значно менші за радіус сектора, тож перетини проходять через смугу сусідніх плиток
+    tiled = TiledExecutor(geo_manager, tile_size=4, processes=2).run(
+        border, params['step_km'], params['radius_km'], params['azimuths'], intersection_method=method
+    )
+
+    serial_keys, tiled_keys = _keys(*serial), _keys(*tiled)
+    assert serial_keys[2]
+    for serial_set, tiled_set in zip(serial_keys, tiled_keys):
+        assert tiled_set == serial_set
+
+    vertices, sectors, intersections = tiled
+    np.testing.assert_array_equal(sectors['id'], np.arange(1, len(sectors) + 1))
+    assert shapely.equals_exact(np.asarray(sectors.geometry.values),
+                                np.asarray(geo_manager.sectors_from_params(
+                                    sectors['apex_lon'], sectors['apex_lat'], sectors['azimuth'], 3
+                                ).geometry.values), tolerance=0).all()
+    assert shapely.equals(np.asarray(intersections.geometry.values),
+                          np.asarray(vertices.geometry.values)[intersections['point_id'].to_numpy() - 1]).all()